@@ -1,18 +1,48 @@
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.urls import reverse
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from .models import Vorlage, PlatzhalterInstance, EmailLog
 from .serializers import VorlageSerializer, PlatzhalterInstanceSerializer
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from sterbefall.models import Sterbefall
+from sterbefall.auslieferung import datei_antwort
+from users.aufgaben import einreihen
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import generics
 from .serializers import EmailLogSerializer
+from .layout import fuellen, layout_plan, sterbefall_fuer_plan
+from .ketten import plan_positionen
+from .ausgabe import cache_statistik, dateiname, dokument_auftrag, dokument_oeffnen
+from .vorlagen import ist_pdf
+from .dossier import MAX_VORLAGEN, DOSSIER_CACHE, dossier_auftraege, dossier_erzeugen, dossier_oeffnen, dossier_schluessel, dossier_vorlagen
 
 
 class VorlageViewSet(viewsets.ModelViewSet):
     queryset = Vorlage.objects.all()
     serializer_class = VorlageSerializer
+
+    @action(detail=True, methods=['get'])
+    def datei(self, request, pk=None):
+        """Die Vorlagen-Datei mit Range-Unterstützung und ETag aus dem Inhalts-Hash."""
+        vorlage = self.get_object()
+        if not vorlage.vorlage_datei:
+            return Response({'error': 'Vorlage file is missing.'}, status=404)
+        name = os.path.basename(vorlage.vorlage_datei.name)
+        pdf = ist_pdf(vorlage)
+        return datei_antwort(
+            request, vorlage.vorlage_datei, vorlage.inhalt_hash,
+            content_type='application/pdf' if pdf else (mimetypes.guess_type(name)[0] or 'application/octet-stream'),
+            dateiname=name,
+        )
     
 
 class PlatzhalterInstanceViewSet(viewsets.ModelViewSet):
@@ -34,18 +64,123 @@ class PDFForSterbefallDetailView(APIView):
         if not vorlage.vorlage_datei:
             return Response({'error': 'Vorlage file is missing.'}, status=404)
 
-        if not vorlage.vorlage_datei.url.endswith('.pdf'):
+        if not ist_pdf(vorlage):
             return Response({'error': 'Invalid file format. Expected a PDF file.'}, status=400)
 
-        platzhalter_instances = PlatzhalterInstance.objects.filter(pdf_template=vorlage)
-        sterbefall = get_object_or_404(Sterbefall, pk=sterbefall_id)
+        platzhalter_instances = PlatzhalterInstance.objects.filter(pdf_template=vorlage).select_related('platzhalter')
+        # Kompilierter Plan: ein Sterbefall-Zugriff mit genau den benötigten Feldern
+        plan = layout_plan(vorlage)
+        try:
+            sterbefall = sterbefall_fuer_plan(plan, sterbefall_id)
+        except Sterbefall.DoesNotExist:
+            return Response({'error': 'Sterbefall does not exist.'}, status=404)
+        werte = fuellen(plan, sterbefall)
         serializer = VorlageSerializer(vorlage)
         return Response({
             'vorlage': serializer.data,
             'platzhalter_instances': PlatzhalterInstanceSerializer(platzhalter_instances, many=True).data,
-            'sterbefall': sterbefall.pk
+            'sterbefall': sterbefall.pk,
+            'werte': werte,
+            # Verkettete Felder für die Werte dieses Falls ausgerichtet
+            'positionen': plan_positionen(plan, werte),
         })
 
+class PDFForSterbefallDateiView(APIView):
+    """Die befüllte PDF einer Vorlage; unverändert geöffnete Dokumente kommen aus dem Cache."""
+    def get(self, request, sterbefall_id, pk, format=None):
+        vorlage = get_object_or_404(Vorlage, pk=pk)
+        if not vorlage.vorlage_datei:
+            return Response({'error': 'Vorlage file is missing.'}, status=404)
+        if not ist_pdf(vorlage):
+            return Response({'error': 'Invalid file format. Expected a PDF file.'}, status=400)
+        try:
+            einzel = dokument_auftrag(vorlage, sterbefall_id)
+        except Sterbefall.DoesNotExist:
+            return Response({'error': 'Sterbefall does not exist.'}, status=404)
+        return FileResponse(dokument_oeffnen(einzel), content_type='application/pdf',
+                            filename=dateiname(vorlage))
+
+
+class DokumentCacheStatistikView(APIView):
+    """Trefferquote (dieser Prozess) und Belegung des Dokument-Caches des Tenants."""
+    def get(self, request, format=None):
+        return Response(cache_statistik())
+
+
+class DossierView(APIView):
+    """
+    Mehrere Vorlagen eines Falls als eine PDF, parallel befüllt:
+    {"vorlagen": [ids]} oder {"kategorie": "..."}. Mit "fortschritt": true kommt
+    NDJSON mit einer Zeile je fertigem Dokument; die letzte enthält die URL der PDF.
+    Mit "hintergrund": true wird eine Hintergrundaufgabe eingereiht (202).
+    """
+    def post(self, request, sterbefall_id, format=None):
+        ids = request.data.get('vorlagen')
+        kategorie = request.data.get('kategorie')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(vorlage_id, int) for vorlage_id in ids):
+                return Response({'error': 'vorlagen muss eine Liste von IDs sein.'}, status=400)
+        elif not kategorie:
+            return Response({'error': 'vorlagen oder kategorie angeben.'}, status=400)
+
+        vorlagen = dossier_vorlagen(ids=ids, kategorie=kategorie)
+        if not vorlagen:
+            return Response({'error': 'Keine PDF-Vorlagen gefunden.'}, status=404)
+        if len(vorlagen) > MAX_VORLAGEN:
+            return Response({'error': f'Höchstens {MAX_VORLAGEN} Vorlagen je Dossier.'}, status=400)
+
+        if request.data.get('hintergrund'):
+            # Als Hintergrundaufgabe: Status über api/aufgaben/<id>/, Ergebnis enthält den Download-Schlüssel
+            if not Sterbefall.objects.filter(pk=sterbefall_id).exists():
+                return Response({'error': 'Sterbefall does not exist.'}, status=404)
+            vorlage_ids = [vorlage.pk for vorlage in vorlagen]
+            aufgabe = einreihen(
+                'dossier_erzeugen', {'sterbefall_id': str(sterbefall_id), 'vorlagen': vorlage_ids},
+                dedup_schluessel='dossier:' + hashlib.sha256(f'{sterbefall_id}:{vorlage_ids}'.encode()).hexdigest(),
+            )
+            return Response(aufgabe.als_dict(), status=202)
+        try:
+            auftraege = dossier_auftraege(sterbefall_id, vorlagen)
+        except Sterbefall.DoesNotExist:
+            return Response({'error': 'Sterbefall does not exist.'}, status=404)
+        schluessel = dossier_schluessel(auftraege)
+
+        if not request.data.get('fortschritt'):
+            return FileResponse(dossier_oeffnen(auftraege, schluessel),
+                                content_type='application/pdf', filename='dossier.pdf')
+
+        # Die Worker laufen ab hier schon, der Client bekommt den Fortschritt live
+        fortschritt = dossier_erzeugen(auftraege, schluessel)
+        url = reverse('sterbefall-dossier-datei', kwargs={'sterbefall_id': sterbefall_id, 'schluessel': schluessel})
+        gesamt = len(auftraege)
+
+        def zeilen():
+            try:
+                for fertig, name in fortschritt:
+                    yield json.dumps({'fertig': fertig, 'gesamt': gesamt, 'vorlage': name}) + '\n'
+            except Exception as fehler:
+                yield json.dumps({'error': str(fehler)}) + '\n'
+                return
+            yield json.dumps({'fertig': gesamt, 'gesamt': gesamt, 'datei': url}) + '\n'
+
+        response = StreamingHttpResponse(zeilen(), content_type='application/x-ndjson')
+        response['X-Accel-Buffering'] = 'no'  # nginx soll die Zeilen nicht puffern
+        return response
+
+
+class DossierDateiView(APIView):
+    """Fertiges Dossier aus dem Cache (URL aus der letzten Fortschrittszeile)."""
+    def get(self, request, sterbefall_id, schluessel, format=None):
+        pfad = DOSSIER_CACHE.treffer_pfad(schluessel) if re.fullmatch(r'[0-9a-f]{64}', schluessel) else None
+        try:
+            datei = open(pfad, 'rb') if pfad is not None else None
+        except FileNotFoundError:  # zwischen Treffer und Öffnen verdrängt
+            datei = None
+        if datei is None:
+            return Response({'error': 'Dossier nicht (mehr) vorhanden.'}, status=404)
+        return FileResponse(datei, content_type='application/pdf', filename='dossier.pdf')
+
+
 class EmailLogListView(generics.ListAPIView):
     serializer_class = EmailLogSerializer
 
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class DokumenteConfig(AppConfig):
+    name = 'dokumente'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,15 @@
+from users.aufgaben import aufgabe
+from .dossier import dossier_auftraege, dossier_erzeugen, dossier_schluessel, dossier_vorlagen
+
+
+@aufgabe('dossier_erzeugen', timeout=900, max_versuche=2)
+def dossier_erzeugen_aufgabe(sterbefall_id, vorlagen=None, kategorie=None):
+    """Erzeugt ein Dossier in DOSSIER_CACHE; das Ergebnis enthält den Schlüssel für den Download."""
+    vorlagen = dossier_vorlagen(ids=vorlagen, kategorie=kategorie)
+    if not vorlagen:
+        raise ValueError('Keine PDF-Vorlagen gefunden.')
+    auftraege = dossier_auftraege(sterbefall_id, vorlagen)
+    schluessel = dossier_schluessel(auftraege)
+    for _ in dossier_erzeugen(auftraege, schluessel):
+        pass
+    return {'schluessel': schluessel, 'dokumente': len(auftraege)}
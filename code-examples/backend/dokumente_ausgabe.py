@@ -0,0 +1,98 @@
+import hashlib
+import io
+import json
+import re
+
+from django.conf import settings
+
+from sterbefall.dateicache import DateiCache
+from .dossier_render import RENDER_VERSION, vorlage_fuellen
+from .ketten import plan_positionen
+from .layout import fuellen, layout_plan, sterbefall_fuer_plan
+from .vorlagen import _inhalt
+
+DOKUMENT_CACHE = DateiCache(
+    'dokumente', getattr(settings, 'DOKUMENT_CACHE_MAX_BYTES', 500 * 1024 * 1024), endung='.pdf',
+)
+
+
+def dokument_schluessel(vorlage, plan, werte):
+    """
+    Cache-Schlüssel aus Inhalts-Hash der Vorlage, layout_version und Fallstand.
+    Als Fallstand zählen die eingesetzten Texte: Änderungen an Feldern, die die
+    Vorlage nicht verwendet, lassen gerenderte Dokumente gültig.
+    """
+    kodiert = json.dumps(
+        [RENDER_VERSION, vorlage.inhalt_hash, plan.version, sorted(werte.items())], default=str,
+    )
+    return hashlib.sha256(kodiert.encode('utf-8')).hexdigest()
+
+
+def auftrag(vorlage, plan, werte):
+    """Alles, was zum Befüllen einer Vorlage nötig ist, als picklebares Dict (Eingabe für vorlage_fuellen)."""
+    positionen = plan_positionen(plan, werte)
+    felder = {
+        seite: [
+            {
+                'x': positionen[feld.instance_id],
+                'y': feld.y,
+                'text': werte[feld.instance_id],
+                'schrift': feld.schrift,
+                'schriftgroesse': feld.schriftgroesse,
+                'farbe': feld.farbe,
+            }
+            for feld in plan_felder
+        ]
+        for seite, plan_felder in plan.seiten
+    }
+    try:
+        pfad, inhalt = vorlage.vorlage_datei.path, None
+    except NotImplementedError:  # Storage ohne lokale Pfade: Inhalt mitschicken
+        pfad, inhalt = None, _inhalt(vorlage.vorlage_datei)
+    return {
+        'vorlage_id': vorlage.pk,
+        'name': vorlage.name,
+        'schluessel': dokument_schluessel(vorlage, plan, werte),
+        'inhalt_hash': vorlage.inhalt_hash,
+        'pfad': pfad,
+        'inhalt': inhalt,
+        'felder': felder,
+    }
+
+
+def dokument_auftrag(vorlage, sterbefall_id):
+    plan = layout_plan(vorlage)
+    sterbefall = sterbefall_fuer_plan(plan, sterbefall_id)
+    return auftrag(vorlage, plan, fuellen(plan, sterbefall))
+
+
+def dokument_oeffnen(einzel):
+    """
+    Die befüllte PDF als geöffnete Datei (binär); gerendert wird nur, wenn sie nicht
+    im Cache liegt. Geöffnet bleibt sie lesbar, auch wenn aufraeumen() sie danach löscht.
+    """
+    pfad = DOKUMENT_CACHE.treffer_pfad(einzel['schluessel'])
+    if pfad is not None:
+        try:
+            return open(pfad, 'rb')
+        except FileNotFoundError:
+            pass  # zwischen Treffer und Öffnen verdrängt: neu rendern
+    daten = vorlage_fuellen(einzel)
+    DOKUMENT_CACHE.schreiben(einzel['schluessel'], daten)
+    return io.BytesIO(daten)
+
+
+def dateiname(vorlage):
+    name = re.sub(r'[^\w.-]+', '_', vorlage.name or '').strip('_')
+    return f"{name or f'dokument-{vorlage.pk}'}.pdf"
+
+
+def email_anhang(vorlage, sterbefall_id):
+    """(dateiname, inhalt, mimetype) für EmailMessage.attach, aus dem Cache wie beim Download."""
+    with dokument_oeffnen(dokument_auftrag(vorlage, sterbefall_id)) as datei:
+        return dateiname(vorlage), datei.read(), 'application/pdf'
+
+
+def cache_statistik():
+    """Zähler dieses Prozesses und Belegung des aktuellen Tenants."""
+    return {**DOKUMENT_CACHE.statistik(), **DOKUMENT_CACHE.belegung()}
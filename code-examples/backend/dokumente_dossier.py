@@ -0,0 +1,163 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from tenant_schemas.utils import schema_context
+
+from sterbefall.dateicache import DateiCache
+from sterbefall.models import Sterbefall
+from .ausgabe import DOKUMENT_CACHE, auftrag
+from .dossier_render import vorlage_fuellen
+from .layout import fuellen, layout_plan
+from .models import Vorlage
+from .vorlagen import ist_pdf
+
+try:
+    from PyPDF2 import PdfMerger
+except ImportError:  # PyPDF2 < 2
+    from PyPDF2 import PdfFileMerger as PdfMerger
+
+DOSSIER_CACHE = DateiCache(
+    'dossiers', getattr(settings, 'DOSSIER_CACHE_MAX_BYTES', 500 * 1024 * 1024), endung='.pdf',
+)
+# Je Web-Prozess, zusätzlich zum Pool der Rechnungs-PDFs (rechnung/pdf.py): klein halten
+DOSSIER_WORKER = getattr(settings, 'DOSSIER_WORKER', max(1, min(4, (os.cpu_count() or 2) // 2)))
+MAX_VORLAGEN = getattr(settings, 'DOSSIER_MAX_VORLAGEN', 50)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def dossier_pool():
+    """Prozess-Pool zum Befüllen, einmal je Prozess und erst bei Bedarf gestartet."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: die Worker laden nur dossier_render und erben weder DB-Verbindungen noch Threads
+            _pool = ProcessPoolExecutor(max_workers=DOSSIER_WORKER, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _pool_verwerfen():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def dossier_vorlagen(ids=None, kategorie=None):
+    """PDF-Vorlagen des Dossiers: in der Reihenfolge von ids oder alle einer Kategorie nach Name."""
+    # Vorlagen ohne Metadaten werden bei Bedarf nachträglich eingelesen (siehe vorlagen.ist_pdf)
+    vorlagen = Vorlage.objects.filter(Q(ist_pdf=True) | Q(inhalt_hash__isnull=True))
+    if ids is not None:
+        reihenfolge = {vorlage_id: index for index, vorlage_id in enumerate(ids)}
+        vorlagen = sorted(vorlagen.filter(pk__in=ids), key=lambda vorlage: reihenfolge[vorlage.pk])
+    else:
+        vorlagen = vorlagen.filter(kategorie=kategorie).order_by('name', 'pk')
+    return [vorlage for vorlage in vorlagen if ist_pdf(vorlage)]
+
+
+def dossier_auftraege(sterbefall_id, vorlagen):
+    """Aufträge für alle Vorlagen; der Sterbefall wird einmal mit allen benötigten Feldern geladen."""
+    plaene = [layout_plan(vorlage) for vorlage in vorlagen]
+    spalten = set().union(*(plan.spalten for plan in plaene))
+    sterbefall = Sterbefall.objects.only(*(spalten or {'pk'})).get(pk=sterbefall_id)
+    return [auftrag(vorlage, plan, fuellen(plan, sterbefall)) for vorlage, plan in zip(vorlagen, plaene)]
+
+
+def dossier_schluessel(auftraege):
+    """Cache-Schlüssel des Dossiers aus den Schlüsseln seiner Dokumente."""
+    kodiert = json.dumps([einzel['schluessel'] for einzel in auftraege])
+    return hashlib.sha256(kodiert.encode('utf-8')).hexdigest()
+
+
+def zusammenfuehren(pdfs):
+    merger = PdfMerger()
+    for pdf in pdfs:
+        merger.append(io.BytesIO(pdf))
+    ausgabe = io.BytesIO()
+    merger.write(ausgabe)
+    merger.close()
+    return ausgabe.getvalue()
+
+
+def dossier_erzeugen(auftraege, schluessel, ergebnis=None):
+    """
+    Startet das Befüllen sofort (ein Auftrag je Worker) und liefert einen Iterator
+    über (fertig, vorlagenname) in der Reihenfolge der Fertigstellung. Bereits
+    gerenderte Dokumente kommen aus DOKUMENT_CACHE. Ist alles fertig, liegt das
+    zusammengeführte Dossier unter schluessel in DOSSIER_CACHE. Mit einer Liste
+    ergebnis wird immer erzeugt und die PDF dort zusätzlich angehängt (sie kann
+    den Cache sofort wieder verlassen, z.B. wenn sie größer als max_bytes ist).
+    """
+    if ergebnis is None and DOSSIER_CACHE.treffer_pfad(schluessel):
+        return iter(())
+    schema = connection.schema_name
+    teile = [DOKUMENT_CACHE.lesen(einzel['schluessel']) for einzel in auftraege]
+    offen = [index for index, teil in enumerate(teile) if teil is None]
+    futures = {}
+    if len(offen) > 1:
+        pool = dossier_pool()
+        futures = {pool.submit(vorlage_fuellen, auftraege[index]): index for index in offen}
+
+    def fortschritt():
+        fertig = 0
+        for index, teil in enumerate(teile):
+            if teil is not None:
+                fertig += 1
+                yield fertig, auftraege[index]['name']
+        neu = {}
+        try:
+            if futures:
+                for future in as_completed(futures):
+                    index = futures[future]
+                    teile[index] = neu[index] = future.result()
+                    fertig += 1
+                    yield fertig, auftraege[index]['name']
+            else:
+                for index in offen:
+                    teile[index] = neu[index] = vorlage_fuellen(auftraege[index])
+                    fertig += 1
+                    yield fertig, auftraege[index]['name']
+        except BrokenProcessPool:
+            _pool_verwerfen()  # abgestürzter Worker: beim nächsten Aufruf neuer Pool
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+        # Der Iterator kann nach dem Ende des Requests laufen (StreamingHttpResponse)
+        daten = zusammenfuehren(teile)
+        with schema_context(schema):
+            for index, teil in neu.items():
+                DOKUMENT_CACHE.schreiben(auftraege[index]['schluessel'], teil)
+            DOSSIER_CACHE.schreiben(schluessel, daten)
+        if ergebnis is not None:
+            ergebnis.append(daten)
+
+    return fortschritt()
+
+
+def dossier_oeffnen(auftraege, schluessel):
+    """
+    Das Dossier als geöffnete Datei (binär), erzeugt, falls es nicht (mehr) im Cache
+    liegt. Geöffnet bleibt es lesbar, auch wenn aufraeumen() die Datei danach löscht.
+    """
+    pfad = DOSSIER_CACHE.treffer_pfad(schluessel)
+    if pfad is not None:
+        try:
+            return open(pfad, 'rb')
+        except FileNotFoundError:
+            pass  # zwischen Treffer und Öffnen verdrängt
+    ergebnis = []
+    for _ in dossier_erzeugen(auftraege, schluessel, ergebnis):
+        pass
+    return io.BytesIO(ergebnis[0])
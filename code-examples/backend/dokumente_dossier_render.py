@@ -0,0 +1,90 @@
+"""
+Befüllen einer PDF-Vorlage im Worker-Prozess. Bewusst ohne Django-Importe (wie
+rechnung/pdf_render.py), die Worker (spawn) laden nur reportlab und PyPDF2.
+Eingabe ist das picklebare Dict aus dossier.auftrag().
+"""
+import copy
+import io
+from collections import OrderedDict
+
+from reportlab.pdfgen import canvas
+
+try:
+    from PyPDF2 import PdfReader, PdfWriter
+except ImportError:  # PyPDF2 < 2
+    from PyPDF2 import PdfFileReader as PdfReader, PdfFileWriter as PdfWriter
+
+# Bei jeder Änderung an der Darstellung erhöhen, damit gecachte Dokumente nicht mehr passen
+RENDER_VERSION = 1
+
+# Geparste Vorlagen je Worker; Folgeaufträge mit derselben Vorlage parsen nicht erneut
+VORLAGEN_JE_WORKER = 16
+
+_vorlagen = OrderedDict()
+
+
+def _leser(auftrag):
+    schluessel = auftrag['inhalt_hash']
+    leser = _vorlagen.get(schluessel)
+    if leser is not None:
+        _vorlagen.move_to_end(schluessel)
+        return leser
+    if auftrag.get('inhalt') is not None:
+        inhalt = auftrag['inhalt']
+    else:
+        with open(auftrag['pfad'], 'rb') as datei:
+            inhalt = datei.read()
+    leser = PdfReader(io.BytesIO(inhalt))
+    _vorlagen[schluessel] = leser
+    while len(_vorlagen) > VORLAGEN_JE_WORKER:
+        _vorlagen.popitem(last=False)
+    return leser
+
+
+def _box(seite):
+    box = seite.mediabox if hasattr(seite, 'mediabox') else seite.mediaBox
+    if hasattr(box, 'left'):
+        return float(box.left), float(box.bottom), float(box.width), float(box.height)
+    return float(box.getLowerLeft_x()), float(box.getLowerLeft_y()), float(box.getWidth()), float(box.getHeight())
+
+
+def _overlay(seite, felder):
+    """Eine Seite mit den Texten, so groß wie die Vorlagenseite."""
+    links, unten, breite, hoehe = _box(seite)
+    ausgabe = io.BytesIO()
+    leinwand = canvas.Canvas(ausgabe, pagesize=(links + breite, unten + hoehe))
+    for feld in felder:
+        if not feld['text']:
+            continue
+        leinwand.setFont(feld['schrift'], feld['schriftgroesse'])
+        leinwand.setFillColorRGB(*feld['farbe'])
+        # Koordinaten wie im Editor (pdf-lib): PDF-Punkte ab der Ecke der Mediabox
+        leinwand.drawString(links + feld['x'], unten + feld['y'], feld['text'])
+    leinwand.showPage()
+    leinwand.save()
+    return PdfReader(io.BytesIO(ausgabe.getvalue())).pages[0]
+
+
+def vorlage_fuellen(auftrag):
+    """Befüllte PDF als bytes. auftrag['felder']: {seite (ab 1): [feld, ...]}."""
+    leser = _leser(auftrag)
+    schreiber = PdfWriter()
+    for index, vorlage_seite in enumerate(leser.pages):
+        felder = auftrag['felder'].get(index + 1)
+        if felder:
+            # Kopie: die Seite des gecachten Lesers darf nicht verändert werden
+            seite = copy.copy(vorlage_seite)
+            overlay = _overlay(seite, felder)
+            if hasattr(seite, 'merge_page'):
+                seite.merge_page(overlay)
+            else:
+                seite.mergePage(overlay)
+        else:
+            seite = vorlage_seite
+        if hasattr(schreiber, 'add_page'):
+            schreiber.add_page(seite)
+        else:
+            schreiber.addPage(seite)
+    ausgabe = io.BytesIO()
+    schreiber.write(ausgabe)
+    return ausgabe.getvalue()
@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.db import transaction
+
+from .layout import FETTE_SCHRIFT, STANDARD_SCHRIFT, layout_geaendert
+
+# Abstand zwischen zwei verketteten Platzhaltern in Punkt
+ABSTAND = 10
+
+
+@lru_cache(maxsize=8192)
+def textbreite(text, schrift, groesse):
+    """Breite des gerenderten Texts in Punkt (reportlab-Fontmetriken, gecacht)."""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    return stringWidth(text, schrift, groesse) if text else 0.0
+
+
+def kettenschluessel(seite, chain_id):
+    """Eine Kette ist je Seite eindeutig: dieselbe chain_id auf zwei Seiten ergibt zwei Ketten."""
+    return (seite, chain_id) if chain_id else None
+
+
+def ketten_layouten(glieder):
+    """
+    Berechnet die x-Positionen aller Ketten in einem Durchlauf.
+    glieder: iterierbar von (id, kette, chain_position, x, text, schrift, groesse),
+    kette aus kettenschluessel().
+    Das erste Glied jeder Kette behält seine Position, jedes weitere beginnt hinter
+    dem Text des vorherigen plus ABSTAND; leere Glieder nehmen keinen Platz ein.
+    Liefert {id: x} für alle Glieder mit chain_id.
+    """
+    ketten = OrderedDict()
+    for glied in glieder:
+        if glied[1]:
+            ketten.setdefault(glied[1], []).append(glied)
+
+    positionen = {}
+    for kette in ketten.values():
+        kette.sort(key=lambda glied: (glied[2] is None, glied[2] or 0, glied[0]))
+        x = None
+        for glied_id, _, _, eigenes_x, text, schrift, groesse in kette:
+            if x is None:
+                x = eigenes_x
+            positionen[glied_id] = x
+            breite = textbreite(text or '', schrift, groesse)
+            if breite:
+                x += breite + ABSTAND
+    return positionen
+
+
+def plan_positionen(plan, werte):
+    """
+    Render-Modus: x-Positionen aller Felder eines LayoutPlans für die konkreten
+    Werte eines Falls ({instance_id: text} aus layout.fuellen), ohne DB-Zugriff.
+    Liefert {instance_id: x}; Felder ohne Kette behalten ihr x.
+    """
+    felder = [feld for _, seite in plan.seiten for feld in seite]
+    positionen = {feld.instance_id: feld.x for feld in felder}
+    positionen.update(ketten_layouten(
+        (feld.instance_id, kettenschluessel(feld.seite, feld.chain_id), feld.chain_position,
+         feld.x, werte.get(feld.instance_id, ''), feld.schrift, feld.schriftgroesse)
+        for feld in felder
+    ))
+    return positionen
+
+
+def ketten_speichern(vorlage_id, chain_ids=None, werte=None):
+    """
+    Speichert die Kettenpositionen einer Vorlage: eine Abfrage zum Laden, ein
+    bulk_update für alle geänderten Glieder. Ohne werte wird mit dem Platzhalter-Key
+    gemessen (so wie der Editor die Felder anzeigt), sonst mit {instance_id: text}.
+    Liefert die Anzahl geänderter Platzhalter.
+    """
+    from .models import PlatzhalterInstance
+
+    instanzen = PlatzhalterInstance.objects.filter(
+        pdf_template_id=vorlage_id, chain_id__isnull=False,
+    ).select_related('platzhalter')
+    if chain_ids is not None:
+        instanzen = instanzen.filter(chain_id__in=chain_ids)
+    instanzen = list(instanzen)
+
+    positionen = ketten_layouten(
+        (instanz.pk, kettenschluessel(instanz.page_number, instanz.chain_id), instanz.chain_position, instanz.x_position,
+         werte.get(instanz.pk, '') if werte is not None else instanz.platzhalter.platzhalter_key,
+         FETTE_SCHRIFT if instanz.bold else STANDARD_SCHRIFT, instanz.font_size)
+        for instanz in instanzen
+    )
+    geaendert = []
+    for instanz in instanzen:
+        if instanz.x_position != positionen[instanz.pk]:
+            instanz.x_position = positionen[instanz.pk]
+            geaendert.append(instanz)
+    if geaendert:
+        with transaction.atomic():
+            PlatzhalterInstance.objects.bulk_update(geaendert, ['x_position'], batch_size=500)
+            # bulk_update löst keine Signals aus
+            layout_geaendert([vorlage_id])
+    return len(geaendert)
@@ -0,0 +1,172 @@
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.db.models import F
+
+from sterbefall.cache import ProzessCache
+from sterbefall.models import Sterbefall
+
+# Anzahl kompilierter Layout-Pläne je Prozess
+PLAN_CACHE_GROESSE = getattr(settings, 'LAYOUT_PLAN_CACHE_GROESSE', 128)
+
+STANDARD_SCHRIFT = 'Helvetica'
+FETTE_SCHRIFT = 'Helvetica-Bold'
+
+PlanFeld = namedtuple(
+    'PlanFeld',
+    'instance_id key seite x y schrift schriftgroesse farbe chain_id chain_position lesen',
+)
+LayoutPlan = namedtuple('LayoutPlan', 'vorlage_id version seiten seitenformate spalten')
+
+# Platzhalter, die nicht direkt einem Feld des Sterbefalls entsprechen
+SONDER_PLATZHALTER = {
+    'heute': lambda sterbefall: date.today(),
+}
+
+# Pläne werden nie verändert und daher nicht kopiert
+_plaene = ProzessCache(PLAN_CACHE_GROESSE, kopie=None)
+
+
+def text(wert):
+    """Darstellung eines Werts im Dokument (deutsche Datums- und Zahlenformate)."""
+    if wert is None:
+        return ''
+    if isinstance(wert, bool):
+        return 'Ja' if wert else 'Nein'
+    if isinstance(wert, datetime):
+        return wert.strftime('%d.%m.%Y %H:%M')
+    if isinstance(wert, date):
+        return wert.strftime('%d.%m.%Y')
+    if isinstance(wert, Decimal):
+        return f'{wert:,}'.replace(',', 'X').replace('.', ',').replace('X', '.')
+    return str(wert)
+
+
+def _normalisiere_key(key):
+    return (key or '').strip().strip('{}').strip()
+
+
+def _leser(key):
+    """
+    Baut für einen Platzhalter-Key einmalig die Funktion sterbefall -> Text.
+    Liefert (leser, spalte); spalte ist das benötigte Sterbefall-Feld oder None.
+    """
+    if key in SONDER_PLATZHALTER:
+        holen = SONDER_PLATZHALTER[key]
+        return (lambda sterbefall: text(holen(sterbefall))), None
+
+    erstes = key.split('.', 1)[0]
+    try:
+        feld = Sterbefall._meta.get_field(erstes)
+    except FieldDoesNotExist:
+        return (lambda sterbefall: ''), None  # unbekannter Platzhalter bleibt leer
+    if not feld.concrete:
+        return (lambda sterbefall: ''), None
+
+    if '.' in key:
+        holen = attrgetter(key)
+
+        def lesen(sterbefall):
+            try:
+                return text(holen(sterbefall))
+            except AttributeError:
+                return ''
+        return lesen, feld.name
+
+    holen = attrgetter(feld.attname)
+    if feld.choices:
+        anzeige = {str(wert): str(bezeichnung) for wert, bezeichnung in feld.flatchoices}
+        return (lambda sterbefall: anzeige.get(str(holen(sterbefall)), text(holen(sterbefall)))), feld.name
+    return (lambda sterbefall: text(holen(sterbefall))), feld.name
+
+
+def farbe_rgb(name):
+    """Farbname oder Hexwert der PlatzhalterInstance als (r, g, b) zwischen 0 und 1."""
+    from reportlab.lib import colors
+
+    try:
+        farbe = colors.toColor(name or 'black')
+    except ValueError:
+        farbe = colors.black
+    return (farbe.red, farbe.green, farbe.blue)
+
+
+def _plan_schluessel(vorlage):
+    return (connection.schema_name, vorlage.pk, vorlage.inhalt_hash, vorlage.layout_version)
+
+
+def kompiliere_layout(vorlage):
+    """Übersetzt die PlatzhalterInstances einer Vorlage mit einer Abfrage in einen LayoutPlan."""
+    from .models import PlatzhalterInstance
+
+    instanzen = PlatzhalterInstance.objects.filter(pdf_template=vorlage).select_related('platzhalter').order_by(
+        'page_number', 'chain_id', 'chain_position', 'pk'
+    )
+    leser = {}
+    spalten = set()
+    seiten = OrderedDict()
+    for instanz in instanzen:
+        key = _normalisiere_key(instanz.platzhalter.platzhalter_key)
+        if key not in leser:
+            leser[key], spalte = _leser(key)
+            if spalte:
+                spalten.add(spalte)
+        seiten.setdefault(instanz.page_number, []).append(PlanFeld(
+            instance_id=instanz.pk,
+            key=key,
+            seite=instanz.page_number,
+            x=instanz.x_position,
+            y=instanz.y_position,
+            schrift=FETTE_SCHRIFT if instanz.bold else STANDARD_SCHRIFT,
+            schriftgroesse=instanz.font_size,
+            farbe=farbe_rgb(instanz.font_color),
+            chain_id=instanz.chain_id,
+            chain_position=instanz.chain_position,
+            lesen=leser[key],
+        ))
+    return LayoutPlan(
+        vorlage_id=vorlage.pk,
+        version=vorlage.layout_version,
+        seiten=tuple((seite, tuple(felder)) for seite, felder in seiten.items()),
+        seitenformate=tuple(
+            (seite.get('breite'), seite.get('hoehe'), seite.get('rotation', 0)) for seite in (vorlage.seiten or [])
+        ),
+        spalten=frozenset(spalten),
+    )
+
+
+def layout_plan(vorlage):
+    """
+    Der kompilierte Plan einer Vorlage aus dem prozesslokalen Cache. Der Schlüssel
+    enthält Inhalts-Hash und layout_version, geänderte Vorlagen bekommen also
+    automatisch einen neuen Plan.
+    """
+    schluessel = _plan_schluessel(vorlage)
+    plan = _plaene.get(schluessel)
+    if plan is None:
+        plan = kompiliere_layout(vorlage)
+        _plaene.set(schluessel, plan)
+    return plan
+
+
+def layout_geaendert(vorlage_ids):
+    """Erhöht die layout_version, z.B. nach Änderungen an PlatzhalterInstances."""
+    from .models import Vorlage
+
+    Vorlage.objects.filter(pk__in=vorlage_ids).update(layout_version=F('layout_version') + 1)
+
+
+def sterbefall_fuer_plan(plan, sterbefall_id, queryset=None):
+    """Lädt genau die Felder des Sterbefalls, die der Plan braucht (eine Abfrage)."""
+    queryset = Sterbefall.objects.all() if queryset is None else queryset
+    return queryset.only(*(plan.spalten or {'pk'})).get(pk=sterbefall_id)
+
+
+def fuellen(plan, sterbefall):
+    """Die Texte aller Platzhalter des Plans für einen Sterbefall: {instance_id: text}."""
+    return {feld.instance_id: feld.lesen(sterbefall) for _, felder in plan.seiten for feld in felder}
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+
+def vorlagen_einlesen(apps, schema_editor):
+    from dokumente.vorlagen import vorlage_einlesen
+
+    Vorlage = apps.get_model('dokumente', 'Vorlage')
+    for vorlage in Vorlage.objects.exclude(vorlage_datei='').iterator():
+        try:
+            vorlage_einlesen(vorlage)
+        except OSError:
+            continue  # Datei fehlt im Storage, bleibt ohne Metadaten
+        vorlage.save(update_fields=['inhalt_hash', 'ist_pdf', 'seitenzahl', 'seiten'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dokumente', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vorlage',
+            name='inhalt_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='vorlage',
+            name='ist_pdf',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vorlage',
+            name='seitenzahl',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='vorlage',
+            name='seiten',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(vorlagen_einlesen, migrations.RunPython.noop),
+    ]
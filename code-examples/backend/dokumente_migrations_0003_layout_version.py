@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dokumente', '0002_vorlage_metadaten'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vorlage',
+            name='layout_version',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
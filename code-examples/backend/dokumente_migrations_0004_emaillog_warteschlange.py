@@ -0,0 +1,51 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dokumente', '0003_layout_version'),
+    ]
+
+    operations = [
+        # Bestehende Einträge stammen aus dem synchronen Versand und gelten als abgeschlossen
+        migrations.AddField(
+            model_name='emaillog',
+            name='status',
+            field=models.CharField(choices=[('WARTEND', 'Wartend'), ('GESENDET', 'Gesendet'), ('FEHLGESCHLAGEN', 'Fehlgeschlagen')], default='GESENDET', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='betreff',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='nachricht',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='anhaenge',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='versuche',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='naechster_versuch',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='emaillog',
+            name='fehler',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddIndex(
+            model_name='emaillog',
+            index=models.Index(condition=models.Q(status='WARTEND'), fields=['naechster_versuch'], name='emaillog_wartend'),
+        ),
+    ]
@@ -1,9 +1,11 @@
 from django.db import models
 from platzhalter.models import Platzhalter
+from sterbefall.aenderungen import AenderungenMixin
+from .vorlagen import vorlage_einlesen
 
 
 
-class Vorlage(models.Model):
+class Vorlage(AenderungenMixin, models.Model):
     class Meta:
         app_label = 'dokumente'
     
@@ -11,10 +13,23 @@ class Vorlage(models.Model):
     kategorie = models.CharField(max_length=100,  null= True, blank=True)
     vorlage_datei = models.FileField(upload_to='dokumente/')
     is_vorlage = models.BooleanField(default=False)
+    # Beim Hochladen einmal ermittelt, siehe vorlagen.py
+    inhalt_hash = models.CharField(max_length=64, null=True, blank=True, editable=False, db_index=True)
+    ist_pdf = models.BooleanField(default=False, editable=False)
+    seitenzahl = models.IntegerField(null=True, blank=True, editable=False)
+    seiten = models.JSONField(default=list, blank=True, editable=False)
+    # Wird bei jeder Änderung der PlatzhalterInstances erhöht (Cache-Schlüssel der Layout-Pläne)
+    layout_version = models.IntegerField(default=0, editable=False)
     
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Nur bei neuer Datei (oder noch fehlenden Metadaten) neu einlesen
+        if self._state.adding or self.has_changed('vorlage_datei') or self.inhalt_hash is None:
+            vorlage_einlesen(self)
+        super().save(*args, **kwargs)
+
     
 class PlatzhalterInstance(models.Model):
     pdf_template = models.ForeignKey(Vorlage, on_delete=models.CASCADE)
@@ -28,29 +43,48 @@ class PlatzhalterInstance(models.Model):
     bold = models.BooleanField(default=False)
     chain_id = models.CharField(max_length=50, null=True, blank=True)  # Verkettungsfeld
     chain_position = models.IntegerField(null=True, blank=True)  # Position in der Kette
-    # Add a method to update positions of chained placeholders
+    # Update positions of chained placeholders (ein Laden, ein bulk_update, siehe ketten.py)
     def update_chained_positions(self):
         if not self.chain_id:
             return
-        placeholders_in_chain = PlatzhalterInstance.objects.filter(chain_id=self.chain_id).order_by('chain_position')
-        for index, placeholder in enumerate(placeholders_in_chain):
-            if index == 0:
-                continue  # Skip the first placeholder
-            previous_placeholder = placeholders_in_chain[index - 1]
-            placeholder.x_position = previous_placeholder.x_position + previous_placeholder.width + 10  # Adjust 10 for space
-            placeholder.save()  
+        from .ketten import ketten_speichern
+        ketten_speichern(self.pdf_template_id, chain_ids=[self.chain_id])
 
     def __str__(self):
         return f"{self.pdf_template.name} - {self.platzhalter.platzhalter_key}"
 
 
 class EmailLog(models.Model):
+    # Versand über die Warteschlange, siehe users/mailversand.py
+    WARTEND = 'WARTEND'
+    GESENDET = 'GESENDET'
+    FEHLGESCHLAGEN = 'FEHLGESCHLAGEN'
+    STATUS_CHOICES = (
+        (WARTEND, 'Wartend'),
+        (GESENDET, 'Gesendet'),
+        (FEHLGESCHLAGEN, 'Fehlgeschlagen'),
+    )
+
     timestamp = models.DateTimeField(auto_now_add=True)
     recipient = models.EmailField()
     document_name = models.CharField(max_length=255)
     sterbefall = models.ForeignKey('sterbefall.Sterbefall', on_delete=models.CASCADE, null=True, blank=True)  # Assuming you want to link to Sterbefall
     vorlage = models.ForeignKey(Vorlage, on_delete=models.SET_NULL, null=True, blank=True)  # Link to the Vorlage
     success = models.BooleanField(default=True)  # Track if the email was successfully sent
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=GESENDET)
+    betreff = models.CharField(max_length=255, blank=True, default='')
+    nachricht = models.TextField(blank=True, default='')
+    # [{"pfad": ..., "dateiname": ...}] oder [{"vorlage_id": ..., "sterbefall_id": ...}] (befüllt beim Versand)
+    anhaenge = models.JSONField(default=list, blank=True)
+    versuche = models.IntegerField(default=0)
+    naechster_versuch = models.DateTimeField(null=True, blank=True)
+    fehler = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['naechster_versuch'], name='emaillog_wartend',
+                         condition=models.Q(status='WARTEND')),
+        ]
 
     def __str__(self):
         return f"Email sent to {self.recipient} on {self.timestamp}"
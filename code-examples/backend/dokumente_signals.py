@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from platzhalter.models import Platzhalter
+from .layout import layout_geaendert
+from .models import PlatzhalterInstance, Vorlage
+
+
+@receiver([post_save, post_delete], sender=PlatzhalterInstance)
+def platzhalterinstance_layout_geaendert(sender, instance, **kwargs):
+    layout_geaendert([instance.pdf_template_id])
+
+
+@receiver(post_save, sender=Platzhalter)
+def platzhalter_layout_geaendert(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    # Geänderter Key betrifft alle Vorlagen, die den Platzhalter verwenden
+    layout_geaendert(
+        Vorlage.objects.filter(platzhalterinstance__platzhalter=instance).values('pk')
+    )
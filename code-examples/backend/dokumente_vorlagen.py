@@ -0,0 +1,115 @@
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+try:
+    from PyPDF2 import PdfReader
+except ImportError:  # PyPDF2 < 2
+    from PyPDF2 import PdfFileReader as PdfReader
+
+# Neue Vorlagen mit qpdf linearisieren (sofern installiert), damit pdf.js früh rendern kann
+LINEARISIEREN = getattr(settings, 'VORLAGE_LINEARISIEREN', True)
+
+def _inhalt(datei):
+    if not datei._committed:
+        # Frischer Upload vor dem Speichern: nicht schließen, FileField.pre_save liest ihn noch
+        datei.file.seek(0)
+        inhalt = datei.file.read()
+        datei.file.seek(0)
+        return inhalt
+    datei.open('rb')
+    try:
+        return datei.read()
+    finally:
+        datei.close()
+
+
+def _seiten_metadaten(leser):
+    seiten = []
+    for seite in leser.pages:
+        box = seite.mediabox if hasattr(seite, 'mediabox') else seite.mediaBox
+        rotation = int(seite.get('/Rotate', 0) or 0) % 360
+        seiten.append({
+            'breite': float(box.width if hasattr(box, 'width') else box.getWidth()),
+            'hoehe': float(box.height if hasattr(box, 'height') else box.getHeight()),
+            'links': float(box.left if hasattr(box, 'left') else box.getLowerLeft_x()),
+            'unten': float(box.bottom if hasattr(box, 'bottom') else box.getLowerLeft_y()),
+            'rotation': rotation,
+        })
+    return seiten
+
+
+def linearisieren(inhalt):
+    """
+    Linearisierte Fassung der PDF (qpdf --linearize): pdf.js kann die erste Seite
+    nach einem kleinen Range-Request anzeigen. None, wenn qpdf fehlt oder scheitert.
+    """
+    qpdf = shutil.which('qpdf')
+    if not LINEARISIEREN or qpdf is None:
+        return None
+    with tempfile.TemporaryDirectory() as verzeichnis:
+        eingabe = os.path.join(verzeichnis, 'eingabe.pdf')
+        ausgabe = os.path.join(verzeichnis, 'ausgabe.pdf')
+        with open(eingabe, 'wb') as datei:
+            datei.write(inhalt)
+        try:
+            ergebnis = subprocess.run([qpdf, '--linearize', eingabe, ausgabe], capture_output=True, timeout=60)
+        except subprocess.TimeoutExpired:
+            return None
+        # Exit-Code 3: mit Warnungen geschrieben
+        if ergebnis.returncode not in (0, 3) or not os.path.exists(ausgabe):
+            return None
+        with open(ausgabe, 'rb') as datei:
+            return datei.read()
+
+
+def vorlage_einlesen(vorlage):
+    """
+    Liest die hochgeladene Datei einmal ein und setzt inhalt_hash, ist_pdf, seitenzahl
+    und seiten (Größe, Ursprung und Rotation je Seite) an der Vorlage, ohne zu speichern.
+    Frische PDF-Uploads werden vorher linearisiert. Fehlt die Datei im Storage,
+    bleibt die Vorlage ohne Metadaten (wie in Migration 0002).
+    """
+    datei = vorlage.vorlage_datei
+    vorlage.inhalt_hash, vorlage.ist_pdf, vorlage.seitenzahl, vorlage.seiten = None, False, None, []
+    if not datei:
+        return
+    try:
+        inhalt = _inhalt(datei)
+    except OSError:
+        return
+    if not datei._committed and inhalt.startswith(b'%PDF-'):
+        linear = linearisieren(inhalt)
+        if linear is not None:
+            # Speichert die linearisierte Fassung statt des Uploads (pre_save überspringt die Datei dann)
+            datei.save(os.path.basename(datei.name), ContentFile(linear), save=False)
+            inhalt = linear
+    vorlage.inhalt_hash = hashlib.sha256(inhalt).hexdigest()
+    if not inhalt.startswith(b'%PDF-'):
+        return
+    try:
+        leser = PdfReader(io.BytesIO(inhalt))
+        seiten = _seiten_metadaten(leser)
+    except Exception:  # beschädigte oder verschlüsselte PDF: wie bisher als Nicht-PDF behandeln
+        return
+    vorlage.ist_pdf = True
+    vorlage.seitenzahl = len(seiten)
+    vorlage.seiten = seiten
+
+
+def ist_pdf(vorlage):
+    """
+    vorlage.ist_pdf; fehlen die Metadaten noch (Datei war beim Einlesen nicht lesbar),
+    wird die Vorlage jetzt eingelesen und bei Erfolg gespeichert.
+    """
+    if vorlage.inhalt_hash is None and vorlage.vorlage_datei:
+        vorlage_einlesen(vorlage)
+        if vorlage.inhalt_hash is not None:
+            vorlage.save(update_fields=['inhalt_hash', 'ist_pdf', 'seitenzahl', 'seiten'])
+    return vorlage.ist_pdf
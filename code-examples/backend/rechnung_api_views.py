@@ -2,20 +2,46 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
-from .models import Rechnung, Rechnungsposition
-from django.core.cache import cache
+from .models import Rechnung, Rechnungsposition, UmsatzStatistik
+from sterbefall.cache import lese_durch
+from .signals import RECHNUNGEN_CACHE
+from .kopieren import positionen_kopieren, rechnung_kopieren
+from .events import protokolliere
+from .umsatz import KATEGORIEN, umsatz_verlauf
+from .pdf import MAX_BATCH, dateiname, pdfs_erzeugen, pdfs_zippen, pdfs_zusammenfuehren, rechnungen_laden
+from django.http import HttpResponse
 from .serializers import RechnungspositionSerializer, RechnungSerializer, StandardRechnungSerializer
 from rest_framework import viewsets, filters
 from django.db import models
 from rest_framework.decorators import action, api_view
-from django.db.models import Case, When, Value, IntegerField
 from datetime import date, timedelta
 from django.core.exceptions import ValidationError
-from django.utils import timezone
+from sterbefall.pagination import OptionaleCursorPagination
+from sterbefall.schnell_lesen import SchnellLesenMixin
 
-class StandardRechnungViewSet(viewsets.ModelViewSet):
-    queryset = Rechnung.objects.filter(is_standard=True)
+def standard_positionen_hinzufuegen(request, pk):
+    """Kopiert die Positionen einer Standardrechnung in die Rechnung pk."""
+    try:
+        rechnung = Rechnung.objects.get(pk=pk)
+        standard_rechnung_id = request.data.get('standard_rechnung_id')
+        if not standard_rechnung_id:
+            return Response({'error': 'Standard_rechnung_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        standard_rechnung = Rechnung.objects.get(id=standard_rechnung_id, is_standard=True)
+        new_positions = positionen_kopieren(standard_rechnung, rechnung)
+        if not new_positions:
+            return Response({'message': 'No positions available in the standard invoice'}, status=status.HTTP_204_NO_CONTENT)
+
+        serializer = RechnungspositionSerializer(new_positions, many=True)
+        return Response({'message': 'Positions added successfully', 'positions': serializer.data}, status=status.HTTP_201_CREATED)
+    except Rechnung.DoesNotExist:
+        return Response({'error': 'Rechnung does not exist'}, status=status.HTTP_404_NOT_FOUND)
+
+class StandardRechnungViewSet(SchnellLesenMixin, viewsets.ModelViewSet):
+    queryset = Rechnung.objects.filter(is_standard=True).prefetch_related('events')
     serializer_class = StandardRechnungSerializer
+    pagination_class = OptionaleCursorPagination
+    keyset_ordering = ('-id',)
 
     def get_object(self):
         queryset = self.get_queryset()
@@ -26,48 +52,22 @@ class StandardRechnungViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def add_standard_positions(self, request, pk=None):
-        try:
-            rechnung = Rechnung.objects.get(pk=pk)
-            standard_rechnung_id = request.data.get('standard_rechnung_id')
-            if not standard_rechnung_id:
-                return Response({'error': 'Standard_rechnung_id is required'}, status=status.HTTP_400_BAD_REQUEST)
-
-            standard_rechnung = Rechnung.objects.get(id=standard_rechnung_id, is_standard=True)
-            positions = list(standard_rechnung.rechnungsposition_set.all())
-            if not positions:
-                return Response({'message': 'No positions available in the standard invoice'}, status=status.HTTP_204_NO_CONTENT)
-
-            new_positions = []
-            for position in positions:
-                new_position = Rechnungsposition.objects.create(
-                    category=position.category,
-                    produkt=position.produkt,
-                    menge=position.menge,
-                    preis=position.preis,
-                    mwst=position.mwst,
-                    betrag=position.betrag,
-                    rechnung=rechnung
-                )
-                new_positions.append(new_position)
-
-            serializer = RechnungspositionSerializer(new_positions, many=True)
-            return Response({'message': 'Positions added successfully', 'positions': serializer.data}, status=status.HTTP_201_CREATED)
-        except Rechnung.DoesNotExist:
-            return Response({'error': 'Rechnung does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        return standard_positionen_hinzufuegen(request, pk)
 
 class RechnungenForSterbefallView(APIView):
     def get(self, request, sterbefall_id, format=None):
-        cache_key = f'rechnungen_for_sterbefall_{sterbefall_id}'
-        rechnungen = cache.get(cache_key)
-        if not rechnungen:
-            rechnungen = Rechnung.objects.filter(sterbefall=sterbefall_id)
-            cache.set(cache_key, rechnungen)
-        serializer = RechnungSerializer(rechnungen, many=True)
-        return Response(serializer.data)
+        def laden():
+            rechnungen = Rechnung.objects.filter(sterbefall=sterbefall_id).prefetch_related('events')
+            return list(RechnungSerializer(rechnungen, many=True).data)
+
+        # Serialisierte Antwort je Tenant und Sterbefall, invalidiert über signals.py
+        return Response(lese_durch(RECHNUNGEN_CACHE, sterbefall_id, laden))
 
-class RechnungViewSet(viewsets.ModelViewSet):
-    queryset = Rechnung.objects.all()
+class RechnungViewSet(SchnellLesenMixin, viewsets.ModelViewSet):
+    queryset = Rechnung.objects.prefetch_related('events')
     serializer_class = RechnungSerializer
+    pagination_class = OptionaleCursorPagination
+    keyset_ordering = ('-id',)
 
     def retrieve(self, request, sterbefall_id=None, rechnung_id=None, *args, **kwargs):
         instance = self.get_object()
@@ -124,70 +124,19 @@ class RechnungViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Erstelle eine neue Rechnung mit Bezug zur Originalrechnung
-        korrektur_rechnung = Rechnung.objects.create(
-            sterbefall=original_rechnung.sterbefall,
-            rechnungsdatum=original_rechnung.rechnungsdatum,
-            anrede = original_rechnung.anrede,
-            titel = original_rechnung.titel,
-            auftraggerber_vorname = original_rechnung.auftraggerber_vorname,
-            auftraggeber_nachname = original_rechnung.auftraggeber_nachname,
-            strasse = original_rechnung.strasse,
-            plz = original_rechnung.plz,
-            stadt = original_rechnung.stadt,
-            land = original_rechnung.land,
-            verstorbenen_vorname = original_rechnung.verstorbenen_vorname,
-            verstorbenen_nachname = original_rechnung.verstorbenen_nachname,
-            textblock = original_rechnung.textblock,
+        # Erstelle eine neue Rechnung mit Bezug zur Originalrechnung, inkl. aller Positionen
+        korrektur_rechnung = rechnung_kopieren(
+            original_rechnung,
             original_rechnung=original_rechnung,
             rechnungsstufe=original_rechnung.rechnungsstufe + 1,
         )
 
-        # Kopiere Rechnungspositionen
-        for position in original_rechnung.rechnungsposition_set.all():
-            Rechnungsposition.objects.create(
-                category=position.category,
-                produkt=position.produkt,
-                menge=position.menge,
-                preis=position.preis,
-                mwst=position.mwst,
-                betrag=position.betrag,
-                rechnung=korrektur_rechnung
-            )
-
         serializer = self.get_serializer(korrektur_rechnung)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'])
     def add_standard_positions(self, request, pk=None):
-        try:
-            rechnung = Rechnung.objects.get(pk=pk)
-            standard_rechnung_id = request.data.get('standard_rechnung_id')
-            if not standard_rechnung_id:
-                return Response({'error': 'Standard_rechnung_id is required'}, status=status.HTTP_400_BAD_REQUEST)
-
-            standard_rechnung = Rechnung.objects.get(id=standard_rechnung_id, is_standard=True)
-            positions = list(standard_rechnung.rechnungsposition_set.all())
-            if not positions:
-                return Response({'message': 'No positions available in the standard invoice'}, status=status.HTTP_204_NO_CONTENT)
-
-            new_positions = []
-            for position in positions:
-                new_position = Rechnungsposition.objects.create(
-                    category=position.category,
-                    produkt=position.produkt,
-                    menge=position.menge,
-                    preis=position.preis,
-                    mwst=position.mwst,
-                    betrag=position.betrag,
-                    rechnung=rechnung
-                )
-                new_positions.append(new_position)
-
-            serializer = RechnungspositionSerializer(new_positions, many=True)
-            return Response({'message': 'Positions added successfully', 'positions': serializer.data}, status=status.HTTP_201_CREATED)
-        except Rechnung.DoesNotExist:
-            return Response({'error': 'Rechnung does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        return standard_positionen_hinzufuegen(request, pk)
 
 
     @action(detail=True, methods=['post'])
@@ -230,18 +179,69 @@ class RechnungViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(rechnung)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['get'])
+    def pdf(self, request, pk=None):
+        """Rechnung als serverseitig gerenderte PDF (aus dem Cache, solange sich nichts geändert hat)."""
+        rechnung = rechnungen_laden(self.get_queryset().filter(pk=pk)).first()
+        if rechnung is None:
+            return Response({"error": "Rechnung does not exist"}, status=status.HTTP_404_NOT_FOUND)
+        pdf = pdfs_erzeugen([rechnung])[0]
+        response = HttpResponse(pdf, content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="{dateiname(rechnung)}"'
+        return response
+
+    @action(detail=False, methods=['post'])
+    def pdf_batch(self, request):
+        """
+        Rendert mehrere Rechnungen parallel: {"ids": [...]} oder {"monat": "2024-03"}
+        (alle Rechnungen mit Rechnungsdatum im Monat), "format": "pdf" (eine
+        zusammengeführte Datei, Standard) oder "zip" (eine Datei je Rechnung).
+        """
+        format = request.data.get('format', 'pdf')
+        if format not in ('pdf', 'zip'):
+            return Response({"error": 'format muss "pdf" oder "zip" sein.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = self.get_queryset().filter(is_standard=False)
+        if request.data.get('ids'):
+            ids = request.data['ids']
+            if not isinstance(ids, list) or not all(isinstance(rechnung_id, int) for rechnung_id in ids):
+                return Response({"error": "ids muss eine Liste von IDs sein."}, status=status.HTTP_400_BAD_REQUEST)
+            reihenfolge = {rechnung_id: index for index, rechnung_id in enumerate(ids)}
+            rechnungen = sorted(rechnungen_laden(queryset.filter(pk__in=ids)), key=lambda r: reihenfolge[r.pk])
+        elif request.data.get('monat'):
+            try:
+                jahr, monat = (int(teil) for teil in request.data['monat'].split('-'))
+            except (AttributeError, ValueError):
+                return Response({"error": "monat im Format JJJJ-MM angeben."}, status=status.HTTP_400_BAD_REQUEST)
+            rechnungen = list(rechnungen_laden(
+                queryset.filter(rechnungsdatum__year=jahr, rechnungsdatum__month=monat).order_by('rechnungsdatum', 'pk')
+            ))
+        else:
+            return Response({"error": "ids oder monat angeben."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not rechnungen:
+            return Response({"error": "Keine Rechnungen gefunden."}, status=status.HTTP_404_NOT_FOUND)
+        if len(rechnungen) > MAX_BATCH:
+            return Response({"error": f"Höchstens {MAX_BATCH} Rechnungen je Aufruf."}, status=status.HTTP_400_BAD_REQUEST)
+
+        pdfs = pdfs_erzeugen(rechnungen)
+        if format == 'zip':
+            response = HttpResponse(pdfs_zippen(rechnungen, pdfs), content_type='application/zip')
+            response['Content-Disposition'] = 'attachment; filename="rechnungen.zip"'
+        else:
+            response = HttpResponse(pdfs_zusammenfuehren(pdfs), content_type='application/pdf')
+            response['Content-Disposition'] = 'attachment; filename="rechnungen.pdf"'
+        return response
+
     def log_event(self, rechnung, event_type):
         user = self.request.user.username if self.request and self.request.user else 'System'
-        event = {
-            'timestamp': timezone.now().isoformat(),
-            'event_type': event_type,
-            'user': user,
-        }
-        rechnung.protokoll.append(event)
-        rechnung.save()
+        # Eigene Zeile in RechnungEvent, die Rechnung selbst wird nicht erneut gespeichert
+        protokolliere(rechnung, event_type, user)
 
-class RechnungspositionViewSet(viewsets.ModelViewSet):
+class RechnungspositionViewSet(SchnellLesenMixin, viewsets.ModelViewSet):
     serializer_class = RechnungspositionSerializer
+    pagination_class = OptionaleCursorPagination
+    keyset_ordering = ('id',)
     filter_backends = [filters.SearchFilter]
     search_fields = ['produkt']
 
@@ -251,13 +251,7 @@ class RechnungspositionViewSet(viewsets.ModelViewSet):
 
     def list(self, request, sterbefall_id=None, rechnung_id=None):
         queryset = self.filter_queryset(self.get_queryset())
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.liste_antwort(queryset)
 
     def retrieve(self, request, sterbefall_id=None, rechnung_id=None, pk=None):
         queryset = self.get_queryset()
@@ -299,35 +293,55 @@ def rechnungsposition_category_summary(request, year=None):
     except ValueError:
         return Response({"error": "Invalid year format. Year must be an integer."}, status=400)
 
-    # Filtere Rechnungspositionen nach Jahr (basierend auf Rechnungsdatum)
-    rechnungspositionen = Rechnungsposition.objects.filter(
-        rechnung__rechnungsdatum__year=year
-    )
-
-    # Aggregiere die Beträge nach Kategorie
-    category_summary = rechnungspositionen.aggregate(
-        total_exp=models.Sum(Case(
-            When(category='EXP', then='betrag'),
-            default=Value(0),
-            output_field=models.DecimalField()
-        )),
-        total_ext=models.Sum(Case(
-            When(category='EXT', then='betrag'),
-            default=Value(0),
-            output_field=models.DecimalField()
-        )),
-        total_own=models.Sum(Case(
-            When(category='OWN', then='betrag'),
-            default=Value(0),
-            output_field=models.DecimalField()
-        ))
+    # Summen aus der vorberechneten Umsatzstatistik statt über alle Positionen des Jahres
+    summen = dict(
+        UmsatzStatistik.objects.filter(jahr=year, category__in=KATEGORIEN)
+        .values('category').annotate(summe=models.Sum('betrag')).order_by()
+        .values_list('category', 'summe')
     )
 
     # Formatiere die Daten für den BarChart
     data = [
-        {'category': 'EXP', 'total_betrag': float(category_summary['total_exp'] or 0)},
-        {'category': 'EXT', 'total_betrag': float(category_summary['total_ext'] or 0)},
-        {'category': 'OWN', 'total_betrag': float(category_summary['total_own'] or 0)},
+        {'category': category, 'total_betrag': float(summen.get(category) or 0)}
+        for category in KATEGORIEN
     ]
 
-    return Response(data)
\ No newline at end of file
+    return Response(data)
+
+
+def _monat_param(wert, ende=False):
+    """'2024' oder '2024-03' -> (jahr, monat); ein Jahr allein meint Januar bzw. Dezember."""
+    jahr, _, monat = wert.partition('-')
+    monat = int(monat) if monat else (12 if ende else 1)
+    if not 1 <= monat <= 12:
+        raise ValueError(wert)
+    return int(jahr), monat
+
+
+@api_view(['GET'])
+def umsatz_verlauf_view(request):
+    """
+    Umsatz nach Kategorie für beliebige Zeiträume, z.B. für mehrjährige Charts:
+    ?from=2021&to=2024-06&granularity=month|year&status=OFFEN,BEZAHLT
+    Ohne from/to: das laufende Jahr.
+    """
+    params = request.query_params
+    heute = date.today()
+    try:
+        von = _monat_param(params['from']) if params.get('from') else (heute.year, 1)
+        bis = _monat_param(params['to'], ende=True) if params.get('to') else (heute.year, 12)
+    except ValueError:
+        return Response({"error": "from/to müssen im Format JJJJ oder JJJJ-MM angegeben werden."}, status=400)
+    if von > bis:
+        return Response({"error": "from darf nicht nach to liegen."}, status=400)
+
+    granularitaet = params.get('granularity', 'month')
+    if granularitaet not in ('month', 'year'):
+        return Response({"error": 'granularity muss "month" oder "year" sein.'}, status=400)
+
+    status_filter = [wert.strip() for wert in params.get('status', '').split(',') if wert.strip()]
+    unbekannt = set(status_filter) - {choice[0] for choice in Rechnung.STATUS_CHOICES}
+    if unbekannt:
+        return Response({"error": f"Unbekannter Status: {', '.join(sorted(unbekannt))}"}, status=400)
+
+    return Response(umsatz_verlauf(von, bis, granularitaet, status_filter or None))
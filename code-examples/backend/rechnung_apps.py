@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class RechnungConfig(AppConfig):
+    name = 'rechnung'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,12 @@
+from users.aufgaben import aufgabe
+from .kopieren import rechnung_kopieren
+from .models import Rechnung
+
+
+# Kein automatischer Wiederholungsversuch: nach Timeout oder Absturz des Workers kann
+# die Kopie bereits committed sein, ein zweiter Lauf legte eine weitere Rechnung an
+@aufgabe('rechnung_kopieren', timeout=120, max_versuche=1)
+def rechnung_kopieren_aufgabe(rechnung_id, **abweichungen):
+    """Kopiert eine Rechnung samt Positionen; abweichungen wie bei kopieren.rechnung_kopieren."""
+    kopie = rechnung_kopieren(Rechnung.objects.get(pk=rechnung_id), **abweichungen)
+    return {'rechnung_id': kopie.pk, 'rechnungsnummer': kopie.rechnungsnummer}
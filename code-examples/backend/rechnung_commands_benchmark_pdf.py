@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from tenant_schemas.utils import schema_context
+
+from rechnung.models import Rechnung
+from rechnung.pdf import PDF_CACHE, PDF_WORKER, pdfs_erzeugen, rechnungen_laden, seitenzahl
+
+
+class Command(BaseCommand):
+    help = 'Misst das serverseitige Rendern von Rechnungs-PDFs (Seiten/s): seriell, Prozess-Pool und Cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema', help='Schema des Tenants')
+        parser.add_argument('--anzahl', type=int, default=50, help='Anzahl Rechnungen')
+
+    def handle(self, *args, **options):
+        with schema_context(options['schema']):
+            rechnungen = list(rechnungen_laden(
+                Rechnung.objects.filter(is_standard=False).order_by('-pk')[:options['anzahl']]
+            ))
+            if not rechnungen:
+                raise CommandError('Keine Rechnungen im Schema.')
+
+            # Pool vorab starten, damit der Prozessstart nicht in die Messung eingeht
+            pdfs_erzeugen(rechnungen[:2], cache=False)
+
+            laeufe = (
+                ('seriell', dict(parallel=False, cache=False)),
+                (f'Pool ({PDF_WORKER} Worker)', dict(parallel=True, cache=False)),
+                ('Cache befüllen', dict(parallel=True, cache=True)),
+                ('Cache-Treffer', dict(parallel=True, cache=True)),
+            )
+            seiten = None
+            for name, parameter in laeufe:
+                start = time.perf_counter()
+                pdfs = pdfs_erzeugen(rechnungen, **parameter)
+                dauer = time.perf_counter() - start
+                if seiten is None:
+                    seiten = sum(seitenzahl(pdf) for pdf in pdfs)
+                self.stdout.write(
+                    f'{name:22} {len(pdfs):4} Rechnungen  {seiten:5} Seiten  '
+                    f'{dauer:7.2f}s  {seiten / dauer:8.1f} Seiten/s'
+                )
+            self.stdout.write(f'Cache: {PDF_CACHE.statistik()}')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from tenant_schemas.utils import schema_context
+
+from rechnung.summen import summen_pruefen
+
+
+class Command(BaseCommand):
+    help = 'Prüft die gespeicherten Rechnungssummen eines Tenants gegen die Positionen.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema', help='Schema des Tenants')
+        parser.add_argument('--rechnung', type=int, action='append', dest='rechnungen',
+                            help='Nur diese Rechnung(en) prüfen')
+        parser.add_argument('--korrigieren', action='store_true',
+                            help='Abweichende Summen aus den Positionen neu schreiben')
+
+    def handle(self, *args, **options):
+        with schema_context(options['schema']):
+            abweichend = summen_pruefen(options['rechnungen'], korrigieren=options['korrigieren'])
+
+        if not abweichend:
+            self.stdout.write(self.style.SUCCESS(f"Alle Rechnungssummen in {options['schema']} stimmen."))
+            return
+        ids = ', '.join(str(rechnung_id) for rechnung_id in abweichend)
+        if options['korrigieren']:
+            self.stdout.write(self.style.SUCCESS(f"{len(abweichend)} Rechnung(en) korrigiert: {ids}"))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(abweichend)} Rechnung(en) mit Abweichung: {ids}"))
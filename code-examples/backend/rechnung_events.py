@@ -0,0 +1,61 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+from sterbefall.cache import invalidiere
+from .models import RechnungEvent
+from .signals import RECHNUNGEN_CACHE
+
+_lokal = threading.local()
+
+
+def _puffer():
+    return getattr(_lokal, 'puffer', None)
+
+
+def protokolliere(rechnung, event_type, user='System'):
+    """
+    Hängt ein Ereignis an das Protokoll der Rechnung an. Die Rechnungszeile selbst
+    wird dabei nie geschrieben. Innerhalb von sammeln() wird gepuffert.
+    """
+    event = RechnungEvent(
+        rechnung_id=rechnung.pk,
+        timestamp=timezone.now(),
+        event_type=event_type,
+        user=user,
+    )
+    puffer = _puffer()
+    if puffer is not None:
+        puffer.append((event, rechnung.sterbefall_id))
+    else:
+        event.save(force_insert=True)
+        # Ein prefetch_related('events') kennt das neue Ereignis nicht: rechnung.protokoll liest neu
+        getattr(rechnung, '_prefetched_objects_cache', {}).pop('events', None)
+        # protokoll ist Teil der gecachten Rechnungsliste des Falls
+        invalidiere(RECHNUNGEN_CACHE, rechnung.sterbefall_id)
+    return event
+
+
+@contextmanager
+def sammeln():
+    """
+    Sammelt alle protokolliere()-Aufrufe im Block und schreibt sie am Ende mit
+    einem INSERT, z.B. für Stapelverarbeitung über viele Rechnungen.
+    Verschachtelte Blöcke schreiben erst mit dem äußersten.
+    """
+    if _puffer() is not None:
+        yield
+        return
+    _lokal.puffer = []
+    try:
+        yield
+        events = _lokal.puffer
+    finally:
+        _lokal.puffer = None
+    if events:
+        with transaction.atomic():
+            RechnungEvent.objects.bulk_create([event for event, _ in events], batch_size=1000)
+            for sterbefall_id in {sterbefall_id for _, sterbefall_id in events}:
+                invalidiere(RECHNUNGEN_CACHE, sterbefall_id)
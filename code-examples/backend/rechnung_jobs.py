@@ -0,0 +1,35 @@
+from datetime import date
+
+from users.batch import tenant_job
+from .events import protokolliere, sammeln
+from .models import Rechnung
+from .summen import summen_pruefen
+from .umsatz import umsatz_neu_aufbauen
+
+UEBERFAELLIG = 'ÜBERFÄLLIG'
+
+
+@tenant_job('rechnungen_ueberfaellig', timeout=300)
+def rechnungen_ueberfaellig():
+    """Markiert offene Rechnungen nach Zahlungsziel einmalig mit einem ÜBERFÄLLIG-Ereignis."""
+    rechnungen = Rechnung.objects.filter(
+        status='OFFEN', zahlungsziel__lt=date.today(),
+    ).exclude(events__event_type=UEBERFAELLIG).only('pk', 'sterbefall_id')
+    anzahl = 0
+    with sammeln():
+        for rechnung in rechnungen.iterator(chunk_size=500):
+            protokolliere(rechnung, UEBERFAELLIG)
+            anzahl += 1
+    return anzahl
+
+
+@tenant_job('rechnungssummen_pruefen', timeout=900)
+def rechnungssummen_pruefen(korrigieren=True):
+    """Gleicht die gespeicherten Rechnungssummen mit den Positionen ab."""
+    return len(summen_pruefen(korrigieren=korrigieren))
+
+
+@tenant_job('umsatz_neu_aufbauen', timeout=900)
+def umsatzstatistik_neu_aufbauen():
+    """Baut die Umsatzstatistik aus den Positionen neu auf."""
+    return umsatz_neu_aufbauen()
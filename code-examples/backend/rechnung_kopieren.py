@@ -0,0 +1,62 @@
+from django.db import transaction
+
+from sterbefall.cache import invalidiere
+from .models import Rechnung, Rechnungsposition
+from .signals import RECHNUNGEN_CACHE
+from .summen import SUMMEN_SPALTEN, aktualisiere_summen
+from .umsatz import aktualisiere_umsatz
+
+# Kopfdaten, die beim Kopieren einer Rechnung übernommen werden
+KOPF_FELDER = (
+    'sterbefall_id',
+    'rechnungsdatum',
+    'anrede',
+    'titel',
+    'auftraggerber_vorname',
+    'auftraggeber_nachname',
+    'strasse',
+    'plz',
+    'stadt',
+    'land',
+    'verstorbenen_vorname',
+    'verstorbenen_nachname',
+    'textblock',
+)
+
+POSITIONS_FELDER = ('category', 'produkt', 'menge', 'preis', 'mwst', 'betrag')
+
+
+def positionen_kopieren(quelle, ziel):
+    """
+    Kopiert alle Positionen von quelle nach ziel mit einer Lese- und einer
+    Schreibabfrage, unabhängig von der Anzahl der Positionen.
+    """
+    with transaction.atomic():
+        neue_positionen = Rechnungsposition.objects.bulk_create([
+            Rechnungsposition(rechnung=ziel, **werte)
+            for werte in Rechnungsposition.objects.filter(rechnung=quelle).order_by('pk').values(*POSITIONS_FELDER)
+        ])
+        # bulk_create umgeht save() und Signals: Summen und Cache selbst nachziehen
+        aktualisiere_summen(neu=[(ziel.pk, position.betrag, position.mwst) for position in neue_positionen])
+        aktualisiere_umsatz(neu=[(ziel.pk, position.category, position.betrag) for position in neue_positionen])
+        invalidiere(RECHNUNGEN_CACHE, ziel.sterbefall_id)
+    return neue_positionen
+
+
+def rechnung_kopieren(quelle, **abweichungen):
+    """
+    Legt eine Kopie von quelle samt Positionen in einer Transaktion an.
+    abweichungen überschreiben Kopffelder, z.B. original_rechnung, rechnungsstufe,
+    rechnung_typ oder sterbefall für eine Kopie zu einem anderen Fall.
+    """
+    kopf = {feld: getattr(quelle, feld) for feld in KOPF_FELDER}
+    if 'sterbefall' in abweichungen:
+        kopf.pop('sterbefall_id')
+    kopf.update(abweichungen)
+
+    with transaction.atomic():
+        kopie = Rechnung.objects.create(**kopf)
+        positionen_kopieren(quelle, kopie)
+        # Summen wurden per F()-Update in der Datenbank gebucht
+        kopie.refresh_from_db(fields=SUMMEN_SPALTEN)
+    return kopie
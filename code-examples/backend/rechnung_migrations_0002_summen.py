@@ -0,0 +1,84 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def summen_aufbauen(apps, schema_editor):
+    from rechnung.summen import ABGESCHLOSSEN, _beitrag
+
+    Rechnung = apps.get_model('rechnung', 'Rechnung')
+    Rechnungsposition = apps.get_model('rechnung', 'Rechnungsposition')
+    RechnungSteuersatz = apps.get_model('rechnung', 'RechnungSteuersatz')
+
+    summen = {}
+    for position in Rechnungsposition.objects.values_list('rechnung_id', 'betrag', 'mwst').iterator():
+        schluessel, (netto, steuer) = _beitrag(*position)
+        alt_netto, alt_steuer = summen.get(schluessel, (0, 0))
+        summen[schluessel] = (alt_netto + netto, alt_steuer + steuer)
+
+    je_rechnung = {}
+    for (rechnung_id, _), (netto, steuer) in summen.items():
+        alt_netto, alt_steuer = je_rechnung.get(rechnung_id, (0, 0))
+        je_rechnung[rechnung_id] = (alt_netto + netto, alt_steuer + steuer)
+
+    # betrag_summe nur bei Entwürfen neu berechnen; abgeschlossene Rechnungen behalten den
+    # gestellten Betrag, Abweichungen werden nur gemeldet
+    abgeschlossen = dict(Rechnung.objects.filter(ABGESCHLOSSEN).values_list('pk', 'betrag_summe'))
+    Rechnung.objects.update(betrag_netto=0, betrag_steuer=0)
+    Rechnung.objects.exclude(ABGESCHLOSSEN).update(betrag_summe=0)
+    for rechnung_id, (netto, steuer) in je_rechnung.items():
+        werte = {'betrag_netto': netto, 'betrag_steuer': steuer}
+        if rechnung_id not in abgeschlossen:
+            werte['betrag_summe'] = netto + steuer
+        Rechnung.objects.filter(pk=rechnung_id).update(**werte)
+    abweichend = sorted(
+        rechnung_id for rechnung_id, summe in abgeschlossen.items()
+        if (summe or 0) != sum(je_rechnung.get(rechnung_id, (0, 0)))
+    )
+    if abweichend:
+        print(f'\n  {len(abweichend)} abgeschlossene Rechnung(en) mit abweichender betrag_summe '
+              f'(unverändert gelassen): {abweichend[:50]}')
+    RechnungSteuersatz.objects.bulk_create([
+        RechnungSteuersatz(rechnung_id=rechnung_id, mwst=mwst, netto=netto, steuer=steuer)
+        for (rechnung_id, mwst), (netto, steuer) in summen.items()
+        if netto or steuer
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rechnung', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rechnung',
+            name='betrag_netto',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='rechnung',
+            name='betrag_steuer',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='rechnung',
+            name='betrag_summe',
+            field=models.DecimalField(blank=True, decimal_places=2, default=0, max_digits=12, null=True),
+        ),
+        migrations.CreateModel(
+            name='RechnungSteuersatz',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mwst', models.DecimalField(decimal_places=0, max_digits=2)),
+                ('netto', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('steuer', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('rechnung', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='steuersaetze', to='rechnung.rechnung')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='rechnungsteuersatz',
+            constraint=models.UniqueConstraint(fields=('rechnung', 'mwst'), name='rechnungsteuersatz_rechnung_mwst'),
+        ),
+        migrations.RunPython(summen_aufbauen, migrations.RunPython.noop),
+    ]
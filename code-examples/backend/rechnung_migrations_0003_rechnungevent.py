@@ -0,0 +1,76 @@
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def protokoll_uebernehmen(apps, schema_editor):
+    Rechnung = apps.get_model('rechnung', 'Rechnung')
+    RechnungEvent = apps.get_model('rechnung', 'RechnungEvent')
+
+    events = []
+    rechnungen = Rechnung.objects.exclude(protokoll__isnull=True).exclude(protokoll=[])
+    for rechnung_id, protokoll in rechnungen.values_list('pk', 'protokoll').iterator():
+        for eintrag in protokoll or []:
+            if not isinstance(eintrag, dict):
+                continue
+            timestamp = parse_datetime(eintrag.get('timestamp') or '')
+            if timestamp is not None and timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp)
+            events.append(RechnungEvent(
+                rechnung_id=rechnung_id,
+                timestamp=timestamp or timezone.now(),
+                event_type=eintrag.get('event_type') or '',
+                user=eintrag.get('user') or 'System',
+            ))
+        if len(events) >= 1000:
+            RechnungEvent.objects.bulk_create(events)
+            events = []
+    RechnungEvent.objects.bulk_create(events)
+
+
+def protokoll_zurueckschreiben(apps, schema_editor):
+    Rechnung = apps.get_model('rechnung', 'Rechnung')
+    RechnungEvent = apps.get_model('rechnung', 'RechnungEvent')
+
+    protokolle = {}
+    for rechnung_id, timestamp, event_type, user in RechnungEvent.objects.order_by(
+        'rechnung_id', 'timestamp', 'id'
+    ).values_list('rechnung_id', 'timestamp', 'event_type', 'user').iterator():
+        protokolle.setdefault(rechnung_id, []).append(
+            {'timestamp': timestamp.isoformat(), 'event_type': event_type, 'user': user}
+        )
+    for rechnung_id, protokoll in protokolle.items():
+        Rechnung.objects.filter(pk=rechnung_id).update(protokoll=protokoll)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rechnung', '0002_summen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RechnungEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('event_type', models.CharField(max_length=200)),
+                ('user', models.CharField(max_length=150)),
+                ('rechnung', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='rechnung.rechnung')),
+            ],
+            options={
+                'ordering': ('timestamp', 'id'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='rechnungevent',
+            index=models.Index(fields=['rechnung', 'timestamp'], name='rechnungevent_rechnung_zeit'),
+        ),
+        migrations.RunPython(protokoll_uebernehmen, protokoll_zurueckschreiben),
+        migrations.RemoveField(
+            model_name='rechnung',
+            name='protokoll',
+        ),
+    ]
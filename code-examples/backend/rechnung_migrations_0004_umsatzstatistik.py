@@ -0,0 +1,52 @@
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def umsatz_aufbauen(apps, schema_editor):
+    Rechnungsposition = apps.get_model('rechnung', 'Rechnungsposition')
+    UmsatzStatistik = apps.get_model('rechnung', 'UmsatzStatistik')
+
+    summen = {}
+    for zeile in Rechnungsposition.objects.values(
+        'rechnung__rechnungsdatum__year', 'rechnung__rechnungsdatum__month', 'category', 'rechnung__status',
+    ).annotate(summe=Sum('betrag'), anzahl=Count('pk')).order_by():
+        schluessel = (
+            zeile['rechnung__rechnungsdatum__year'] or 0,
+            zeile['rechnung__rechnungsdatum__month'] or 0,
+            zeile['category'] or '',
+            zeile['rechnung__status'],
+        )
+        betrag, anzahl = summen.get(schluessel, (0, 0))
+        summen[schluessel] = (betrag + (zeile['summe'] or 0), anzahl + zeile['anzahl'])
+
+    UmsatzStatistik.objects.bulk_create([
+        UmsatzStatistik(jahr=jahr, monat=monat, category=category, status=status, betrag=betrag, anzahl=anzahl)
+        for (jahr, monat, category, status), (betrag, anzahl) in summen.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rechnung', '0003_rechnungevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UmsatzStatistik',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jahr', models.IntegerField()),
+                ('monat', models.IntegerField()),
+                ('category', models.CharField(blank=True, max_length=3)),
+                ('status', models.CharField(choices=[('ENTWURF', 'Entwurf'), ('OFFEN', 'Offen'), ('BEZAHLT', 'Bezahlt'), ('STORNIERT', 'Storniert')], max_length=10)),
+                ('betrag', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('anzahl', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='umsatzstatistik',
+            constraint=models.UniqueConstraint(fields=('jahr', 'monat', 'category', 'status'), name='umsatzstatistik_bucket'),
+        ),
+        migrations.RunPython(umsatz_aufbauen, migrations.RunPython.noop),
+    ]
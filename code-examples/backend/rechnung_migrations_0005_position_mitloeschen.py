@@ -0,0 +1,18 @@
+from django.db import migrations, models
+import rechnung.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rechnung', '0004_umsatzstatistik'),
+    ]
+
+    operations = [
+        # Nur Python-Seite (Collector), keine Änderung am Schema
+        migrations.AlterField(
+            model_name='rechnungsposition',
+            name='rechnung',
+            field=models.ForeignKey(on_delete=rechnung.models.positionen_mitloeschen, to='rechnung.rechnung'),
+        ),
+    ]
@@ -1,10 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 from sterbefall.models import Sterbefall
+from sterbefall.nummernkreis import naechste_nummer
+from sterbefall.aenderungen import AenderungenMixin
+from .summen import SUMMEN_FELDER, aktualisiere_summen
+from .umsatz import aktualisiere_umsatz, rechnung_verschieben
 from django.core.exceptions import ValidationError
 from datetime import date, timedelta
-from django.contrib.postgres.fields import JSONField
 
-class Rechnung(models.Model):
+class Rechnung(AenderungenMixin, models.Model):
     STATUS_CHOICES = (
         ('ENTWURF', 'Entwurf'),
         ('OFFEN', 'Offen'),
@@ -40,7 +43,11 @@ class Rechnung(models.Model):
     sterbefall = models.ForeignKey(Sterbefall, on_delete=models.CASCADE, null=True, blank=True)
     rechnungsdatum = models.DateField(null=True, blank=True)
     zahlungsziel = models.DateField(null=True, blank=True)
-    betrag_summe = models.DecimalField(max_digits=10, decimal_places=2, default=0, null=True, blank=True)
+    # Summen werden aus den Positionen gepflegt (summen.py), betrag_summe ist der Bruttobetrag.
+    # betrag_summe bleibt für API-Clients schreibbar; Positionsänderungen buchen nur die Differenz darauf.
+    betrag_netto = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    betrag_steuer = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    betrag_summe = models.DecimalField(max_digits=12, decimal_places=2, default=0, null=True, blank=True)
     rechnungsnummer = models.CharField(max_length=200, null=True, blank=True, editable=False)
     anrede = models.CharField(max_length=200, null=True, blank=True)
     titel = models.CharField(max_length=200, null=True, blank=True)
@@ -54,58 +61,94 @@ class Rechnung(models.Model):
     verstorbenen_nachname = models.CharField(max_length=200, null=True, blank=True)
     textblock = models.TextField(null=True, blank=True)
     is_geschrieben = models.BooleanField(default=False)
-    protokoll = JSONField(null=True, blank=True, default=list)
 
     class Meta:
         app_label = 'rechnung'
 
+    @property
+    def protokoll(self):
+        """Ereignisse der Rechnung im bisherigen Format [{'timestamp', 'event_type', 'user'}, ...]."""
+        # events.all() nutzt ein prefetch_related('events') der Liste
+        return [event.als_dict() for event in self.events.all()]
+
+    @property
+    def mwst_aufschluesselung(self):
+        """Summen je MwSt-Satz, z.B. für den Rechnungsfuß: [{'mwst', 'netto', 'steuer', 'brutto'}, ...]."""
+        return [
+            {'mwst': satz.mwst, 'netto': satz.netto, 'steuer': satz.steuer, 'brutto': satz.netto + satz.steuer}
+            for satz in self.steuersaetze.exclude(netto=0, steuer=0).order_by('mwst')
+        ]
+
     def save(self, *args, **kwargs):
         if self.status == 'OFFEN' and self.pk:
-            original = Rechnung.objects.get(pk=self.pk)
-            if original.status == 'ENTWURF' and self.status == 'OFFEN':
+            # Alter Status aus dem Ladezustand, ohne die Rechnung erneut abzufragen
+            if self.old_value('status') == 'ENTWURF':
                 self.rechnungsdatum = date.today()
                 self.zahlungsziel = date.today() + timedelta(days=21)
 
         if self.status == 'BEZAHLT' and self.is_geschrieben:
             raise ValidationError("Eine bezahlte Rechnung kann nicht mehr bearbeitet werden.")
 
-        if self._state.adding:
-            if self.sterbefall:
-                auftragsnummer = self.sterbefall.auftragsnummer
-                rechnung_typ_prefix = "R" if self.rechnung_typ == "RECHNUNG" else "A"  # "R" für Rechnung, "A" für Angebot
-                existing_rechnungen = Rechnung.objects.filter(
-                    sterbefall=self.sterbefall,
-                    rechnung_typ=self.rechnung_typ  # Filtern nach Rechnungstyp
-                ).count()
-                if existing_rechnungen == 0:
-                    self.rechnungsnummer = f"{rechnung_typ_prefix}{auftragsnummer}"
-                else:
-                    self.rechnungsnummer = f"{rechnung_typ_prefix}{auftragsnummer}/{existing_rechnungen + 1}"
-
-                if not self.anrede:
-                    self.anrede = self.sterbefall.auftraggeber_anrede
-                if not self.titel:
-                    self.titel = self.sterbefall.auftraggeber_titel
-                if not self.auftraggerber_vorname:
-                    self.auftraggerber_vorname = self.sterbefall.auftraggeber_vorname
-                if not self.auftraggeber_nachname:
-                    self.auftraggeber_nachname = self.sterbefall.auftraggeber_nachname
-                if not self.verstorbenen_vorname:
-                    self.verstorbenen_vorname = self.sterbefall.verstorbener_vorname
-                if not self.verstorbenen_nachname:
-                    self.verstorbenen_nachname = self.sterbefall.verstorbener_nachname
-                if not self.strasse:
-                    self.strasse = self.sterbefall.auftraggeber_strasse
-                if not self.plz:
-                    self.plz = self.sterbefall.auftraggeber_plz
-                if not self.stadt:
-                    self.stadt = self.sterbefall.auftraggeber_stadt
-                if not self.land:
-                    self.land = self.sterbefall.auftraggeber_land
-
-        super().save(*args, **kwargs)
-
-class Rechnungsposition(models.Model):
+        # Nummernvergabe und Insert in einer Transaktion (Sperre auf dem Nummernkreis bis zum Commit)
+        with transaction.atomic():
+            if self._state.adding:
+                if self.sterbefall:
+                    auftragsnummer = self.sterbefall.auftragsnummer
+                    rechnung_typ_prefix = "R" if self.rechnung_typ == "RECHNUNG" else "A"  # "R" für Rechnung, "A" für Angebot
+                    # Laufende Nummer je Sterbefall und Rechnungstyp, lückenlos über den Nummernkreis
+                    laufende_nummer = naechste_nummer(
+                        f"rechnung:{self.rechnung_typ}:{self.sterbefall.pk}",
+                        start=lambda: Rechnung.objects.filter(
+                            sterbefall=self.sterbefall,
+                            rechnung_typ=self.rechnung_typ  # Bestand beim ersten Zugriff übernehmen
+                        ).count(),
+                    )
+                    if laufende_nummer == 1:
+                        self.rechnungsnummer = f"{rechnung_typ_prefix}{auftragsnummer}"
+                    else:
+                        self.rechnungsnummer = f"{rechnung_typ_prefix}{auftragsnummer}/{laufende_nummer}"
+
+                    if not self.anrede:
+                        self.anrede = self.sterbefall.auftraggeber_anrede
+                    if not self.titel:
+                        self.titel = self.sterbefall.auftraggeber_titel
+                    if not self.auftraggerber_vorname:
+                        self.auftraggerber_vorname = self.sterbefall.auftraggeber_vorname
+                    if not self.auftraggeber_nachname:
+                        self.auftraggeber_nachname = self.sterbefall.auftraggeber_nachname
+                    if not self.verstorbenen_vorname:
+                        self.verstorbenen_vorname = self.sterbefall.verstorbener_vorname
+                    if not self.verstorbenen_nachname:
+                        self.verstorbenen_nachname = self.sterbefall.verstorbener_nachname
+                    if not self.strasse:
+                        self.strasse = self.sterbefall.auftraggeber_strasse
+                    if not self.plz:
+                        self.plz = self.sterbefall.auftraggeber_plz
+                    if not self.stadt:
+                        self.stadt = self.sterbefall.auftraggeber_stadt
+                    if not self.land:
+                        self.land = self.sterbefall.auftraggeber_land
+
+            alter_stand = None if self._state.adding else self.alte_werte('rechnungsdatum', 'status')
+            super().save(*args, **kwargs)
+            # Umsatz der Positionen in Monat/Status der geänderten Rechnung umbuchen
+            if alter_stand is not None:
+                rechnung_verschieben(self.pk, alter_stand, (self.rechnungsdatum, self.status))
+
+def positionen_mitloeschen(collector, field, sub_objs, using):
+    """
+    on_delete der Positionen: wie CASCADE, markiert die Positionen aber als mit ihrer
+    Rechnung gelöscht. Deren Umsatz bucht rechnung_umsatz_ausbuchen aus, Summen und
+    Steuersätze verschwinden mit der Rechnung (siehe signals.py). Die Markierung hängt
+    an den Instanzen des Collectors und verfällt mit ihm, auch bei einem Rollback.
+    """
+    # Der Collector hat sub_objs bereits ausgewertet und übergibt dieselben Instanzen den Signals
+    for position in sub_objs:
+        position._mit_rechnung_geloescht = True
+    models.CASCADE(collector, field, sub_objs, using)
+
+
+class Rechnungsposition(AenderungenMixin, models.Model):
     class Meta:
         app_label = 'rechnung'
 
@@ -117,7 +160,7 @@ class Rechnungsposition(models.Model):
 
     category = models.CharField(max_length=3, choices=CATEGORIES, null=True, blank=True)
     produkt = models.CharField(max_length=250, null=True, blank=True)
-    rechnung = models.ForeignKey(Rechnung, on_delete=models.CASCADE)
+    rechnung = models.ForeignKey(Rechnung, on_delete=positionen_mitloeschen)
     menge = models.DecimalField(max_digits=10, decimal_places=0, null=True, blank=True)
     preis = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     mwst = models.DecimalField(max_digits=2, decimal_places=0, null=True, blank=True)
@@ -126,12 +169,99 @@ class Rechnungsposition(models.Model):
     def save(self, *args, **kwargs):
         # Speichere die ursprüngliche Menge vor dem Speichern
         if self.pk:
-            try:
-                original = Rechnungsposition.objects.get(pk=self.pk)
-                self._original_menge = original.menge
-            except Rechnungsposition.DoesNotExist:
-                self._original_menge = 0  # Oder einen anderen Standardwert
+            self._original_menge = self.old_value('menge', default=0)
         else:
             self._original_menge = 0
 
-        super().save(*args, **kwargs)
\ No newline at end of file
+        # Rechnungssummen und Umsatz in derselben Transaktion um die Differenz fortschreiben;
+        # der alte Stand kommt gesperrt aus der Datenbank, damit parallele Änderungen nacheinander buchen
+        with transaction.atomic():
+            alt = self._buchung_alt = self.gesperrte_werte(*self.BUCHUNGS_FELDER)
+            geschrieben = kwargs.get('update_fields')
+            if geschrieben is None and alt is not None and not args:
+                geschrieben = self.geaenderte_felder()  # so schränkt AenderungenMixin.save ein
+            super().save(*args, **kwargs)
+            self._buchen(alt=[alt] if alt else [], neu=[self._buchungs_stand(alt, geschrieben)])
+
+    # Löschen (auch QuerySet.delete) bucht über pre_delete/post_delete, siehe signals.py
+
+    # rechnung, betrag, mwst, category
+    BUCHUNGS_FELDER = SUMMEN_FELDER + ('category',)
+
+    def _buchungs_stand(self, alt=None, geschrieben=None):
+        """Stand nach dem Speichern; nicht geschriebene Felder behalten den Datenbankstand alt."""
+        stand = (self.rechnung_id, self.betrag, self.mwst, self.category)
+        if alt is None or geschrieben is None:
+            return stand
+        geschrieben = set(geschrieben)
+        return tuple(
+            wert if feld in geschrieben or self._attname(feld) in geschrieben else alter_wert
+            for feld, wert, alter_wert in zip(self.BUCHUNGS_FELDER, stand, alt)
+        )
+
+    @staticmethod
+    def _buchen(alt, neu):
+        aktualisiere_summen(
+            alt=[stand[:3] for stand in alt],
+            neu=[stand[:3] for stand in neu],
+        )
+        aktualisiere_umsatz(
+            alt=[(rechnung_id, category, betrag) for rechnung_id, betrag, _, category in alt],
+            neu=[(rechnung_id, category, betrag) for rechnung_id, betrag, _, category in neu],
+        )
+
+
+class RechnungSteuersatz(models.Model):
+    """Netto- und Steuersumme einer Rechnung je MwSt-Satz, gepflegt über summen.py."""
+    rechnung = models.ForeignKey(Rechnung, on_delete=models.CASCADE, related_name='steuersaetze')
+    mwst = models.DecimalField(max_digits=2, decimal_places=0)
+    netto = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    steuer = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        app_label = 'rechnung'
+        constraints = [
+            models.UniqueConstraint(fields=['rechnung', 'mwst'], name='rechnungsteuersatz_rechnung_mwst'),
+        ]
+
+
+class RechnungEvent(models.Model):
+    """Append-only-Protokoll einer Rechnung (Statuswechsel, Downloads, ...), siehe events.py."""
+    rechnung = models.ForeignKey(Rechnung, on_delete=models.CASCADE, related_name='events', db_index=False)
+    timestamp = models.DateTimeField()
+    event_type = models.CharField(max_length=200)
+    user = models.CharField(max_length=150)
+
+    class Meta:
+        app_label = 'rechnung'
+        ordering = ('timestamp', 'id')
+        indexes = [
+            models.Index(fields=['rechnung', 'timestamp'], name='rechnungevent_rechnung_zeit'),
+        ]
+
+    def als_dict(self):
+        return {
+            'timestamp': self.timestamp.isoformat(),
+            'event_type': self.event_type,
+            'user': self.user,
+        }
+
+
+class UmsatzStatistik(models.Model):
+    """
+    Vorberechneter Umsatz (Summe der Positionsbeträge) je Rechnungsmonat, Kategorie
+    und Rechnungsstatus, inkrementell gepflegt über umsatz.py. Je Tenant-Schema eine
+    Tabelle; Rechnungen ohne Rechnungsdatum zählen unter jahr = 0 / monat = 0.
+    """
+    jahr = models.IntegerField()
+    monat = models.IntegerField()
+    category = models.CharField(max_length=3, blank=True)
+    status = models.CharField(max_length=10, choices=Rechnung.STATUS_CHOICES)
+    betrag = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    anzahl = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'rechnung'
+        constraints = [
+            models.UniqueConstraint(fields=['jahr', 'monat', 'category', 'status'], name='umsatzstatistik_bucket'),
+        ]
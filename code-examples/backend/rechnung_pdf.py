@@ -0,0 +1,217 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Prefetch
+
+from sterbefall.dateicache import DateiCache
+from users.mandanten import mandant
+from .models import Rechnung, Rechnungsposition
+from .pdf_render import LAYOUT_VERSION, pdf_rendern
+
+try:
+    from PyPDF2 import PdfMerger, PdfReader
+except ImportError:  # PyPDF2 < 2
+    from PyPDF2 import PdfFileMerger as PdfMerger, PdfFileReader as PdfReader
+
+PDF_CACHE = DateiCache(
+    'rechnungen', getattr(settings, 'RECHNUNG_PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024), endung='.pdf',
+)
+PDF_WORKER = getattr(settings, 'RECHNUNG_PDF_WORKER', os.cpu_count() or 2)
+MAX_BATCH = getattr(settings, 'RECHNUNG_PDF_MAX_BATCH', 500)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def render_pool():
+    """Prozess-Pool für das Rendern, einmal je Prozess und erst bei Bedarf gestartet."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: die Worker laden nur pdf_render und erben weder DB-Verbindungen noch Threads
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKER, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _pool_verwerfen():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def _datum(wert):
+    return wert.strftime('%d.%m.%Y') if wert else None
+
+
+def company_daten(company=None):
+    """Kopf-/Fußdaten des aktuellen Tenants für alle Rechnungen eines Aufrufs."""
+    if company is None:
+        company = mandant(connection.schema_name)
+    logo_pfad = logo_stand = None
+    if company.logo:
+        try:
+            logo_pfad = company.logo.path
+            logo_stand = os.stat(logo_pfad).st_mtime
+        except (NotImplementedError, OSError):
+            logo_pfad = None
+    return {
+        'name': company.name,
+        'unternehmensname': company.unternehmensname,
+        'strasse': company.strasse,
+        'plz': company.plz,
+        'ort': company.ort,
+        'phone': company.phone,
+        'email': company.email,
+        'UstIdNr': company.UstIdNr,
+        'header_text': company.header_text,
+        'footer_text': company.footer_text,
+        'logo_pfad': logo_pfad,
+        'logo_stand': logo_stand,
+        'bankkonten': [
+            {'name': konto.name, 'iban': konto.iban, 'bic': konto.bic}
+            for konto in company.bank_accounts.order_by('pk')
+        ],
+    }
+
+
+def rechnungen_laden(queryset):
+    """Rechnungen mit allem, was die PDF braucht, in drei Abfragen."""
+    return queryset.prefetch_related(
+        Prefetch('rechnungsposition_set', queryset=Rechnungsposition.objects.order_by('pk')),
+        'steuersaetze',
+    )
+
+
+def rechnung_daten(rechnung, firma):
+    """Alles, was die PDF einer Rechnung bestimmt, als picklebares Dict (Eingabe für pdf_rendern)."""
+    return {
+        'rechnung_typ': rechnung.rechnung_typ,
+        'rechnungsstufe': rechnung.rechnungsstufe,
+        'rechnungsnummer': rechnung.rechnungsnummer,
+        'rechnungsdatum': _datum(rechnung.rechnungsdatum),
+        'zahlungsziel': _datum(rechnung.zahlungsziel),
+        'anrede': rechnung.anrede,
+        'titel': rechnung.titel,
+        'vorname': rechnung.auftraggerber_vorname,
+        'nachname': rechnung.auftraggeber_nachname,
+        'strasse': rechnung.strasse,
+        'plz': rechnung.plz,
+        'stadt': rechnung.stadt,
+        'land': rechnung.land,
+        'verstorbener_vorname': rechnung.verstorbenen_vorname,
+        'verstorbener_nachname': rechnung.verstorbenen_nachname,
+        'textblock': rechnung.textblock,
+        'positionen': [
+            {
+                'produkt': position.produkt,
+                'menge': position.menge,
+                'preis': position.preis,
+                'mwst': position.mwst,
+                'betrag': position.betrag,
+            }
+            for position in rechnung.rechnungsposition_set.all()
+        ],
+        'summen': {
+            'netto': rechnung.betrag_netto,
+            'brutto': rechnung.betrag_summe,
+            'saetze': [
+                {'mwst': satz.mwst, 'netto': satz.netto, 'steuer': satz.steuer}
+                for satz in sorted(rechnung.steuersaetze.all(), key=lambda satz: satz.mwst)
+                if satz.netto or satz.steuer
+            ],
+        },
+        'company': firma,
+    }
+
+
+def inhalts_hash(daten):
+    kodiert = json.dumps({'layout': LAYOUT_VERSION, 'daten': daten}, sort_keys=True, default=str)
+    return hashlib.sha256(kodiert.encode('utf-8')).hexdigest()
+
+
+def pdfs_erzeugen(rechnungen, parallel=True, cache=True):
+    """
+    Liefert die PDFs der Rechnungen (aus rechnungen_laden) als bytes in derselben
+    Reihenfolge. Gecachte PDFs kommen von der Platte, fehlende werden im Prozess-Pool
+    parallel gerendert und abgelegt. Gleiche Inhalte werden nur einmal gerendert.
+    """
+    firma = company_daten()
+    ergebnisse = [None] * len(rechnungen)
+    offen = {}
+    for index, rechnung in enumerate(rechnungen):
+        daten = rechnung_daten(rechnung, firma)
+        schluessel = inhalts_hash(daten)
+        pdf = PDF_CACHE.lesen(schluessel) if cache else None
+        if pdf is not None:
+            ergebnisse[index] = pdf
+        else:
+            offen.setdefault(schluessel, (daten, []))[1].append(index)
+
+    def ablegen(schluessel, pdf):
+        if cache:
+            PDF_CACHE.schreiben(schluessel, pdf)
+        for index in offen[schluessel][1]:
+            ergebnisse[index] = pdf
+
+    if len(offen) > 1 and parallel:
+        try:
+            futures = {render_pool().submit(pdf_rendern, daten): schluessel for schluessel, (daten, _) in offen.items()}
+            for future in as_completed(futures):
+                ablegen(futures[future], future.result())
+        except BrokenProcessPool:
+            _pool_verwerfen()  # abgestürzter Worker: beim nächsten Aufruf neuer Pool
+            raise
+    else:
+        for schluessel, (daten, _) in offen.items():
+            ablegen(schluessel, pdf_rendern(daten))
+    return ergebnisse
+
+
+def pdf_fuer_rechnung(rechnung_id):
+    rechnung = rechnungen_laden(Rechnung.objects.filter(pk=rechnung_id)).get()
+    return rechnung, pdfs_erzeugen([rechnung])[0]
+
+
+def pdfs_zusammenfuehren(pdfs):
+    merger = PdfMerger()
+    for pdf in pdfs:
+        merger.append(io.BytesIO(pdf))
+    ausgabe = io.BytesIO()
+    merger.write(ausgabe)
+    merger.close()
+    return ausgabe.getvalue()
+
+
+def dateiname(rechnung):
+    # Rechnungsnummern wie R24001/2 enthalten einen Schrägstrich
+    return f"{(rechnung.rechnungsnummer or f'rechnung-{rechnung.pk}').replace('/', '-')}.pdf"
+
+
+def pdfs_zippen(rechnungen, pdfs):
+    ausgabe = io.BytesIO()
+    # PDFs sind bereits komprimiert
+    with zipfile.ZipFile(ausgabe, 'w', compression=zipfile.ZIP_STORED) as archiv:
+        vergeben = set()
+        for rechnung, pdf in zip(rechnungen, pdfs):
+            name = dateiname(rechnung)
+            if name in vergeben:
+                name = f'{name[:-4]}-{rechnung.pk}.pdf'
+            vergeben.add(name)
+            archiv.writestr(name, pdf)
+    return ausgabe.getvalue()
+
+
+def seitenzahl(pdf):
+    leser = PdfReader(io.BytesIO(pdf))
+    return len(leser.pages)
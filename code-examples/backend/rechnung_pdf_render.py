@@ -0,0 +1,166 @@
+"""
+Reines reportlab-Layout der Rechnungs-PDF. Bewusst ohne Django-Importe, damit die
+Worker-Prozesse (spawn) nur dieses Modul laden und keine DB-Verbindung erben.
+Eingabe ist das picklebare Dict aus pdf.rechnung_daten().
+"""
+import io
+from decimal import Decimal
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+# Bei jeder Änderung am Layout erhöhen, damit gecachte PDFs nicht mehr passen
+LAYOUT_VERSION = 1
+
+RAND = 20 * mm
+FUSS_HOEHE = 28 * mm
+
+_styles = getSampleStyleSheet()
+NORMAL = ParagraphStyle('rechnung_normal', parent=_styles['Normal'], fontSize=9.5, leading=12)
+KLEIN = ParagraphStyle('rechnung_klein', parent=NORMAL, fontSize=7.5, leading=9)
+RECHTS = ParagraphStyle('rechnung_rechts', parent=NORMAL, alignment=TA_RIGHT)
+TITEL = ParagraphStyle('rechnung_titel', parent=_styles['Heading2'], fontSize=14, spaceAfter=4)
+
+
+def betrag_text(wert):
+    """Decimal/str -> '1.234,56 €'."""
+    wert = Decimal(wert or 0)
+    return f'{wert:,.2f} €'.replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def _text(wert):
+    return '' if wert is None else str(wert).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _zeilen(*teile):
+    return '<br/>'.join(_text(teil) for teil in teile if teil)
+
+
+def _kopf(daten):
+    firma = daten['company']
+    absender = _zeilen(
+        firma['unternehmensname'] or firma['name'],
+        firma['strasse'],
+        ' '.join(teil for teil in (firma['plz'], firma['ort']) if teil),
+        firma['phone'],
+        firma['email'],
+    )
+    logo = ''
+    if firma['logo_pfad']:
+        try:
+            logo = Image(firma['logo_pfad'], width=45 * mm, height=22 * mm, kind='proportional')
+        except (OSError, IOError):
+            logo = ''  # fehlendes Logo verhindert die Rechnung nicht
+    kopf = Table([[Paragraph(absender, KLEIN), logo]], colWidths=[110 * mm, None])
+    kopf.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP'), ('ALIGN', (1, 0), (1, 0), 'RIGHT')]))
+    return kopf
+
+
+def _empfaenger_und_daten(daten):
+    empfaenger = _zeilen(
+        ' '.join(teil for teil in (daten['anrede'], daten['titel']) if teil),
+        ' '.join(teil for teil in (daten['vorname'], daten['nachname']) if teil),
+        daten['strasse'],
+        ' '.join(teil for teil in (daten['plz'], daten['stadt']) if teil),
+        daten['land'],
+    )
+    angaben = [
+        ('Rechnungsnummer' if daten['rechnung_typ'] == 'RECHNUNG' else 'Angebotsnummer', daten['rechnungsnummer']),
+        ('Datum', daten['rechnungsdatum']),
+        ('Zahlungsziel', daten['zahlungsziel']),
+        ('Verstorbene/r', ' '.join(teil for teil in (daten['verstorbener_vorname'], daten['verstorbener_nachname']) if teil)),
+    ]
+    rechts = _zeilen(*(f'{name}: {wert}' for name, wert in angaben if wert))
+    tabelle = Table([[Paragraph(empfaenger, NORMAL), Paragraph(rechts, RECHTS)]], colWidths=[95 * mm, None])
+    tabelle.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP')]))
+    return tabelle
+
+
+def _positionen(daten):
+    zeilen = [['Pos.', 'Leistung', 'Menge', 'Einzelpreis', 'MwSt', 'Betrag']]
+    for nummer, position in enumerate(daten['positionen'], start=1):
+        zeilen.append([
+            str(nummer),
+            Paragraph(_text(position['produkt']), NORMAL),
+            '' if position['menge'] is None else str(position['menge']),
+            '' if position['preis'] is None else betrag_text(position['preis']),
+            '' if position['mwst'] is None else f"{position['mwst']} %",
+            betrag_text(position['betrag']),
+        ])
+    tabelle = Table(zeilen, colWidths=[12 * mm, None, 16 * mm, 26 * mm, 14 * mm, 28 * mm], repeatRows=1)
+    tabelle.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('LINEBELOW', (0, 0), (-1, 0), 0.6, colors.black),
+        ('LINEBELOW', (0, 1), (-1, -1), 0.25, colors.lightgrey),
+        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]))
+    return tabelle
+
+
+def _summen(daten):
+    summen = daten['summen']
+    zeilen = [['Nettobetrag', betrag_text(summen['netto'])]]
+    for satz in summen['saetze']:
+        zeilen.append([f"zzgl. {satz['mwst']} % MwSt auf {betrag_text(satz['netto'])}", betrag_text(satz['steuer'])])
+    zeilen.append(['Gesamtbetrag', betrag_text(summen['brutto'])])
+    tabelle = Table(zeilen, colWidths=[None, 30 * mm], hAlign='RIGHT')
+    tabelle.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('LINEABOVE', (0, -1), (-1, -1), 0.6, colors.black),
+    ]))
+    return tabelle
+
+
+def _fuss_zeichnen(daten):
+    firma = daten['company']
+    spalten = [
+        _zeilen(firma['unternehmensname'] or firma['name'], firma['footer_text']),
+        _zeilen(*(f"{konto['name']}: IBAN {konto['iban']}" + (f" · BIC {konto['bic']}" if konto['bic'] else '')
+                  for konto in firma['bankkonten'])),
+        _zeilen(f"USt-IdNr. {firma['UstIdNr']}" if firma['UstIdNr'] else None),
+    ]
+
+    def zeichnen(canvas, doc):
+        canvas.saveState()
+        breite = (A4[0] - 2 * RAND) / len(spalten)
+        for index, text in enumerate(spalten):
+            absatz = Paragraph(text, KLEIN)
+            absatz.wrapOn(canvas, breite - 3 * mm, FUSS_HOEHE)
+            absatz.drawOn(canvas, RAND + index * breite, RAND - 4 * mm)
+        canvas.setFont('Helvetica', 7.5)
+        canvas.drawRightString(A4[0] - RAND, RAND + FUSS_HOEHE - 6 * mm, f'Seite {doc.page}')
+        canvas.restoreState()
+    return zeichnen
+
+
+def pdf_rendern(daten):
+    """Erzeugt die Rechnungs-PDF als bytes."""
+    puffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        puffer, pagesize=A4,
+        leftMargin=RAND, rightMargin=RAND, topMargin=RAND, bottomMargin=RAND + FUSS_HOEHE,
+        title=daten['rechnungsnummer'] or '', author=daten['company']['name'] or '',
+    )
+    titel = 'Rechnung' if daten['rechnung_typ'] == 'RECHNUNG' else 'Angebot'
+    if daten['rechnungsstufe'] > 1:
+        titel = f"Korrekturrechnung ({daten['rechnungsstufe']}. Fassung)"
+
+    inhalt = [_kopf(daten), Spacer(1, 12 * mm), _empfaenger_und_daten(daten), Spacer(1, 10 * mm),
+              Paragraph(titel, TITEL)]
+    if daten['company']['header_text']:
+        inhalt += [Paragraph(_text(daten['company']['header_text']), NORMAL), Spacer(1, 4 * mm)]
+    if daten['textblock']:
+        inhalt += [Paragraph(_text(daten['textblock']).replace('\n', '<br/>'), NORMAL), Spacer(1, 4 * mm)]
+    inhalt += [_positionen(daten), Spacer(1, 4 * mm), _summen(daten)]
+
+    fuss = _fuss_zeichnen(daten)
+    doc.build(inhalt, onFirstPage=fuss, onLaterPages=fuss)
+    return puffer.getvalue()
@@ -0,0 +1,62 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from sterbefall.cache import invalidiere
+from .models import Rechnung, Rechnungsposition
+from .umsatz import rechnung_verschieben
+
+RECHNUNGEN_CACHE = 'rechnungen'
+
+
+def _faelle_invalidieren(sterbefall_ids):
+    for sterbefall_id in set(sterbefall_ids):
+        invalidiere(RECHNUNGEN_CACHE, sterbefall_id)
+
+
+@receiver(pre_save, sender=Rechnung)
+def rechnung_fall_merken(sender, instance, raw=False, **kwargs):
+    # Beim Umhängen an einen anderen Fall ändert sich auch die Rechnungsliste des alten
+    instance._sterbefall_alt = None if raw else instance.old_value('sterbefall')
+
+
+@receiver([post_save, post_delete], sender=Rechnung)
+def rechnung_cache_invalidieren(sender, instance, **kwargs):
+    _faelle_invalidieren([instance.sterbefall_id, getattr(instance, '_sterbefall_alt', None)])
+
+
+@receiver([post_save, post_delete], sender=Rechnungsposition)
+def rechnungsposition_cache_invalidieren(sender, instance, **kwargs):
+    if getattr(instance, '_mit_rechnung_geloescht', False):
+        return  # Rechnung wird mitgelöscht und invalidiert selbst
+    # Alte Rechnung aus dem gesperrten Stand von save() bzw. pre_delete
+    alt = getattr(instance, '_buchung_alt', None)
+    rechnung_ids = {instance.rechnung_id, alt[0] if alt else None} - {None}
+    if rechnung_ids == {instance.rechnung_id} and Rechnungsposition.rechnung.is_cached(instance):
+        sterbefall_ids = [instance.rechnung.sterbefall_id]
+    else:
+        sterbefall_ids = Rechnung.objects.filter(pk__in=rechnung_ids).values_list('sterbefall_id', flat=True)
+    _faelle_invalidieren(sterbefall_ids)
+
+
+@receiver(pre_delete, sender=Rechnung)
+def rechnung_umsatz_ausbuchen(sender, instance, **kwargs):
+    # Auch beim kaskadierenden Löschen (Sterbefall), solange die Positionen noch existieren
+    rechnung_verschieben(instance.pk, instance.alte_werte('rechnungsdatum', 'status'), None)
+
+
+@receiver(pre_delete, sender=Rechnungsposition)
+def rechnungsposition_stand_merken(sender, instance, **kwargs):
+    # Auch bei QuerySet.delete() und im Admin; gesperrter Datenbankstand (der Collector löscht in einer Transaktion)
+    if getattr(instance, '_mit_rechnung_geloescht', False):
+        return
+    instance._buchung_alt = (
+        instance.gesperrte_werte(*Rechnungsposition.BUCHUNGS_FELDER) or instance._buchungs_stand()
+    )
+
+
+@receiver(post_delete, sender=Rechnungsposition)
+def rechnungsposition_ausbuchen(sender, instance, **kwargs):
+    if getattr(instance, '_mit_rechnung_geloescht', False):
+        return  # siehe models.positionen_mitloeschen
+    alt = getattr(instance, '_buchung_alt', None) or instance._buchungs_stand()
+    Rechnungsposition._buchen(alt=[alt], neu=[])
@@ -0,0 +1,161 @@
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import connection, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+
+NULL = Decimal('0')
+CENT = Decimal('0.01')
+
+# Felder einer Position, aus denen sich ihr Beitrag zu den Rechnungssummen ergibt
+SUMMEN_FELDER = ('rechnung', 'betrag', 'mwst')
+# Per F()-Update gebuchte Summenfelder der Rechnung (geladene Instanzen danach neu lesen)
+SUMMEN_SPALTEN = ('betrag_netto', 'betrag_steuer', 'betrag_summe')
+# Gestellte, bezahlte oder stornierte Rechnungen: betrag_summe ist der dem Kunden genannte
+# Betrag und wird beim Neuaufbau nie aus den Positionen überschrieben
+ABGESCHLOSSEN = Q(is_geschrieben=True) | ~Q(status='ENTWURF')
+
+_UPSERT_SQL = """
+    INSERT INTO rechnung_rechnungsteuersatz (rechnung_id, mwst, netto, steuer)
+    VALUES {werte}
+    ON CONFLICT (rechnung_id, mwst) DO UPDATE SET
+        netto = rechnung_rechnungsteuersatz.netto + EXCLUDED.netto,
+        steuer = rechnung_rechnungsteuersatz.steuer + EXCLUDED.steuer
+"""
+
+
+def steuer_fuer(netto, mwst):
+    """MwSt einer Position, je Position kaufmännisch auf Cent gerundet."""
+    return (netto * mwst / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _beitrag(rechnung_id, betrag, mwst):
+    """(rechnung_id, mwst) -> (netto, steuer) einer Position; Positionen ohne Satz zählen zu 0 %."""
+    netto = Decimal(betrag or 0)
+    mwst = Decimal(mwst or 0)
+    return (rechnung_id, mwst), (netto, steuer_fuer(netto, mwst))
+
+
+def _buchen(deltas):
+    zeilen = [
+        (rechnung_id, mwst, netto, steuer)
+        for (rechnung_id, mwst), (netto, steuer) in deltas.items()
+        if rechnung_id is not None and (netto or steuer)
+    ]
+    if not zeilen:
+        return
+
+    je_rechnung = defaultdict(lambda: (NULL, NULL))
+    for rechnung_id, _, netto, steuer in zeilen:
+        alt_netto, alt_steuer = je_rechnung[rechnung_id]
+        je_rechnung[rechnung_id] = (alt_netto + netto, alt_steuer + steuer)
+
+    from .models import Rechnung
+
+    # Sortiert, damit parallele Buchungen die Rechnungszeilen immer in derselben Reihenfolge sperren
+    for rechnung_id, (netto, steuer) in sorted(je_rechnung.items()):
+        Rechnung.objects.filter(pk=rechnung_id).update(
+            betrag_netto=F('betrag_netto') + netto,
+            betrag_steuer=F('betrag_steuer') + steuer,
+            betrag_summe=Coalesce(F('betrag_summe'), Value(NULL)) + netto + steuer,
+        )
+
+    sql = _UPSERT_SQL.format(werte=', '.join(['(%s, %s, %s, %s)'] * len(zeilen)))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [wert for zeile in sorted(zeilen) for wert in zeile])
+
+
+def aktualisiere_summen(alt=(), neu=()):
+    """
+    Bucht die Differenz zwischen altem und neuem Stand von Positionen auf die
+    Summen ihrer Rechnungen. alt/neu sind Listen von (rechnung_id, betrag, mwst).
+    Muss in der Transaktion des Positions-Schreibzugriffs aufgerufen werden.
+    """
+    deltas = defaultdict(lambda: (NULL, NULL))
+    for vorzeichen, positionen in ((1, neu), (-1, alt)):
+        for position in positionen:
+            schluessel, (netto, steuer) = _beitrag(*position)
+            alt_netto, alt_steuer = deltas[schluessel]
+            deltas[schluessel] = (alt_netto + vorzeichen * netto, alt_steuer + vorzeichen * steuer)
+    _buchen(deltas)
+
+
+def _soll_summen(rechnung_ids=None):
+    """Summen je Rechnung und Steuersatz frisch aus den Positionen berechnet."""
+    from .models import Rechnungsposition
+
+    positionen = Rechnungsposition.objects.values_list('rechnung_id', 'betrag', 'mwst')
+    if rechnung_ids is not None:
+        positionen = positionen.filter(rechnung_id__in=rechnung_ids)
+
+    summen = defaultdict(lambda: (NULL, NULL))
+    for position in positionen.iterator(chunk_size=2000):
+        schluessel, (netto, steuer) = _beitrag(*position)
+        alt_netto, alt_steuer = summen[schluessel]
+        summen[schluessel] = (alt_netto + netto, alt_steuer + steuer)
+    return summen
+
+
+def summen_pruefen(rechnung_ids=None, korrigieren=False):
+    """
+    Vergleicht die gespeicherten Summen mit den Positionen und liefert die IDs der
+    Rechnungen mit Abweichungen. Mit korrigieren=True werden diese neu geschrieben;
+    betrag_summe abgeschlossener Rechnungen (ABGESCHLOSSEN) bleibt dabei unverändert.
+    """
+    from .models import Rechnung, RechnungSteuersatz
+
+    soll = _soll_summen(rechnung_ids)
+    soll_saetze = defaultdict(dict)
+    for (rechnung_id, mwst), werte in soll.items():
+        soll_saetze[rechnung_id][mwst] = werte
+
+    rechnungen = Rechnung.objects.all()
+    saetze = RechnungSteuersatz.objects.exclude(netto=0, steuer=0)
+    if rechnung_ids is not None:
+        rechnungen = rechnungen.filter(pk__in=rechnung_ids)
+        saetze = saetze.filter(rechnung_id__in=rechnung_ids)
+    abgeschlossen = set(rechnungen.filter(ABGESCHLOSSEN).values_list('pk', flat=True))
+
+    ist_saetze = defaultdict(dict)
+    for rechnung_id, mwst, netto, steuer in saetze.values_list('rechnung_id', 'mwst', 'netto', 'steuer'):
+        ist_saetze[rechnung_id][mwst] = (netto, steuer)
+
+    abweichend = []
+    for rechnung_id, netto, steuer, summe in rechnungen.values_list(
+        'pk', 'betrag_netto', 'betrag_steuer', 'betrag_summe'
+    ).iterator(chunk_size=2000):
+        sollwerte = {mwst: werte for mwst, werte in soll_saetze[rechnung_id].items() if any(werte)}
+        soll_netto = sum((n for n, _ in sollwerte.values()), NULL)
+        soll_steuer = sum((s for _, s in sollwerte.values()), NULL)
+        if (
+            (netto, steuer) != (soll_netto, soll_steuer)
+            or (rechnung_id not in abgeschlossen and summe != soll_netto + soll_steuer)
+            or ist_saetze[rechnung_id] != sollwerte
+        ):
+            abweichend.append(rechnung_id)
+
+    if korrigieren and abweichend:
+        from sterbefall.cache import invalidiere
+        from .signals import RECHNUNGEN_CACHE
+
+        with transaction.atomic():
+            for rechnung_id in abweichend:
+                sollwerte = soll_saetze[rechnung_id]
+                netto = sum((n for n, _ in sollwerte.values()), NULL)
+                steuer = sum((s for _, s in sollwerte.values()), NULL)
+                werte = {'betrag_netto': netto, 'betrag_steuer': steuer}
+                if rechnung_id not in abgeschlossen:
+                    werte['betrag_summe'] = netto + steuer
+                Rechnung.objects.filter(pk=rechnung_id).update(**werte)
+            RechnungSteuersatz.objects.filter(rechnung_id__in=abweichend).delete()
+            RechnungSteuersatz.objects.bulk_create([
+                RechnungSteuersatz(rechnung_id=rechnung_id, mwst=mwst, netto=netto, steuer=steuer)
+                for rechnung_id in abweichend
+                for mwst, (netto, steuer) in soll_saetze[rechnung_id].items()
+                if netto or steuer
+            ], batch_size=1000)
+            # update() löst keine Signals aus
+            for sterbefall_id in set(rechnungen.filter(pk__in=abweichend).values_list('sterbefall_id', flat=True)):
+                invalidiere(RECHNUNGEN_CACHE, sterbefall_id)
+    return abweichend
@@ -0,0 +1,153 @@
+from datetime import date
+from decimal import Decimal
+
+from tenant_schemas.test.cases import TenantTestCase
+
+from sterbefall.models import Sterbefall
+from sterbefall.tests import liste_json
+from .api_views import RechnungspositionViewSet, RechnungViewSet
+from .models import Rechnung, Rechnungsposition, RechnungSteuersatz, UmsatzStatistik
+from .summen import summen_pruefen
+from .umsatz import umsatz_neu_aufbauen
+
+
+class SchnellLesenTest(TenantTestCase):
+    """Der Schnellpfad muss exakt das JSON des Serializers liefern (Dezimalzahlen, Auswahlfelder)."""
+
+    def setUp(self):
+        sterbefall = Sterbefall.objects.create(auftraggeber_nachname='Beispiel')
+        self.rechnung = Rechnung.objects.create(sterbefall=sterbefall, rechnungsdatum=date(2024, 3, 1))
+        Rechnungsposition.objects.create(rechnung=self.rechnung, category='OWN', produkt='Sarg',
+                                         menge=1, preis=Decimal('999.99'), mwst=19, betrag=Decimal('999.99'))
+        Rechnungsposition.objects.create(rechnung=self.rechnung, category='EXP', produkt='Gebühr',
+                                         menge=2, preis=Decimal('12.5'), betrag=Decimal('25'))
+
+    def test_rechnungen(self):
+        self.assertEqual(liste_json(RechnungViewSet, True), liste_json(RechnungViewSet, False))
+
+    def test_positionen(self):
+        # Cursor-Pagination, damit beide Wege dieselbe Reihenfolge haben
+        parameter = {'pagination': 'cursor'}
+        kwargs = {'sterbefall_id': self.rechnung.sterbefall_id, 'rechnung_id': self.rechnung.pk}
+        self.assertEqual(
+            liste_json(RechnungspositionViewSet, True, parameter, **kwargs),
+            liste_json(RechnungspositionViewSet, False, parameter, **kwargs),
+        )
+
+
+class SummenTest(TenantTestCase):
+    """Inkrementelle Rechnungssummen gegen die frisch aus den Positionen berechneten."""
+
+    def setUp(self):
+        self.sterbefall = Sterbefall.objects.create(auftraggeber_nachname='Beispiel')
+        self.rechnung = Rechnung.objects.create(sterbefall=self.sterbefall)
+        self.andere = Rechnung.objects.create(sterbefall=self.sterbefall)
+
+    def position(self, betrag, mwst=19, rechnung=None):
+        return Rechnungsposition.objects.create(rechnung=rechnung or self.rechnung, category='OWN',
+                                                betrag=Decimal(betrag), mwst=mwst)
+
+    def assertSummen(self, rechnung, netto, steuer):
+        rechnung.refresh_from_db()
+        self.assertEqual(
+            (rechnung.betrag_netto, rechnung.betrag_steuer, rechnung.betrag_summe),
+            (Decimal(netto), Decimal(steuer), Decimal(netto) + Decimal(steuer)),
+        )
+        self.assertEqual(summen_pruefen(), [])
+
+    def test_anlegen_und_aendern(self):
+        position = self.position('100')
+        self.position('10.05', mwst=7)
+        self.assertSummen(self.rechnung, '110.05', '19.70')
+
+        position.betrag = Decimal('200')
+        position.save()
+        self.assertSummen(self.rechnung, '210.05', '38.70')
+
+        # Nicht geschriebene Felder buchen nicht
+        position.betrag = Decimal('999')
+        position.produkt = 'Urne'
+        position.save(update_fields=['produkt'])
+        self.assertSummen(self.rechnung, '210.05', '38.70')
+
+    def test_umhaengen(self):
+        position = self.position('100')
+        position.rechnung = self.andere
+        position.save()
+        self.assertSummen(self.rechnung, '0', '0')
+        self.assertSummen(self.andere, '100', '19')
+
+    def test_loeschen(self):
+        self.position('100').delete()
+        self.position('50')
+        self.position('20', mwst=7)
+        self.assertSummen(self.rechnung, '70', '10.90')
+
+        Rechnungsposition.objects.filter(mwst=7).delete()
+        self.assertSummen(self.rechnung, '50', '9.50')
+
+    def test_kaskade(self):
+        self.position('100')
+        self.position('40', rechnung=self.andere)
+        self.rechnung.delete()
+        self.assertFalse(RechnungSteuersatz.objects.filter(rechnung_id=self.rechnung.pk).exists())
+        self.assertSummen(self.andere, '40', '7.60')
+
+        self.sterbefall.delete()
+        self.assertFalse(Rechnung.objects.exists())
+        self.assertFalse(RechnungSteuersatz.objects.exists())
+
+
+class UmsatzTest(TenantTestCase):
+    """Inkrementell gepflegte Umsatzstatistik gegen den Neuaufbau aus den Positionen."""
+
+    def setUp(self):
+        self.sterbefall = Sterbefall.objects.create(auftraggeber_nachname='Beispiel')
+        self.rechnung = Rechnung.objects.create(sterbefall=self.sterbefall, rechnungsdatum=date(2024, 3, 1))
+        self.andere = Rechnung.objects.create(sterbefall=self.sterbefall, rechnungsdatum=date(2023, 12, 1))
+        for rechnung, category, betrag in ((self.rechnung, 'OWN', '100'), (self.rechnung, 'EXP', '25'),
+                                           (self.andere, 'OWN', '40'), (self.andere, None, '5')):
+            Rechnungsposition.objects.create(rechnung=rechnung, category=category, betrag=Decimal(betrag), mwst=19)
+
+    def assertUmsatzStimmt(self):
+        def umsatz():
+            return {
+                (zeile.jahr, zeile.monat, zeile.category, zeile.status): (zeile.betrag, zeile.anzahl)
+                for zeile in UmsatzStatistik.objects.exclude(betrag=0, anzahl=0)
+            }
+
+        inkrementell = umsatz()
+        umsatz_neu_aufbauen()
+        self.assertEqual(inkrementell, umsatz())
+
+    def test_positionen(self):
+        self.assertUmsatzStimmt()
+        position = Rechnungsposition.objects.get(category='EXP')
+        position.category = 'EXT'
+        position.betrag = Decimal('30')
+        position.save()
+        self.assertUmsatzStimmt()
+
+        position.rechnung = self.andere
+        position.save()
+        self.assertUmsatzStimmt()
+
+        Rechnungsposition.objects.filter(category='OWN').delete()
+        self.assertUmsatzStimmt()
+
+    def test_rechnung_verschieben(self):
+        self.rechnung.status = 'OFFEN'
+        self.rechnung.save()
+        self.assertUmsatzStimmt()
+
+        self.andere.rechnungsdatum = None
+        self.andere.save()
+        self.assertUmsatzStimmt()
+
+    def test_loeschen(self):
+        self.rechnung.delete()
+        self.assertUmsatzStimmt()
+
+        self.sterbefall.delete()
+        self.assertFalse(UmsatzStatistik.objects.exclude(betrag=0, anzahl=0).exists())
+
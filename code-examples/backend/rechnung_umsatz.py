@@ -0,0 +1,155 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+NULL = Decimal('0')
+KATEGORIEN = ('EXP', 'EXT', 'OWN')
+
+_UPSERT_SQL = """
+    INSERT INTO rechnung_umsatzstatistik (jahr, monat, category, status, betrag, anzahl)
+    VALUES {werte}
+    ON CONFLICT (jahr, monat, category, status) DO UPDATE SET
+        betrag = rechnung_umsatzstatistik.betrag + EXCLUDED.betrag,
+        anzahl = rechnung_umsatzstatistik.anzahl + EXCLUDED.anzahl
+"""
+
+
+def _periode(rechnungsdatum):
+    """Rechnungen ohne Rechnungsdatum werden unter jahr = 0 / monat = 0 gezählt."""
+    return (rechnungsdatum.year, rechnungsdatum.month) if rechnungsdatum else (0, 0)
+
+
+def _buchen(deltas):
+    zeilen = [schluessel + werte for schluessel, werte in deltas.items() if any(werte)]
+    if not zeilen:
+        return
+    sql = _UPSERT_SQL.format(werte=', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(zeilen)))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [wert for zeile in sorted(zeilen) for wert in zeile])
+
+
+def _rechnungs_schluessel(rechnung_ids):
+    from .models import Rechnung
+
+    return {
+        rechnung_id: _periode(rechnungsdatum) + (status,)
+        for rechnung_id, rechnungsdatum, status in Rechnung.objects.filter(
+            pk__in=rechnung_ids
+        ).values_list('pk', 'rechnungsdatum', 'status')
+    }
+
+
+def aktualisiere_umsatz(alt=(), neu=()):
+    """
+    Bucht die Differenz zwischen altem und neuem Stand von Positionen in die
+    Umsatzstatistik. alt/neu sind Listen von (rechnung_id, category, betrag);
+    Monat und Status kommen aus der (bereits gespeicherten) Rechnung.
+    """
+    positionen = [(1, position) for position in neu] + [(-1, position) for position in alt]
+    rechnungen = _rechnungs_schluessel({position[0] for _, position in positionen if position[0]})
+
+    deltas = defaultdict(lambda: (NULL, 0))
+    for vorzeichen, (rechnung_id, category, betrag) in positionen:
+        if rechnung_id not in rechnungen:
+            continue
+        jahr, monat, status = rechnungen[rechnung_id]
+        schluessel = (jahr, monat, category or '', status)
+        summe, anzahl = deltas[schluessel]
+        deltas[schluessel] = (summe + vorzeichen * Decimal(betrag or 0), anzahl + vorzeichen)
+    _buchen(deltas)
+
+
+def _positionssummen(rechnung_id):
+    from .models import Rechnungsposition
+
+    return Rechnungsposition.objects.filter(rechnung_id=rechnung_id).values('category').annotate(
+        summe=Sum('betrag'), anzahl=Count('pk'),
+    ).order_by()
+
+
+def rechnung_verschieben(rechnung_id, alt, neu):
+    """
+    Verschiebt den Umsatz aller Positionen einer Rechnung von alt nach neu,
+    jeweils (rechnungsdatum, status) oder None (Rechnung neu bzw. gelöscht).
+    """
+    if alt == neu:
+        return
+    deltas = defaultdict(lambda: (NULL, 0))
+    for zeile in _positionssummen(rechnung_id):
+        for vorzeichen, stand in ((1, neu), (-1, alt)):
+            if stand is None:
+                continue
+            rechnungsdatum, status = stand
+            schluessel = _periode(rechnungsdatum) + (zeile['category'] or '', status)
+            summe, anzahl = deltas[schluessel]
+            deltas[schluessel] = (
+                summe + vorzeichen * (zeile['summe'] or NULL),
+                anzahl + vorzeichen * zeile['anzahl'],
+            )
+    _buchen(deltas)
+
+
+def umsatz_neu_aufbauen():
+    """Baut die Umsatzstatistik des aktuellen Schemas komplett aus den Positionen neu auf."""
+    from .models import Rechnungsposition, UmsatzStatistik
+
+    zeilen = Rechnungsposition.objects.values(
+        'rechnung__rechnungsdatum__year', 'rechnung__rechnungsdatum__month', 'category', 'rechnung__status',
+    ).annotate(summe=Sum('betrag'), anzahl=Count('pk')).order_by()
+
+    summen = defaultdict(lambda: (NULL, 0))
+    for zeile in zeilen:
+        schluessel = (
+            zeile['rechnung__rechnungsdatum__year'] or 0,
+            zeile['rechnung__rechnungsdatum__month'] or 0,
+            zeile['category'] or '',
+            zeile['rechnung__status'],
+        )
+        summe, anzahl = summen[schluessel]
+        summen[schluessel] = (summe + (zeile['summe'] or NULL), anzahl + zeile['anzahl'])
+
+    with transaction.atomic():
+        UmsatzStatistik.objects.all().delete()
+        UmsatzStatistik.objects.bulk_create([
+            UmsatzStatistik(jahr=jahr, monat=monat, category=category, status=status, betrag=betrag, anzahl=anzahl)
+            for (jahr, monat, category, status), (betrag, anzahl) in summen.items()
+        ], batch_size=1000)
+    return len(summen)
+
+
+def umsatz_verlauf(von, bis, granularitaet='month', status=None):
+    """
+    Umsatz je Periode und Kategorie aus der Statistik, mit einer Abfrage.
+    von/bis sind (jahr, monat) einschließlich. Perioden ohne Umsatz werden mit 0
+    aufgefüllt, damit Charts durchgehende Achsen bekommen.
+    """
+    from .models import UmsatzStatistik
+
+    buckets = UmsatzStatistik.objects.filter(jahr__gte=von[0], jahr__lte=bis[0]).exclude(jahr=0)
+    buckets = buckets.exclude(jahr=von[0], monat__lt=von[1]).exclude(jahr=bis[0], monat__gt=bis[1])
+    if status:
+        buckets = buckets.filter(status__in=status)
+
+    gruppen = ('jahr', 'category') if granularitaet == 'year' else ('jahr', 'monat', 'category')
+    werte = {
+        tuple(zeile[feld] for feld in gruppen): zeile['summe'] or NULL
+        for zeile in buckets.values(*gruppen).annotate(summe=Sum('betrag')).order_by()
+    }
+
+    if granularitaet == 'year':
+        perioden = [((jahr,), str(jahr)) for jahr in range(von[0], bis[0] + 1)]
+    else:
+        perioden = []
+        jahr, monat = von
+        while (jahr, monat) <= bis:
+            perioden.append(((jahr, monat), f'{jahr}-{monat:02d}'))
+            jahr, monat = (jahr + 1, 1) if monat == 12 else (jahr, monat + 1)
+
+    kategorien = KATEGORIEN + tuple(sorted({schluessel[-1] for schluessel in werte} - set(KATEGORIEN)))
+    return [
+        {'period': bezeichnung, 'category': category, 'total_betrag': float(werte.get(periode + (category,), 0))}
+        for periode, bezeichnung in perioden
+        for category in kategorien
+    ]
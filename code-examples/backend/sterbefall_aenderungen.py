@@ -0,0 +1,111 @@
+import copy
+
+_NICHT_GELADEN = object()
+
+
+class AenderungenMixin:
+    """
+    Merkt sich beim Laden aus der DB (from_db) die Werte aller geladenen Felder.
+
+    - has_changed(feld) / old_value(feld) ohne zusätzliche Abfrage
+    - save() ohne update_fields schreibt nur die geänderten Spalten; ohne
+      Änderungen entfällt das UPDATE (und damit auch pre_save/post_save)
+
+    Für Instanzen, die nicht aus der DB geladen wurden (oder bei per .only()
+    zurückgestellten Feldern), lesen old_value/alte_werte den alten Stand nach.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_erstellen()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        # kwargs: z.B. from_queryset (Django 5.1)
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        # Auch nachgeladene (per .only() zurückgestellte) Felder gelten als unverändert
+        self._snapshot_erstellen(None if fields is None else {self._attname(feld) for feld in fields})
+
+    def _snapshot_erstellen(self, felder=None):
+        geladen = self.__dict__
+        snapshot = getattr(self, '_geladene_werte', {}) if felder is not None else {}
+        for feld in self._meta.concrete_fields:
+            if feld.attname in geladen and (felder is None or feld.attname in felder):
+                wert = geladen[feld.attname]
+                # JSON-Listen/Dicts werden gern in-place geändert
+                snapshot[feld.attname] = copy.deepcopy(wert) if isinstance(wert, (list, dict)) else wert
+        self._geladene_werte = snapshot
+
+    def _attname(self, feld):
+        return self._meta.get_field(feld).attname
+
+    def geaenderte_felder(self):
+        """Namen der Felder, die seit dem Laden geändert wurden (nur geladene/gesetzte Felder)."""
+        snapshot = getattr(self, '_geladene_werte', None)
+        if snapshot is None:
+            return None
+        geaendert = []
+        for feld in self._meta.concrete_fields:
+            if feld.primary_key or feld.attname not in self.__dict__:
+                continue
+            if snapshot.get(feld.attname, _NICHT_GELADEN) != self.__dict__[feld.attname]:
+                geaendert.append(feld.name)
+        return geaendert
+
+    def has_changed(self, feld):
+        if self._state.adding:
+            return True
+        return self.old_value(feld) != getattr(self, self._attname(feld))
+
+    def old_value(self, feld, default=None):
+        return self.alte_werte(feld, default=(default,))[0]
+
+    def alte_werte(self, *felder, default=None):
+        """
+        Stand der Felder beim Laden als Tupel. Fehlende Werte werden mit einer Abfrage
+        nachgelesen; existiert die Zeile nicht (mehr), wird default zurückgegeben.
+        """
+        if self._state.adding or self.pk is None:
+            return default
+        snapshot = getattr(self, '_geladene_werte', {})
+        attnames = [self._attname(feld) for feld in felder]
+        fehlend = [attname for attname in attnames if attname not in snapshot]
+        nachgelesen = {}
+        if fehlend:
+            zeile = type(self)._base_manager.using(self._state.db).filter(pk=self.pk).values(*fehlend).first()
+            if zeile is None:
+                return default
+            nachgelesen = zeile
+        return tuple(snapshot[attname] if attname in snapshot else nachgelesen[attname] for attname in attnames)
+
+    def gesperrte_werte(self, *felder, default=None):
+        """
+        Aktueller Stand der Felder in der Datenbank, gesperrt (SELECT ... FOR UPDATE) bis zum
+        Ende der Transaktion. Für Differenzbuchungen statt alte_werte: parallele Änderungen
+        derselben Zeile warten und rechnen danach vom neuen Stand aus.
+        Nur innerhalb von transaction.atomic(); default, wenn die Zeile nicht existiert.
+        """
+        if self._state.adding or self.pk is None:
+            return default
+        zeile = (
+            type(self)._base_manager.using(self._state.db).select_for_update()
+            .filter(pk=self.pk).values_list(*felder).first()
+        )
+        return default if zeile is None else tuple(zeile)
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            geaendert = self.geaenderte_felder()
+            if geaendert is not None:
+                kwargs['update_fields'] = geaendert
+        super().save(*args, **kwargs)
+        gespeichert = kwargs.get('update_fields')
+        self._snapshot_erstellen(
+            None if gespeichert is None else {self._attname(feld) for feld in gespeichert}
+        )
@@ -1,22 +1,28 @@
+import mimetypes
+import os
+
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Count
 from rest_framework import status
 from rest_framework.viewsets import ModelViewSet
-from django.db.models import Q
-from .models import Sterbefall, SterbefallDokument
+from .models import Sterbefall, SterbefallDokument, SterbefallStatistik
+from .search import suche_sterbefaelle
+from .dashboard import dashboard_kennzahlen
+from .statistik import dashboard_aus_statistik, trend_aus_statistik
 from .serializers import SterbefallSerializer, SterbefallDokumenteSerializer
-from rest_framework.pagination import PageNumberPagination
-
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 100
-    page_size_query_param = 'page_size'
-    max_page_size = 1000
+from .pagination import StandardResultsSetPagination, WahlweiseCursorPagination
+from .projektion import ProjektionMixin, STERBEFALL_LISTEN_FELDER
+from .schnell_lesen import SchnellLesenMixin
+from .auslieferung import datei_antwort
 
-class SterbefallViewSet(ModelViewSet):
+class SterbefallViewSet(SchnellLesenMixin, ProjektionMixin, ModelViewSet):
     queryset = Sterbefall.objects.all()
     serializer_class = SterbefallSerializer
-    pagination_class = StandardResultsSetPagination
+    # list liefert standardmäßig nur die Spalten der Fallliste, ?projection=full für alles
+    list_projection = STERBEFALL_LISTEN_FELDER
+    # Seitenweise wie bisher, mit ?pagination=cursor Keyset-Pagination für Endlos-Scrollen
+    pagination_class = WahlweiseCursorPagination
+    keyset_ordering = ('-auftragsnummer', 'uuid')
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -25,64 +31,48 @@ class SterbefallViewSet(ModelViewSet):
         if year:
             queryset = queryset.filter(sterbedaten_todeszeitpunkt__year=year)
         if search_query:
-            queryset = queryset.filter(
-                Q(auftraggeber_vorname__icontains=search_query) |
-                Q(auftraggeber_nachname__icontains=search_query) |
-                Q(verstorbener_vorname__icontains=search_query) |
-                Q(verstorbener_nachname__icontains=search_query) |
-                Q(auftragsnummer__icontains=search_query) |
-                Q(
-                    Q(auftraggeber_vorname__icontains=search_query.split(' ')[0]) & 
-                    Q(auftraggeber_nachname__icontains=search_query.split(' ')[-1])
-                ) |
-                Q(
-                    Q(verstorbener_vorname__icontains=search_query.split(' ')[0]) & 
-                    Q(verstorbener_nachname__icontains=search_query.split(' ')[-1])
-                )
-            )
+            return suche_sterbefaelle(queryset, search_query)
         return queryset.order_by('-auftragsnummer')
 
     @action(detail=False, methods=['get'])
     def dashboard_data(self, request):
         year = request.query_params.get('year', None)
-        queryset = self.get_queryset()  # Use the existing queryset
-
-        # Durchschnittsalter
-        ages = [
-            (case.sterbedaten_todeszeitpunkt - case.verstorbener_geburtsdatum).days // 365
-            for case in queryset
-            if case.sterbedaten_todeszeitpunkt and case.verstorbener_geburtsdatum
-        ]
-        average_age = sum(ages) / len(ages) if ages else None
+        pro_jahr = request.query_params.get('per_year') in ('1', 'true')
 
-        # Geschlechterverteilung
-        gender_counts = queryset.values('verstorbener_geschlecht').annotate(count=Count('uuid')).order_by()
-        gender_distribution = {
-            (item['verstorbener_geschlecht'] or 'Nicht angegeben').strip(): item['count']
-            for item in gender_counts
-        }
+        if request.query_params.get('search'):
+            # Gefilterte Fälle lassen sich nicht aus der Statistik beantworten
+            data = dashboard_kennzahlen(self.get_queryset(), pro_jahr=pro_jahr)
+        else:
+            data = dashboard_aus_statistik(year=year, pro_jahr=pro_jahr)
+        return Response(data, status=status.HTTP_200_OK)
 
-        # Konfessionsverteilung
-        konfession_counts = queryset.values('verstorbener_konfession').annotate(count=Count('uuid')).order_by()
-        konfession_distribution = {
-            (item['verstorbener_konfession'] or 'Nicht angegeben').strip(): item['count']
-            for item in konfession_counts
-        }
-
-        # Bestattungsartverteilung
-        burial_type_counts = queryset.values('bestattungsart').annotate(count=Count('uuid')).order_by()
-        burial_type_distribution = {
-            (item['bestattungsart'] or 'Nicht angegeben').strip(): item['count']
-            for item in burial_type_counts
-        }
+    @action(detail=False, methods=['get'])
+    def trend_data(self, request):
+        """Monatliche Fallzahlen für Trend-Charts, gelesen aus der Sterbefall-Statistik."""
+        dimension = request.query_params.get('dimension', 'gesamt')
+        if dimension not in dict(SterbefallStatistik.DIMENSIONEN):
+            return Response({'error': 'Ungültige Dimension.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            von_jahr = int(request.query_params['from']) if request.query_params.get('from') else None
+            bis_jahr = int(request.query_params['to']) if request.query_params.get('to') else None
+        except ValueError:
+            return Response({'error': 'Jahr muss eine Zahl sein.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({
-            'average_age': average_age,
-            'gender_distribution': gender_distribution,
-            'konfession_distribution': konfession_distribution,
-            'burial_type_distribution': burial_type_distribution,
-        }, status=status.HTTP_200_OK)
+        return Response(trend_aus_statistik(von_jahr, bis_jahr, dimension), status=status.HTTP_200_OK)
 
 class SterbefallDokumenteApiView(ModelViewSet):
     queryset = SterbefallDokument.objects.all()
-    serializer_class = SterbefallDokumenteSerializer
\ No newline at end of file
+    serializer_class = SterbefallDokumenteSerializer
+
+    @action(detail=True, methods=['get'])
+    def datei(self, request, pk=None):
+        """Die hochgeladene Datei mit Range-Unterstützung und ETag (pdf.js lädt seitenweise)."""
+        dokument = self.get_object()
+        if not dokument.dokument:
+            return Response({'error': 'Datei fehlt.'}, status=status.HTTP_404_NOT_FOUND)
+        name = os.path.basename(dokument.dokument.name)
+        return datei_antwort(
+            request, dokument.dokument, dokument.inhalt_hash,
+            content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            dateiname=dokument.name or name,
+        )
\ No newline at end of file
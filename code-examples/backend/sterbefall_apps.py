@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class SterbefallConfig(AppConfig):
+    name = 'sterbefall'
+
+    def ready(self):
+        from . import signals  # noqa: F401
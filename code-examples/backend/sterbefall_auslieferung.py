@@ -0,0 +1,126 @@
+import hashlib
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+
+# Präfix der internen nginx-Location (alias MEDIA_ROOT); leer = Django liefert selbst aus
+X_ACCEL_PREFIX = getattr(settings, 'DATEI_X_ACCEL_PREFIX', '')
+BLOCK = 64 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def inhalt_hash(datei):
+    """SHA-256 einer FileField-Datei, blockweise gelesen (auch frische Uploads vor dem Speichern)."""
+    summe = hashlib.sha256()
+    if not datei._committed:
+        # Nicht schließen, FileField.pre_save liest den Upload noch
+        datei.file.seek(0)
+        for block in iter(lambda: datei.file.read(BLOCK), b''):
+            summe.update(block)
+        datei.file.seek(0)
+        return summe.hexdigest()
+    datei.open('rb')
+    try:
+        for block in iter(lambda: datei.read(BLOCK), b''):
+            summe.update(block)
+    finally:
+        datei.close()
+    return summe.hexdigest()
+
+
+def _bereich(request, groesse):
+    """
+    (start, ende) aus dem Range-Header, None für die ganze Datei, False wenn nicht
+    erfüllbar. Mehrere Bereiche werden nicht unterstützt, dann gibt es die ganze Datei.
+    """
+    kopf = request.META.get('HTTP_RANGE', '').replace(' ', '')
+    treffer = _RANGE.match(kopf)
+    if not treffer or not any(treffer.groups()):
+        return None
+    start, ende = treffer.groups()
+    if not start:
+        # bytes=-N: die letzten N Bytes
+        laenge = int(ende)
+        if not laenge:
+            return False
+        return max(groesse - laenge, 0), groesse - 1
+    start = int(start)
+    ende = min(int(ende), groesse - 1) if ende else groesse - 1
+    if start >= groesse or start > ende:
+        return False
+    return start, ende
+
+
+def _lesen(pfad, start, laenge):
+    with open(pfad, 'rb') as datei:
+        datei.seek(start)
+        while laenge > 0:
+            block = datei.read(min(BLOCK, laenge))
+            if not block:
+                break
+            laenge -= len(block)
+            yield block
+
+
+def _disposition(dateiname, inline):
+    art = 'inline' if inline else 'attachment'
+    return f"{art}; filename*=UTF-8''{quote(dateiname)}"
+
+
+def datei_antwort(request, datei, hash_wert, content_type='application/octet-stream', dateiname=None, inline=True):
+    """
+    Liefert eine FileField-Datei nach erfolgter Berechtigungsprüfung aus:
+    starkes ETag aus dem Inhalts-Hash (304 bei If-None-Match), Range-Anfragen (206/416)
+    und, wenn DATEI_X_ACCEL_PREFIX gesetzt ist, Übergabe an nginx per X-Accel-Redirect.
+    Fehlt die Datei im Storage, gibt es 404 (Http404).
+    """
+    etag = f'"{hash_wert}"' if hash_wert else None
+    kopf = {'Accept-Ranges': 'bytes', 'Cache-Control': 'private, no-cache'}
+    if etag:
+        kopf['ETag'] = etag
+    if dateiname:
+        kopf['Content-Disposition'] = _disposition(dateiname, inline)
+
+    if etag and etag in [teil.strip() for teil in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponse(status=304)
+        for name, wert in kopf.items():
+            response[name] = wert
+        return response
+
+    pfad = datei.path
+    if X_ACCEL_PREFIX:
+        # nginx übernimmt Range und Übertragung; der Pfad enthält das Tenant-Schema (TenantFileSystemStorage)
+        relativ = os.path.relpath(pfad, settings.MEDIA_ROOT)
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(f"{X_ACCEL_PREFIX.rstrip('/')}/{relativ}")
+        for name, wert in kopf.items():
+            response[name] = wert
+        return response
+
+    try:
+        groesse = os.path.getsize(pfad)
+    except FileNotFoundError:
+        raise Http404('Datei fehlt im Storage.')
+    bereich = _bereich(request, groesse)
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if bereich and if_range and if_range != etag:
+        bereich = None  # Datei hat sich geändert: ganz ausliefern
+    if bereich is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{groesse}'
+        return response
+
+    start, ende = bereich or (0, groesse - 1)
+    laenge = ende - start + 1 if groesse else 0
+    response = StreamingHttpResponse(_lesen(pfad, start, laenge), content_type=content_type,
+                                     status=206 if bereich else 200)
+    response['Content-Length'] = str(laenge)
+    if bereich:
+        response['Content-Range'] = f'bytes {start}-{ende}/{groesse}'
+    for name, wert in kopf.items():
+        response[name] = wert
+    return response
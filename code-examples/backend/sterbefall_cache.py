@@ -0,0 +1,158 @@
+import copy
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+# Standard-Lebensdauer gecachter Antworten in Sekunden
+FALL_CACHE_TIMEOUT = getattr(settings, 'FALL_CACHE_TIMEOUT', 300)
+# So lange darf ein Request die Neuberechnung für einen Schlüssel exklusiv halten
+SPERRE_TIMEOUT = 10
+# Wartezeit anderer Requests auf die laufende Neuberechnung, bevor sie selbst rechnen
+WARTEZEIT = 2.0
+WARTE_INTERVALL = 0.05
+
+_zaehler = Counter()
+_zaehler_lock = threading.Lock()
+
+
+def _zaehlen(art, ressource):
+    with _zaehler_lock:
+        _zaehler[(ressource, art)] += 1
+
+
+def cache_statistik():
+    """Treffer/Fehlzugriffe dieses Prozesses je Ressource, z.B. für Monitoring."""
+    with _zaehler_lock:
+        statistik = {}
+        for (ressource, art), anzahl in _zaehler.items():
+            statistik.setdefault(ressource, {'hits': 0, 'misses': 0, 'wartend': 0})[art] = anzahl
+    for werte in statistik.values():
+        gesamt = werte['hits'] + werte['misses']
+        werte['hit_ratio'] = werte['hits'] / gesamt if gesamt else None
+    return statistik
+
+
+def _basis(ressource, sterbefall_id):
+    # Schema im Schlüssel, da alle Tenants denselben Cache teilen
+    return f'fall:{connection.schema_name}:{ressource}:{sterbefall_id}'
+
+
+def aktuelle_version(version_key):
+    """Stand eines Versionszählers im gemeinsamen Cache (erhöhen per cache.incr)."""
+    version = cache.get(version_key)
+    if version is None:
+        # Zeitstempel statt 1, damit nach Verdrängung des Versionsschlüssels keine alten Einträge wieder gültig werden
+        cache.add(version_key, time.time_ns(), timeout=None)
+        version = cache.get(version_key)
+    return version
+
+
+def _version(basis):
+    return aktuelle_version(f'{basis}:version')
+
+
+class ProzessCache:
+    """
+    Prozesslokaler LRU-Cache mit höchstens groesse Einträgen, optional mit Lebensdauer
+    (ttl in Sekunden), thread-sicher. Gespeichert und geliefert werden Kopien (kopie),
+    damit Änderungen eines Requests nicht im Cache landen; kopie=None für Werte,
+    die nie verändert werden.
+    """
+
+    def __init__(self, groesse, ttl=None, kopie=copy.copy):
+        self.groesse = groesse
+        self.ttl = ttl
+        self.kopie = kopie
+        self._eintraege = OrderedDict()  # schluessel -> (gueltig_bis, wert)
+        self._lock = threading.Lock()
+
+    def get(self, schluessel, default=None):
+        with self._lock:
+            eintrag = self._eintraege.get(schluessel)
+            if eintrag is None:
+                return default
+            if eintrag[0] is not None and eintrag[0] <= time.monotonic():
+                del self._eintraege[schluessel]
+                return default
+            self._eintraege.move_to_end(schluessel)
+        return self.kopie(eintrag[1]) if self.kopie else eintrag[1]
+
+    def set(self, schluessel, wert, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        eintrag = (None if ttl is None else time.monotonic() + ttl, self.kopie(wert) if self.kopie else wert)
+        with self._lock:
+            self._eintraege[schluessel] = eintrag
+            self._eintraege.move_to_end(schluessel)
+            while len(self._eintraege) > self.groesse:
+                self._eintraege.popitem(last=False)
+
+    def pop(self, schluessel):
+        with self._lock:
+            self._eintraege.pop(schluessel, None)
+
+    def entfernen(self, bedingung):
+        """Entfernt alle Einträge, deren Wert bedingung(wert) erfüllt."""
+        with self._lock:
+            for schluessel in [schluessel for schluessel, (_, wert) in self._eintraege.items() if bedingung(wert)]:
+                del self._eintraege[schluessel]
+
+    def clear(self):
+        with self._lock:
+            self._eintraege.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._eintraege)
+
+
+def lese_durch(ressource, sterbefall_id, laden, timeout=FALL_CACHE_TIMEOUT):
+    """
+    Read-through-Cache für serialisierte Unterressourcen eines Sterbefalls.
+    laden() liefert die fertige, picklebare Antwort (z.B. serializer.data als Liste).
+    Bei einem Fehlzugriff berechnet nur ein Request neu, parallele Requests warten
+    kurz auf dessen Ergebnis (Schutz vor Cache-Stampede).
+    """
+    basis = _basis(ressource, sterbefall_id)
+    key = f'{basis}:v{_version(basis)}'
+    daten = cache.get(key)
+    if daten is not None:
+        _zaehlen('hits', ressource)
+        return daten
+
+    _zaehlen('misses', ressource)
+    sperre = f'{key}:sperre'
+    if not cache.add(sperre, 1, timeout=SPERRE_TIMEOUT):
+        _zaehlen('wartend', ressource)
+        frist = time.monotonic() + WARTEZEIT
+        while time.monotonic() < frist:
+            time.sleep(WARTE_INTERVALL)
+            daten = cache.get(key)
+            if daten is not None:
+                return daten
+        return laden()
+
+    try:
+        daten = laden()
+        cache.set(key, daten, timeout=timeout)
+    finally:
+        cache.delete(sperre)
+    return daten
+
+
+def invalidiere(ressource, sterbefall_id):
+    """Macht alle gecachten Stände der Ressource ungültig, sobald die Transaktion committed ist."""
+    if sterbefall_id is None:
+        return
+    basis = _basis(ressource, sterbefall_id)
+
+    def version_erhoehen():
+        try:
+            cache.incr(f'{basis}:version')
+        except ValueError:
+            pass  # noch nie gecacht, nichts zu invalidieren
+
+    transaction.on_commit(version_erhoehen)
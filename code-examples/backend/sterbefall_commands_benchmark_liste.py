@@ -0,0 +1,54 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from tenant_schemas.utils import schema_context
+
+from sterbefall.models import Sterbefall
+from sterbefall.projektion import STERBEFALL_LISTEN_FELDER
+from sterbefall.serializers import SterbefallSerializer
+
+
+class Command(BaseCommand):
+    help = 'Vergleicht DB-Zeit, Serialisierungszeit und Antwortgröße der Fallliste je Projektion.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema', help='Schema des Tenants')
+        parser.add_argument('--zeilen', type=int, default=1000)
+        parser.add_argument('--wiederholungen', type=int, default=10)
+
+    def handle(self, *args, **options):
+        with schema_context(options['schema']):
+            varianten = [
+                ('full', None),
+                ('list', STERBEFALL_LISTEN_FELDER),
+            ]
+            for name, felder in varianten:
+                db, serialisierung, groesse = self.messen(felder, options)
+                self.stdout.write(
+                    f'{name:6} DB: {db:8.2f} ms   Serialisierung: {serialisierung:8.2f} ms   '
+                    f'JSON: {groesse / 1024:8.1f} KiB'
+                )
+
+    def messen(self, felder, options):
+        db_zeiten, serialisierung_zeiten = [], []
+        groesse = 0
+        for _ in range(options['wiederholungen']):
+            queryset = Sterbefall.objects.order_by('-auftragsnummer')
+            if felder:
+                queryset = queryset.only(*felder)
+
+            start = time.perf_counter()
+            faelle = list(queryset[:options['zeilen']])
+            db_zeiten.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            serializer = SterbefallSerializer(faelle, many=True)
+            if felder:
+                for name in set(serializer.child.fields) - set(felder):
+                    serializer.child.fields.pop(name)
+            inhalt = JSONRenderer().render(serializer.data)
+            serialisierung_zeiten.append((time.perf_counter() - start) * 1000)
+            groesse = len(inhalt)
+        return statistics.median(db_zeiten), statistics.median(serialisierung_zeiten), groesse
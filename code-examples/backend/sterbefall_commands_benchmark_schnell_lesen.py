@@ -0,0 +1,66 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from tenant_schemas.utils import schema_context
+
+from rechnung.models import Rechnung, Rechnungsposition
+from rechnung.serializers import RechnungSerializer, RechnungspositionSerializer
+from sterbefall.models import Sterbefall
+from sterbefall.schnell_lesen import NichtUnterstuetzt, kompiliere_leseplan, lese_zeilen
+from sterbefall.serializers import SterbefallSerializer
+
+KANDIDATEN = (
+    ('Sterbefall', Sterbefall, SterbefallSerializer),
+    ('Rechnung', Rechnung, RechnungSerializer),
+    ('Rechnungsposition', Rechnungsposition, RechnungspositionSerializer),
+)
+
+
+class Command(BaseCommand):
+    help = 'Vergleicht Serializer und values()-Schnellpfad (Zeilen/s) und prüft byte-identisches JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema', help='Schema des Tenants')
+        parser.add_argument('--zeilen', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--wiederholungen', type=int, default=5)
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        with schema_context(options['schema']):
+            for name, model, serializer_class in KANDIDATEN:
+                try:
+                    plan = kompiliere_leseplan(serializer_class(many=True))
+                except NichtUnterstuetzt as e:
+                    self.stdout.write(f'{name}: Schnellpfad nicht möglich (Feld {e})')
+                    continue
+
+                for anzahl in options['zeilen']:
+                    queryset = model.objects.order_by('pk')[:anzahl]
+
+                    def serializer_weg():
+                        return renderer.render(serializer_class(list(queryset), many=True).data)
+
+                    def schnell_weg():
+                        zeilen = queryset.values(*{quelle for _, quelle, _ in plan})
+                        return renderer.render(lese_zeilen(plan, zeilen))
+
+                    if serializer_weg() != schnell_weg():
+                        raise CommandError(f'{name}: JSON des Schnellpfads weicht vom Serializer ab')
+
+                    vorher = self.messen(serializer_weg, options['wiederholungen'])
+                    nachher = self.messen(schnell_weg, options['wiederholungen'])
+                    zeilen = min(anzahl, queryset.count())
+                    self.stdout.write(
+                        f'{name:18} {zeilen:6} Zeilen  Serializer: {zeilen / vorher:10.0f}/s   '
+                        f'Schnellpfad: {zeilen / nachher:10.0f}/s   Faktor {vorher / nachher:5.1f}'
+                    )
+
+    def messen(self, funktion, wiederholungen):
+        dauer = []
+        for _ in range(wiederholungen):
+            start = time.perf_counter()
+            funktion()
+            dauer.append(time.perf_counter() - start)
+        return statistics.median(dauer)
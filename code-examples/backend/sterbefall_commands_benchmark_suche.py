@@ -0,0 +1,90 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from faker import Faker
+from tenant_schemas.utils import schema_context
+
+from sterbefall.models import Sterbefall
+from sterbefall.search import suche_sterbefaelle
+
+
+def alte_suche(queryset, search_query):
+    """Die frühere icontains-Kette aus SterbefallViewSet.get_queryset, nur für den Vergleich."""
+    return queryset.filter(
+        Q(auftraggeber_vorname__icontains=search_query) |
+        Q(auftraggeber_nachname__icontains=search_query) |
+        Q(verstorbener_vorname__icontains=search_query) |
+        Q(verstorbener_nachname__icontains=search_query) |
+        Q(auftragsnummer__icontains=search_query) |
+        Q(
+            Q(auftraggeber_vorname__icontains=search_query.split(' ')[0]) &
+            Q(auftraggeber_nachname__icontains=search_query.split(' ')[-1])
+        ) |
+        Q(
+            Q(verstorbener_vorname__icontains=search_query.split(' ')[0]) &
+            Q(verstorbener_nachname__icontains=search_query.split(' ')[-1])
+        )
+    ).order_by('-auftragsnummer')
+
+
+class Command(BaseCommand):
+    help = 'Misst die Latenz der Sterbefall-Suche (alte icontains-Kette gegen Suchindex).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema', help='Schema des Tenants, in dem gemessen wird')
+        parser.add_argument('--anzahl', type=int, default=50000,
+                            help='Fehlende Sterbefälle bis zu dieser Anzahl mit Testdaten auffüllen')
+        parser.add_argument('--wiederholungen', type=int, default=20)
+        parser.add_argument('--seitengroesse', type=int, default=100)
+
+    def handle(self, *args, **options):
+        with schema_context(options['schema']):
+            self.testdaten_anlegen(options['anzahl'])
+
+            stichprobe = list(
+                Sterbefall.objects.order_by('?').values_list('verstorbener_nachname', 'auftraggeber_vorname')[:5]
+            )
+            anfragen = ['mü', 'schmidt', '24']
+            for nachname, vorname in stichprobe:
+                anfragen.append((nachname or '')[:3])
+                anfragen.append(f'{vorname or ""} {nachname or ""}'.strip())
+
+            for anfrage in anfragen:
+                vorher = self.messen(alte_suche, anfrage, options)
+                nachher = self.messen(suche_sterbefaelle, anfrage, options)
+                self.stdout.write(
+                    f'{anfrage!r:30} alt: {vorher:8.2f} ms   neu: {nachher:8.2f} ms'
+                )
+
+    def messen(self, suche, anfrage, options):
+        """Median in Millisekunden für das Laden der ersten Ergebnisseite."""
+        queryset = Sterbefall.objects.all()
+        dauer = []
+        for _ in range(options['wiederholungen']):
+            start = time.perf_counter()
+            list(suche(queryset, anfrage).values_list('uuid', flat=True)[:options['seitengroesse']])
+            dauer.append((time.perf_counter() - start) * 1000)
+        return statistics.median(dauer)
+
+    def testdaten_anlegen(self, anzahl):
+        vorhanden = Sterbefall.objects.count()
+        if vorhanden >= anzahl:
+            return
+        fake = Faker('de_DE')
+        self.stdout.write(f'Lege {anzahl - vorhanden} Test-Sterbefälle an ...')
+        for _ in range(anzahl - vorhanden):
+            Sterbefall.objects.create(
+                auftraggeber_vorname=fake.first_name(),
+                auftraggeber_nachname=fake.last_name(),
+                auftraggeber_strasse=fake.street_address(),
+                auftraggeber_plz=fake.postcode(),
+                auftraggeber_stadt=fake.city(),
+                verstorbener_vorname=fake.first_name(),
+                verstorbener_nachname=fake.last_name(),
+                verstorbener_geburtsname=fake.last_name(),
+                verstorbener_strasse=fake.street_address(),
+                verstorbener_plz=fake.postcode(),
+                verstorbener_stadt=fake.city(),
+            )
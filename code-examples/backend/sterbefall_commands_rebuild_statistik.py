@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from tenant_schemas.utils import schema_context
+
+from sterbefall.statistik import statistik_neu_aufbauen
+
+
+class Command(BaseCommand):
+    help = 'Baut die Sterbefall-Statistik eines Tenants komplett neu auf.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema', help='Schema des Tenants')
+
+    def handle(self, *args, **options):
+        with schema_context(options['schema']):
+            anzahl = statistik_neu_aufbauen()
+        self.stdout.write(self.style.SUCCESS(
+            f"Statistik für {options['schema']} neu aufgebaut ({anzahl} Buckets)."
+        ))
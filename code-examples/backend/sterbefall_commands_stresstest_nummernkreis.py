@@ -0,0 +1,60 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from tenant_schemas.utils import schema_context
+
+from sterbefall.models import Nummernkreis, Sterbefall
+from sterbefall.nummernkreis import LUECKENLOS, MIT_LUECKEN, naechste_nummer
+
+TEST_SCHLUESSEL = 'stresstest'
+
+
+class Command(BaseCommand):
+    help = 'Vergibt Nummern parallel aus mehreren Verbindungen und prüft auf doppelte Nummern.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema', help='Schema des Tenants')
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--anzahl', type=int, default=200, help='Vergaben je Thread')
+        parser.add_argument('--modus', choices=[LUECKENLOS, MIT_LUECKEN], default=LUECKENLOS)
+        parser.add_argument('--sterbefaelle', action='store_true',
+                            help='Echte Sterbefälle anlegen (und wieder löschen) statt nur Nummern zu ziehen')
+
+    def handle(self, *args, **options):
+        schema = options['schema']
+
+        def arbeiter(_):
+            nummern = []
+            try:
+                with schema_context(schema):
+                    for _ in range(options['anzahl']):
+                        if options['sterbefaelle']:
+                            nummern.append(Sterbefall.objects.create().auftragsnummer)
+                        else:
+                            with transaction.atomic():
+                                nummern.append(naechste_nummer(TEST_SCHLUESSEL, modus=options['modus']))
+            finally:
+                connection.close()
+            return nummern
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            nummern = [nummer for ergebnis in pool.map(arbeiter, range(options['threads'])) for nummer in ergebnis]
+        dauer = time.perf_counter() - start
+
+        with schema_context(schema):
+            if options['sterbefaelle']:
+                Sterbefall.objects.filter(auftragsnummer__in=nummern).delete()
+            else:
+                Nummernkreis.objects.filter(schluessel=TEST_SCHLUESSEL).delete()
+
+        doppelt = {nummer: anzahl for nummer, anzahl in Counter(nummern).items() if anzahl > 1}
+        self.stdout.write(
+            f'{len(nummern)} Nummern in {dauer:.2f} s vergeben ({len(nummern) / dauer:.0f}/s), '
+            f'{len(doppelt)} Kollisionen'
+        )
+        if doppelt:
+            raise CommandError(f'Doppelt vergebene Nummern: {sorted(doppelt)[:20]}')
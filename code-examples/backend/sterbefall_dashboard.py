@@ -0,0 +1,101 @@
+from django.db import connection
+
+NICHT_ANGEGEBEN = 'Nicht angegeben'
+
+# Spalte im Ergebnis -> Schlüssel der Verteilung in der API-Antwort
+VERTEILUNGEN = (
+    ('verstorbener_geschlecht', 'gender_distribution'),
+    ('verstorbener_konfession', 'konfession_distribution'),
+    ('bestattungsart', 'burial_type_distribution'),
+)
+
+# Bits von GROUPING([jahr,] geschlecht, konfession, bestattungsart): 1 = Spalte nicht gruppiert.
+# Ohne Jahre fehlt das Jahr-Argument, die Spalten-Bits bleiben gleich.
+_JAHR_BIT = 8
+_SPALTEN_BITS = {'verstorbener_geschlecht': 4, 'verstorbener_konfession': 2, 'bestattungsart': 1}
+
+_DASHBOARD_SQL = """
+    SELECT
+        {jahr} AS jahr,
+        s.verstorbener_geschlecht,
+        s.verstorbener_konfession,
+        s.bestattungsart,
+        GROUPING({jahr_gruppierung}s.verstorbener_geschlecht,
+                 s.verstorbener_konfession, s.bestattungsart) AS gruppierung,
+        COUNT(*) AS anzahl,
+        SUM(FLOOR((s.sterbedaten_todeszeitpunkt - s.verstorbener_geburtsdatum) / 365.0)) AS alter_summe,
+        COUNT(s.sterbedaten_todeszeitpunkt - s.verstorbener_geburtsdatum) AS alter_anzahl
+    FROM ({basis}) s
+    GROUP BY GROUPING SETS ({gruppen})
+"""
+
+_GRUPPEN = ['()', '(s.verstorbener_geschlecht)', '(s.verstorbener_konfession)', '(s.bestattungsart)']
+_JAHR = 'EXTRACT(YEAR FROM s.sterbedaten_todeszeitpunkt)'
+_GRUPPEN_PRO_JAHR = [
+    f'({_JAHR})',
+    f'({_JAHR}, s.verstorbener_geschlecht)',
+    f'({_JAHR}, s.verstorbener_konfession)',
+    f'({_JAHR}, s.bestattungsart)',
+]
+
+
+def _leere_kennzahlen():
+    kennzahlen = {'average_age': None}
+    for _, schluessel in VERTEILUNGEN:
+        kennzahlen[schluessel] = {}
+    return kennzahlen
+
+
+def _eintragen(kennzahlen, zeile):
+    if zeile['gruppierung'] & 7 == 7:
+        # Gesamtzeile der Gruppe: liefert das Durchschnittsalter
+        if zeile['alter_anzahl']:
+            kennzahlen['average_age'] = float(zeile['alter_summe']) / zeile['alter_anzahl']
+        return
+    for spalte, schluessel in VERTEILUNGEN:
+        if not zeile['gruppierung'] & _SPALTEN_BITS[spalte]:
+            wert = (zeile[spalte] or NICHT_ANGEGEBEN).strip()
+            verteilung = kennzahlen[schluessel]
+            verteilung[wert] = verteilung.get(wert, 0) + zeile['anzahl']
+
+
+def dashboard_kennzahlen(queryset, pro_jahr=False):
+    """
+    Berechnet Durchschnittsalter und Verteilungen für das Dashboard in einer
+    einzigen Abfrage (GROUPING SETS über den gefilterten Queryset).
+    Mit pro_jahr=True kommen die Kennzahlen je Sterbejahr aus derselben Abfrage.
+    """
+    basis = queryset.order_by().values(
+        'sterbedaten_todeszeitpunkt',
+        'verstorbener_geburtsdatum',
+        'verstorbener_geschlecht',
+        'verstorbener_konfession',
+        'bestattungsart',
+    )
+    basis_sql, params = basis.query.sql_with_params()
+    if pro_jahr:
+        sql = _DASHBOARD_SQL.format(
+            basis=basis_sql, gruppen=', '.join(_GRUPPEN + _GRUPPEN_PRO_JAHR),
+            jahr=f'{_JAHR}::int', jahr_gruppierung=f'{_JAHR}, ',
+        )
+    else:
+        # Jahr in keinem Grouping Set: darf weder in SELECT noch in GROUPING() vorkommen
+        sql = _DASHBOARD_SQL.format(basis=basis_sql, gruppen=', '.join(_GRUPPEN), jahr='NULL::int', jahr_gruppierung='')
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        spalten = [spalte[0] for spalte in cursor.description]
+        zeilen = [dict(zip(spalten, zeile)) for zeile in cursor.fetchall()]
+
+    gesamt = _leere_kennzahlen()
+    jahre = {}
+    for zeile in zeilen:
+        if not pro_jahr or zeile['gruppierung'] & _JAHR_BIT:
+            _eintragen(gesamt, zeile)
+        else:
+            jahr = str(zeile['jahr']) if zeile['jahr'] is not None else NICHT_ANGEGEBEN
+            _eintragen(jahre.setdefault(jahr, _leere_kennzahlen()), zeile)
+
+    if pro_jahr:
+        gesamt['per_year'] = dict(sorted(jahre.items()))
+    return gesamt
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+# Aufräumen höchstens so oft je Cache und Tenant (Sekunden), es scannt das Verzeichnis
+AUFRAEUM_INTERVALL = 30
+
+
+class DateiCache:
+    """
+    Inhaltsadressierter Datei-Cache im Media-Bereich des Tenants
+    (MEDIA_ROOT/<schema>/cache/<name>/<schluessel><endung>).
+
+    Der Schlüssel ist ein Hash über alles, was die Ausgabe bestimmt; ein Eintrag ist
+    damit nie veraltet, sondern wird nur nicht mehr angefragt. Die Größe je Tenant
+    ist auf max_bytes begrenzt, verdrängt wird nach letztem Zugriff (mtime, LRU).
+    """
+
+    def __init__(self, name, max_bytes, endung=''):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.endung = endung
+        self._zaehler = Counter()
+        self._lock = threading.Lock()
+        self._letztes_aufraeumen = {}
+
+    def verzeichnis(self):
+        return os.path.join(settings.MEDIA_ROOT, connection.schema_name, 'cache', self.name)
+
+    def pfad(self, schluessel):
+        return os.path.join(self.verzeichnis(), f'{schluessel}{self.endung}')
+
+    def _zaehlen(self, art):
+        with self._lock:
+            self._zaehler[art] += 1
+
+    def treffer_pfad(self, schluessel):
+        """Pfad des Eintrags oder None; ein Treffer zählt als Zugriff für die LRU-Verdrängung."""
+        pfad = self.pfad(schluessel)
+        try:
+            os.utime(pfad)
+        except FileNotFoundError:
+            self._zaehlen('misses')
+            return None
+        self._zaehlen('hits')
+        return pfad
+
+    def lesen(self, schluessel):
+        pfad = self.treffer_pfad(schluessel)
+        if pfad is None:
+            return None
+        try:
+            with open(pfad, 'rb') as datei:
+                return datei.read()
+        except FileNotFoundError:  # zwischenzeitlich verdrängt
+            return None
+
+    def schreiben(self, schluessel, daten):
+        """Schreibt atomar (tmp + rename), parallele Schreiber desselben Schlüssels sind unkritisch."""
+        verzeichnis = self.verzeichnis()
+        os.makedirs(verzeichnis, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=verzeichnis, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as datei:
+                datei.write(daten)
+            os.replace(tmp, self.pfad(schluessel))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        self._zaehlen('writes')
+        self._aufraeumen_faellig(verzeichnis)
+        return self.pfad(schluessel)
+
+    def _aufraeumen_faellig(self, verzeichnis):
+        jetzt = time.monotonic()
+        with self._lock:
+            if jetzt - self._letztes_aufraeumen.get(verzeichnis, 0) < AUFRAEUM_INTERVALL:
+                return
+            self._letztes_aufraeumen[verzeichnis] = jetzt
+        self.aufraeumen()
+
+    def aufraeumen(self):
+        """Löscht die am längsten nicht genutzten Einträge, bis der Tenant unter max_bytes liegt."""
+        eintraege = []
+        try:
+            with os.scandir(self.verzeichnis()) as dateien:
+                for datei in dateien:
+                    if datei.is_file() and not datei.name.startswith('.tmp-'):
+                        stat = datei.stat()
+                        eintraege.append((stat.st_mtime, stat.st_size, datei.path))
+        except FileNotFoundError:
+            return 0
+        gesamt = sum(groesse for _, groesse, _ in eintraege)
+        entfernt = 0
+        for _, groesse, pfad in sorted(eintraege):
+            if gesamt <= self.max_bytes:
+                break
+            try:
+                os.unlink(pfad)
+            except FileNotFoundError:
+                pass
+            gesamt -= groesse
+            entfernt += 1
+        if entfernt:
+            with self._lock:
+                self._zaehler['evictions'] += entfernt
+        return entfernt
+
+    def belegung(self):
+        """Einträge und Bytes des aktuellen Tenants (scannt das Verzeichnis)."""
+        eintraege = gesamt = 0
+        try:
+            with os.scandir(self.verzeichnis()) as dateien:
+                for datei in dateien:
+                    if datei.is_file() and not datei.name.startswith('.tmp-'):
+                        eintraege += 1
+                        gesamt += datei.stat().st_size
+        except FileNotFoundError:
+            pass
+        return {'eintraege': eintraege, 'bytes': gesamt, 'max_bytes': self.max_bytes}
+
+    def statistik(self):
+        """Zähler dieses Prozesses (hits, misses, writes, evictions, hit_ratio)."""
+        with self._lock:
+            werte = {art: self._zaehler[art] for art in ('hits', 'misses', 'writes', 'evictions')}
+        gesamt = werte['hits'] + werte['misses']
+        werte['hit_ratio'] = werte['hits'] / gesamt if gesamt else None
+        return werte
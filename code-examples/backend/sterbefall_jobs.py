@@ -0,0 +1,8 @@
+from users.batch import tenant_job
+from .statistik import statistik_neu_aufbauen
+
+
+@tenant_job('statistik_neu_aufbauen', timeout=900)
+def sterbefallstatistik_neu_aufbauen():
+    """Baut die Sterbefall-Statistik aus den Sterbefällen neu auf."""
+    return statistik_neu_aufbauen()
@@ -0,0 +1,51 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVectorField
+from django.db import migrations, models
+
+
+def suchdokumente_aufbauen(apps, schema_editor):
+    from sterbefall.search import aktualisiere_suchdokumente
+
+    Sterbefall = apps.get_model('sterbefall', 'Sterbefall')
+    aktualisiere_suchdokumente(Sterbefall.objects.all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sterbefall', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='sterbefall',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='sterbefall',
+            name='search_vector',
+            field=SearchVectorField(editable=False, null=True),
+        ),
+        # search_vector wird aus search_document abgeleitet, auch bei bulk_update/update()
+        migrations.RunSQL(
+            sql="""
+                CREATE TRIGGER sterbefall_search_vector_update
+                BEFORE INSERT OR UPDATE OF search_document ON sterbefall_sterbefall
+                FOR EACH ROW EXECUTE PROCEDURE
+                tsvector_update_trigger(search_vector, 'pg_catalog.simple', search_document);
+            """,
+            reverse_sql="DROP TRIGGER IF EXISTS sterbefall_search_vector_update ON sterbefall_sterbefall;",
+        ),
+        migrations.RunPython(suchdokumente_aufbauen, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='sterbefall',
+            index=GinIndex(fields=['search_vector'], name='sterbefall_search_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='sterbefall',
+            index=GinIndex(fields=['search_document'], name='sterbefall_search_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
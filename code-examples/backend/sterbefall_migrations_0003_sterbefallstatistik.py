@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+
+def statistik_aufbauen(apps, schema_editor):
+    from sterbefall.statistik import STATISTIK_FELDER, _beitraege
+
+    Sterbefall = apps.get_model('sterbefall', 'Sterbefall')
+    SterbefallStatistik = apps.get_model('sterbefall', 'SterbefallStatistik')
+
+    summen = {}
+    for merkmale in Sterbefall.objects.values_list(*STATISTIK_FELDER).iterator():
+        for schluessel, werte in _beitraege(merkmale).items():
+            summen[schluessel] = tuple(a + b for a, b in zip(summen.get(schluessel, (0, 0, 0)), werte))
+
+    SterbefallStatistik.objects.bulk_create([
+        SterbefallStatistik(
+            jahr=jahr, monat=monat, dimension=dimension, wert=wert,
+            anzahl=anzahl, alter_summe=alter_summe, alter_anzahl=alter_anzahl,
+        )
+        for (jahr, monat, dimension, wert), (anzahl, alter_summe, alter_anzahl) in summen.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sterbefall', '0002_suchindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SterbefallStatistik',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jahr', models.IntegerField()),
+                ('monat', models.IntegerField()),
+                ('dimension', models.CharField(choices=[('gesamt', 'Gesamt'), ('geschlecht', 'Geschlecht'), ('konfession', 'Konfession'), ('bestattungsart', 'Bestattungsart'), ('todesart', 'Todesart')], max_length=20)),
+                ('wert', models.CharField(max_length=250)),
+                ('anzahl', models.IntegerField(default=0)),
+                ('alter_summe', models.IntegerField(default=0)),
+                ('alter_anzahl', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='sterbefallstatistik',
+            constraint=models.UniqueConstraint(fields=('jahr', 'monat', 'dimension', 'wert'), name='sterbefallstatistik_bucket'),
+        ),
+        migrations.RunPython(statistik_aufbauen, migrations.RunPython.noop),
+    ]
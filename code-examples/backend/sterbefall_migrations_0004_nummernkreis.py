@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sterbefall', '0003_sterbefallstatistik'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Nummernkreis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('schluessel', models.CharField(max_length=100)),
+                ('jahr', models.IntegerField(default=0)),
+                ('letzte_nummer', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='nummernkreis',
+            constraint=models.UniqueConstraint(fields=('schluessel', 'jahr'), name='nummernkreis_schluessel_jahr'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+def hashes_berechnen(apps, schema_editor):
+    from sterbefall.auslieferung import inhalt_hash
+
+    SterbefallDokument = apps.get_model('sterbefall', 'SterbefallDokument')
+    for dokument in SterbefallDokument.objects.exclude(dokument='').iterator():
+        try:
+            dokument.inhalt_hash = inhalt_hash(dokument.dokument)
+        except OSError:
+            continue  # Datei fehlt im Storage, wird ohne ETag ausgeliefert
+        dokument.save(update_fields=['inhalt_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sterbefall', '0004_nummernkreis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sterbefalldokument',
+            name='inhalt_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(hashes_berechnen, migrations.RunPython.noop),
+    ]
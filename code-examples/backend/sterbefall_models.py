@@ -1,14 +1,60 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 import uuid
 import logging
 from datetime import datetime
+from .search import build_search_document
+from .aenderungen import AenderungenMixin
+from .auslieferung import inhalt_hash
+from .nummernkreis import LUECKENLOS, naechste_nummer
 
 logger = logging.getLogger(__name__)
 
 
-class Sterbefall(models.Model):
+def _auftragsnummer_bereiche(jahr):
+    """
+    (von, bis, basis) der Auftragsnummern eines Jahres: YY001 - YY999, ab der
+    1000. Nummer wird NNN länger (YY1000 - YY9999 usw.). Die Nummer ist basis + NNN.
+    """
+    for stellen in range(3, 7):
+        basis = jahr * 10 ** stellen
+        yield basis + (10 ** (stellen - 1) if stellen > 3 else 1), basis + 10 ** stellen, basis
+
+
+def naechste_auftragsnummer():
+    """Nächste Auftragsnummer im Format YYNNN (z.B. 24001), jedes Jahr beginnend bei 001."""
+    current_year = datetime.now().year % 100  # z.B. 2024 -> 24
+
+    def bisher_hoechste():
+        # Übernahme bestehender Nummern beim ersten Auftrag des Jahres (alle Stellenzahlen von NNN)
+        bereiche = list(_auftragsnummer_bereiche(current_year))
+        im_jahr = models.Q()
+        for von, bis, _ in bereiche:
+            im_jahr |= models.Q(auftragsnummer__gte=von, auftragsnummer__lt=bis)
+        hoechste = Sterbefall.objects.filter(im_jahr).aggregate(hoechste=models.Max('auftragsnummer'))['hoechste']
+        if not hoechste:
+            return 0
+        # Mehr Stellen heißt höhere laufende Nummer, das Maximum liegt also im längsten Bereich
+        return next(hoechste - basis for von, bis, basis in bereiche if von <= hoechste < bis)
+
+    new_number = naechste_nummer(
+        'auftrag',
+        jahr=current_year,
+        start=bisher_hoechste,
+        modus=getattr(settings, 'AUFTRAGSNUMMER_MODUS', LUECKENLOS),
+    )
+    return int(f"{current_year}{new_number:03d}")  # Format: YYNNN (24XXX)
+
+
+class Sterbefall(AenderungenMixin, models.Model):
     class Meta:
         app_label = 'sterbefall'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='sterbefall_search_gin'),
+            GinIndex(fields=['search_document'], name='sterbefall_search_trgm', opclasses=['gin_trgm_ops']),
+        ]
     aufnahme_von = models.CharField(max_length= 250, null = True, blank=True)
     anlage_von = models.CharField(max_length= 250, null = True, blank=True)
     zuletzt_bearbeitet_von = models.CharField(max_length= 250, null = True, blank=True)
@@ -141,21 +187,13 @@ class Sterbefall(models.Model):
     # New field to trigger address synchronization
     synchronize_addresses = models.BooleanField(default=False, verbose_name="Synchronize Auftraggeber's address with Partner's address")
     synchronize_adresse = models.BooleanField(default=False, verbose_name="Synchronize Verstorbener mit Auftraggeber address")
+
+    # Suchindex: search_document wird in save() gebaut, search_vector per DB-Trigger daraus abgeleitet
+    search_document = models.TextField(null=True, blank=True, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
     
     # Existing fields and methods continue...
     def save(self, *args, **kwargs):
-        if self._state.adding:  # Nur beim ersten Speichern einer neuen Instanz
-            current_year = datetime.now().year % 100  # z.B. 2024 -> 24
-            last_order = Sterbefall.objects.filter(auftragsnummer__startswith=current_year).order_by('-auftragsnummer').first()
-
-            if last_order:
-                last_number = int(str(last_order.auftragsnummer)[2:])  # Extrahiere laufende Nummer
-                new_number = last_number + 1
-            else:
-                new_number = 1  # Beginne jedes Jahr mit 001
-
-            self.auftragsnummer = int(f"{current_year}{new_number:03d}")  # Format: YYNNN (24XXX)
-
         if self.synchronize_adresse:
             self.auftraggeber_strasse = self.verstorbener_strasse
             self.auftraggeber_plz = self.verstorbener_plz
@@ -167,14 +205,75 @@ class Sterbefall(models.Model):
             self.partner_plz = self.auftraggeber_plz
             self.partner_ort = self.auftraggeber_stadt
             self.partner_land = self.auftraggeber_land
-        
-        super().save(*args, **kwargs)
+
+        # Nummernvergabe und Insert in einer Transaktion, damit der Nummernkreis erst mit dem Fall festgeschrieben wird
+        with transaction.atomic():
+            if self._state.adding and self.auftragsnummer is None:  # Nur beim ersten Speichern einer neuen Instanz
+                self.auftragsnummer = naechste_auftragsnummer()
+            self.search_document = build_search_document(self)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'search_document'}
+            super().save(*args, **kwargs)
 
 class SterbefallDokument(models.Model):
     sterbefall = models.ForeignKey(Sterbefall, on_delete=models.CASCADE, related_name='dokumente')
     name = models.CharField(max_length=250, null=True, blank=True)
     dokument = models.FileField(upload_to='sterbefall_dokumente/')
     hochgeladen_am = models.DateTimeField(auto_now_add=True)
+    # SHA-256 des Inhalts, beim Hochladen ermittelt (ETag der Auslieferung, siehe auslieferung.py)
+    inhalt_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
 
     class Meta:
-        app_label = 'sterbefall'
\ No newline at end of file
+        app_label = 'sterbefall'
+
+    def save(self, *args, **kwargs):
+        if self.dokument and (not self.dokument._committed or self.inhalt_hash is None):
+            try:
+                self.inhalt_hash = inhalt_hash(self.dokument)
+            except OSError:
+                self.inhalt_hash = None  # Datei fehlt im Storage, bleibt ohne Hash (wie in Migration 0005)
+        elif not self.dokument:
+            self.inhalt_hash = None
+        super().save(*args, **kwargs)
+
+
+class SterbefallStatistik(models.Model):
+    """
+    Vorberechnete Fallzahlen je Sterbemonat und Merkmal (Geschlecht, Konfession, ...).
+    Wird bei jeder Änderung eines Sterbefalls inkrementell gepflegt, siehe statistik.py.
+    Fälle ohne Sterbedatum werden unter jahr = 0 / monat = 0 gezählt.
+    """
+    DIMENSIONEN = (
+        ('gesamt', 'Gesamt'),
+        ('geschlecht', 'Geschlecht'),
+        ('konfession', 'Konfession'),
+        ('bestattungsart', 'Bestattungsart'),
+        ('todesart', 'Todesart'),
+    )
+
+    jahr = models.IntegerField()
+    monat = models.IntegerField()
+    dimension = models.CharField(max_length=20, choices=DIMENSIONEN)
+    wert = models.CharField(max_length=250)
+    anzahl = models.IntegerField(default=0)
+    alter_summe = models.IntegerField(default=0)
+    alter_anzahl = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'sterbefall'
+        constraints = [
+            models.UniqueConstraint(fields=['jahr', 'monat', 'dimension', 'wert'], name='sterbefallstatistik_bucket'),
+        ]
+
+
+class Nummernkreis(models.Model):
+    """Zählerstand je Nummernkreis und Jahr, vergeben über nummernkreis.naechste_nummer()."""
+    schluessel = models.CharField(max_length=100)
+    jahr = models.IntegerField(default=0)
+    letzte_nummer = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'sterbefall'
+        constraints = [
+            models.UniqueConstraint(fields=['schluessel', 'jahr'], name='nummernkreis_schluessel_jahr'),
+        ]
@@ -0,0 +1,79 @@
+import hashlib
+import re
+
+from django.db import connection
+
+# Lückenlos: Zähler-Zeile wird bis zum Ende der Transaktion gesperrt. Bei einem
+# Rollback wird die Nummer nicht verbraucht (z.B. für Rechnungsnummern nötig).
+LUECKENLOS = 'lueckenlos'
+# Mit Lücken: native Postgres-Sequenz je Nummernkreis und Jahr, ohne Zeilensperre.
+# Parallele Anlagen blockieren sich nie, abgebrochene Transaktionen hinterlassen Lücken.
+MIT_LUECKEN = 'mit_luecken'
+
+_ZAEHLER_ERHOEHEN_SQL = """
+    UPDATE sterbefall_nummernkreis SET letzte_nummer = letzte_nummer + 1
+    WHERE schluessel = %s AND jahr = %s
+    RETURNING letzte_nummer
+"""
+
+_ZAEHLER_ANLEGEN_SQL = """
+    INSERT INTO sterbefall_nummernkreis (schluessel, jahr, letzte_nummer)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (schluessel, jahr) DO UPDATE
+        SET letzte_nummer = sterbefall_nummernkreis.letzte_nummer + 1
+    RETURNING letzte_nummer
+"""
+
+# Bereits angelegte Sequenzen je Schema, damit nicht bei jeder Nummer nachgefragt wird
+_bekannte_sequenzen = set()
+
+
+def naechste_nummer(schluessel, jahr=0, start=None, modus=LUECKENLOS):
+    """
+    Vergibt die nächste Nummer eines Nummernkreises im aktuellen Tenant-Schema.
+
+    schluessel: Name des Nummernkreises, z.B. 'auftrag' oder 'rechnung:R:<uuid>'
+    jahr:       Nummernkreise mit jahr != 0 beginnen jedes Jahr neu
+    start:      Callable, das beim ersten Zugriff die bisher höchste vergebene Nummer
+                liefert (Übernahme von Bestandsdaten), sonst wird bei 1 begonnen
+    modus:      LUECKENLOS (innerhalb der aufrufenden Transaktion aufrufen) oder MIT_LUECKEN
+    """
+    if modus == MIT_LUECKEN:
+        return _naechste_aus_sequenz(schluessel, jahr, start)
+
+    with connection.cursor() as cursor:
+        cursor.execute(_ZAEHLER_ERHOEHEN_SQL, [schluessel, jahr])
+        zeile = cursor.fetchone()
+        if zeile is None:
+            # Erster Zugriff auf diesen Nummernkreis: mit Bestand initialisieren.
+            # Legt ein paralleler Aufruf die Zeile zeitgleich an, greift ON CONFLICT.
+            erste_nummer = (start() if start else 0) + 1
+            cursor.execute(_ZAEHLER_ANLEGEN_SQL, [schluessel, jahr, erste_nummer])
+            zeile = cursor.fetchone()
+    return zeile[0]
+
+
+def _sequenz_name(schluessel, jahr):
+    """
+    Name der Sequenz, eindeutig je (schluessel, jahr): einfache Schlüssel wie 'auftrag'
+    lesbar, alle anderen (Sonderzeichen, Postgres-Limit von 63 Zeichen) über ihren Hash.
+    """
+    name = f'nummernkreis_{schluessel}_{jahr}'
+    if re.fullmatch(r'[a-z0-9_]+', schluessel) and len(name) <= 63:
+        return name
+    # 'nummernkreish_' statt 'nummernkreis_': gehashte Namen fallen nie mit lesbaren zusammen
+    return f'nummernkreish_{hashlib.sha1(schluessel.encode("utf-8")).hexdigest()}_{jahr}'
+
+
+def _naechste_aus_sequenz(schluessel, jahr, start):
+    name = _sequenz_name(schluessel, jahr)
+    with connection.cursor() as cursor:
+        bekannt = (connection.schema_name, name)
+        if bekannt not in _bekannte_sequenzen:
+            cursor.execute('SELECT to_regclass(%s)', [name])
+            if cursor.fetchone()[0] is None:
+                erste_nummer = (start() if start else 0) + 1
+                cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS "{name}" START WITH {int(erste_nummer)}')
+            _bekannte_sequenzen.add(bekannt)
+        cursor.execute('SELECT nextval(%s)', [name])
+        return cursor.fetchone()[0]
@@ -0,0 +1,159 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db import connection
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+def geschaetzte_anzahl(queryset):
+    """Anzahl der Treffer laut Planer-Statistik (EXPLAIN), ohne COUNT(*) über die Tabelle."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor-Pagination über eine eindeutige Sortierung (z.B. -auftragsnummer, uuid).
+    Jede Seite ist ein Index-Range-Scan ab dem letzten Eintrag der Vorseite, unabhängig
+    von der Scrolltiefe. Es gibt nur einen "next"-Link (Endlos-Scrollen im Frontend).
+    Mit ?count=approx wird die Gesamtzahl aus der Planer-Statistik geschätzt.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    # Letztes Feld muss eindeutig und NOT NULL sein; Views können keyset_ordering setzen
+    ordering = ('-pk',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = getattr(view, 'keyset_ordering', self.ordering)
+        self.count_estimate = None
+        if request.query_params.get('count') == 'approx':
+            self.count_estimate = geschaetzte_anzahl(queryset)
+
+        groesse = self.get_page_size(request)
+        queryset = queryset.order_by(*self._sortierung())
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self._nach_cursor(cursor))
+
+        eintraege = list(queryset[:groesse + 1])
+        self.next_cursor = None
+        if len(eintraege) > groesse:
+            eintraege = eintraege[:groesse]
+            self.next_cursor = self._cursor_von(eintraege[-1])
+        return eintraege
+
+    def get_paginated_response(self, data):
+        antwort = OrderedDict([('next', self.get_next_link()), ('results', data)])
+        if self.count_estimate is not None:
+            antwort['count_estimate'] = self.count_estimate
+        return Response(antwort)
+
+    def get_page_size(self, request):
+        try:
+            groesse = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(groesse, self.max_page_size))
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def decode_cursor(self, request):
+        roh = request.query_params.get(self.cursor_query_param)
+        if not roh:
+            return None
+        try:
+            werte = json.loads(base64.urlsafe_b64decode(roh.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound('Ungültiger Cursor.')
+        if not isinstance(werte, list) or len(werte) != len(self.ordering):
+            raise NotFound('Ungültiger Cursor.')
+        return werte
+
+    def _felder(self):
+        return [(feld.lstrip('-'), feld.startswith('-')) for feld in self.ordering]
+
+    def _sortierung(self):
+        return [
+            F(feld).desc(nulls_last=True) if absteigend else F(feld).asc(nulls_last=True)
+            for feld, absteigend in self._felder()
+        ]
+
+    def _cursor_von(self, eintrag):
+        werte = []
+        for feld, _ in self._felder():
+            if isinstance(eintrag, dict):  # Zeilen aus queryset.values()
+                wert = eintrag[feld]
+            else:
+                wert = getattr(eintrag, 'pk' if feld == 'pk' else eintrag._meta.get_field(feld).attname)
+            werte.append(wert if wert is None or isinstance(wert, (int, float)) else str(wert))
+        kodiert = json.dumps(werte, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(kodiert).decode('ascii')
+
+    def _nach_cursor(self, cursor):
+        """Lexikografisches "nach dem Cursor" über alle Sortierfelder, NULL-Werte stehen am Ende."""
+        bedingung = Q(pk__in=[])  # leere Bedingung für das letzte Feld
+        for (feld, absteigend), wert in reversed(list(zip(self._felder(), cursor))):
+            if wert is None:
+                bedingung = Q(**{f'{feld}__isnull': True}) & bedingung
+            else:
+                vergleich = 'lt' if absteigend else 'gt'
+                bedingung = (
+                    Q(**{f'{feld}__{vergleich}': wert})
+                    | Q(**{f'{feld}__isnull': True})
+                    | (Q(**{feld: wert}) & bedingung)
+                )
+        return bedingung
+
+
+class WahlweiseCursorPagination(BasePagination):
+    """
+    Opt-in für Keyset-Pagination: mit ?pagination=cursor (oder einem ?cursor=) wird
+    KeysetPagination verwendet, sonst die bisherige Pagination der View
+    (seiten_pagination_class = None bedeutet: ungepaginierte Liste wie bisher).
+    """
+    seiten_pagination_class = StandardResultsSetPagination
+    cursor_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_modus = (
+            request.query_params.get('pagination') == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+        klasse = self.cursor_pagination_class if cursor_modus else self.seiten_pagination_class
+        self.aktiv = klasse() if klasse else None
+        if self.aktiv is None:
+            return None
+        return self.aktiv.paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        return self.aktiv.get_paginated_response(data)
+
+    def to_html(self):
+        return self.aktiv.to_html() if self.aktiv else ''
+
+
+class OptionaleCursorPagination(WahlweiseCursorPagination):
+    """Für bisher ungepaginierte Listen (Rechnungen, Positionen): nur Cursor-Modus auf Wunsch."""
+    seiten_pagination_class = None
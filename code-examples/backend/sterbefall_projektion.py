@@ -0,0 +1,87 @@
+from rest_framework.exceptions import ValidationError
+
+# Kompakte Projektion für die Fallliste im Frontend
+STERBEFALL_LISTEN_FELDER = (
+    'uuid',
+    'auftragsnummer',
+    'auftrags_datum',
+    'aufnahme_von',
+    'zuletzt_bearbeitet_von',
+    'auftraggeber_anrede',
+    'auftraggeber_vorname',
+    'auftraggeber_nachname',
+    'verstorbener_anrede',
+    'verstorbener_vorname',
+    'verstorbener_nachname',
+    'verstorbener_geburtsdatum',
+    'sterbedaten_todeszeitpunkt',
+    'bestattungsart',
+)
+
+
+def _liste(wert):
+    return [feld.strip() for feld in wert.split(',') if feld.strip()]
+
+
+class ProjektionMixin:
+    """
+    Sparse Fieldsets für lesende Zugriffe einer ModelViewSet:
+
+    ?fields=a,b       nur diese Felder
+    ?omit=a,b         alle Felder außer diesen
+    ?projection=full  alle Felder (Standard außer bei list)
+    ?projection=list  die kompakte list_projection (Standard bei list)
+
+    Die Auswahl wird per .only() bis in das SELECT durchgereicht und die
+    übrigen Felder werden aus dem Serializer entfernt.
+    """
+    list_projection = None
+
+    def get_projection(self):
+        """Liefert die gewünschten Feldnamen oder None für alle Felder."""
+        if self.request is None or self.request.method != 'GET':
+            return None
+        if hasattr(self, '_projektion'):
+            return self._projektion
+
+        params = self.request.query_params
+        verfuegbar = list(self.get_serializer_class()().fields)
+        projektion = params.get('projection')
+        if projektion not in (None, 'list', 'full'):
+            raise ValidationError({'projection': 'Erlaubt sind "list" und "full".'})
+
+        if 'fields' in params:
+            felder = _liste(params['fields'])
+        elif projektion == 'list' or (projektion is None and self.action == 'list' and self.list_projection):
+            felder = list(self.list_projection or verfuegbar)
+        else:
+            felder = verfuegbar
+
+        if 'omit' in params:
+            weglassen = set(_liste(params['omit']))
+            felder = [feld for feld in felder if feld not in weglassen]
+
+        unbekannt = sorted(set(felder) - set(verfuegbar))
+        if unbekannt:
+            raise ValidationError({'fields': f'Unbekannte Felder: {", ".join(unbekannt)}'})
+
+        self._projektion = None if felder == verfuegbar else felder
+        return self._projektion
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        felder = self.get_projection()
+        if felder is None:
+            return queryset
+        model_felder = {feld.name for feld in queryset.model._meta.concrete_fields}
+        spalten = [feld for feld in felder if feld in model_felder]
+        return queryset.only(queryset.model._meta.pk.name, *spalten)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        felder = self.get_projection()
+        if felder is not None:
+            ziel = getattr(serializer, 'child', serializer)
+            for name in set(ziel.fields) - set(felder):
+                ziel.fields.pop(name)
+        return serializer
@@ -0,0 +1,182 @@
+import decimal
+
+from django.db import models
+from django.utils.encoding import is_protected_type
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+ISO_8601 = 'iso-8601'
+
+
+class NichtUnterstuetzt(Exception):
+    """Der Serializer enthält Felder, die der Schnellpfad nicht exakt nachbilden kann."""
+
+
+def _identitaet(wert):
+    return wert
+
+
+def _datum_konverter(feld):
+    format = getattr(feld, 'format', api_settings.DATE_FORMAT)
+    if format is None:
+        return _identitaet
+    if format.lower() == ISO_8601:
+        return lambda wert: wert if isinstance(wert, str) else wert.isoformat()
+    return lambda wert: wert if isinstance(wert, str) else wert.strftime(format)
+
+
+def _dezimal_konverter(feld):
+    if not getattr(feld, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING) or feld.localize:
+        return feld.to_representation
+    if feld.decimal_places is None:
+        return lambda wert: '{:f}'.format(wert if isinstance(wert, decimal.Decimal) else decimal.Decimal(str(wert).strip()))
+
+    exponent = decimal.Decimal('.1') ** feld.decimal_places
+    kontext = decimal.getcontext().copy()
+    if feld.max_digits is not None:
+        kontext.prec = feld.max_digits
+    rundung = getattr(feld, 'rounding', None)
+
+    def konvertieren(wert):
+        if not isinstance(wert, decimal.Decimal):
+            wert = decimal.Decimal(str(wert).strip())
+        return '{:f}'.format(wert.quantize(exponent, rounding=rundung, context=kontext))
+    return konvertieren
+
+
+def _uuid_konverter(feld):
+    if feld.uuid_format == 'hex_verbose':
+        return str
+    if feld.uuid_format == 'hex':
+        return lambda wert: wert.hex
+    return feld.to_representation
+
+
+def _auswahl_konverter(feld):
+    werte = feld.choice_strings_to_values
+    return lambda wert: werte.get(str(wert), wert)
+
+
+def _pk_konverter(feld):
+    if feld.pk_field is not None:
+        raise NichtUnterstuetzt(feld.field_name)
+    return _identitaet
+
+
+def _modelfeld_konverter(feld):
+    if type(feld.model_field).value_to_string is not models.Field.value_to_string:
+        raise NichtUnterstuetzt(feld.field_name)
+    return lambda wert: wert if is_protected_type(wert) else str(wert)
+
+
+# Serializer-Feldklasse -> Fabrik für den vorkompilierten Konverter. Greift nur, wenn die
+# konkrete Feldklasse to_representation nicht selbst überschreibt.
+KONVERTER = (
+    (serializers.CharField, lambda feld: str),
+    (serializers.IntegerField, lambda feld: int),
+    (serializers.FloatField, lambda feld: float),
+    (serializers.BooleanField, lambda feld: feld.to_representation),
+    (serializers.ChoiceField, _auswahl_konverter),
+    (serializers.DateField, _datum_konverter),
+    (serializers.DateTimeField, lambda feld: feld.to_representation),
+    (serializers.DecimalField, _dezimal_konverter),
+    (serializers.UUIDField, _uuid_konverter),
+    (serializers.JSONField, lambda feld: feld.to_representation),
+    (serializers.ReadOnlyField, lambda feld: _identitaet),
+    (serializers.ModelField, _modelfeld_konverter),
+    (PrimaryKeyRelatedField, _pk_konverter),
+)
+
+
+def _konverter_fuer(feld):
+    for klasse, fabrik in KONVERTER:
+        if isinstance(feld, klasse) and type(feld).to_representation is klasse.to_representation:
+            return fabrik(feld)
+    raise NichtUnterstuetzt(feld.field_name)
+
+
+_leseplaene = {}
+
+
+def kompiliere_leseplan(serializer):
+    """
+    Übersetzt die lesbaren Felder eines ModelSerializers in einen Leseplan
+    [(ausgabe_name, values()-Schlüssel, konverter), ...]. Wirft NichtUnterstuetzt,
+    wenn ein Feld nicht ohne den Serializer dargestellt werden kann (Methoden-Felder,
+    verschachtelte Serializer, Dateien, abgeleitete Quellen ...).
+    """
+    serializer = getattr(serializer, 'child', serializer)
+    model = serializer.Meta.model
+    lesbar = [feld for feld in serializer.fields.values() if not feld.write_only]
+    schluessel = (type(serializer), tuple(feld.field_name for feld in lesbar))
+    if schluessel in _leseplaene:
+        plan = _leseplaene[schluessel]
+        if plan is None:
+            raise NichtUnterstuetzt(type(serializer).__name__)
+        return plan
+
+    spalten = {feld.name for feld in model._meta.concrete_fields}
+    try:
+        plan = []
+        for feld in lesbar:
+            if feld.source not in spalten:
+                raise NichtUnterstuetzt(feld.field_name)
+            plan.append((feld.field_name, feld.source, _konverter_fuer(feld)))
+    except NichtUnterstuetzt:
+        _leseplaene[schluessel] = None
+        raise
+    _leseplaene[schluessel] = plan
+    return plan
+
+
+def lese_zeilen(plan, zeilen):
+    """Baut die Antwort-Dicts aus values()-Zeilen, None wird wie im Serializer durchgereicht."""
+    return [
+        {
+            name: (None if zeile[quelle] is None else konvertieren(zeile[quelle]))
+            for name, quelle, konvertieren in plan
+        }
+        for zeile in zeilen
+    ]
+
+
+class SchnellLesenMixin:
+    """
+    Lesender Schnellpfad für list(): statt Model-Instanzen und Serializer-Feldern werden
+    die Zeilen per queryset.values() geladen und mit vorkompilierten Konvertern
+    dargestellt. Das JSON ist identisch zur Ausgabe des Serializers. Enthält der
+    Serializer Felder, die sich so nicht abbilden lassen, wird automatisch der normale
+    Weg genommen. Abschaltbar je ViewSet über schnell_lesen = False.
+    """
+    schnell_lesen = True
+
+    def list(self, request, *args, **kwargs):
+        return self.liste_antwort(self.filter_queryset(self.get_queryset()))
+
+    def liste_antwort(self, queryset):
+        plan = None
+        if self.schnell_lesen:
+            try:
+                plan = kompiliere_leseplan(self.get_serializer([], many=True))
+            except NichtUnterstuetzt:
+                plan = None
+
+        if plan is None:
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data)
+
+        # Sortierfelder der Keyset-Pagination werden für den Cursor mitgeladen
+        spalten = {quelle for _, quelle, _ in plan} | {'pk'}
+        spalten |= {feld.lstrip('-') for feld in getattr(self, 'keyset_ordering', ())}
+        # prefetch_related gilt nur für Instanzen, values()-Zeilen brauchen es nicht
+        zeilen = queryset.prefetch_related(None).values(*spalten)
+        page = self.paginate_queryset(zeilen)
+        if page is not None:
+            return self.get_paginated_response(lese_zeilen(plan, page))
+        return Response(lese_zeilen(plan, zeilen))
@@ -0,0 +1,110 @@
+import re
+import unicodedata
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Q
+
+# Felder, die in das Suchdokument eines Sterbefalls einfließen
+SUCH_FELDER = (
+    'auftragsnummer',
+    'auftraggeber_vorname',
+    'auftraggeber_nachname',
+    'auftraggeber_strasse',
+    'auftraggeber_plz',
+    'auftraggeber_stadt',
+    'verstorbener_vorname',
+    'verstorbener_nachname',
+    'verstorbener_geburtsname',
+    'verstorbener_strasse',
+    'verstorbener_plz',
+    'verstorbener_stadt',
+    'partner_vorname',
+    'partner_nachname',
+    'partner_geburtsname',
+)
+
+# Postgres-Textsuche-Konfiguration: 'simple' ohne Stemming, da Namen gesucht werden
+SUCH_KONFIGURATION = 'simple'
+
+UMLAUTE = str.maketrans({
+    'ä': 'ae',
+    'ö': 'oe',
+    'ü': 'ue',
+    'ß': 'ss',
+})
+
+
+def _ohne_akzente(text):
+    zerlegt = unicodedata.normalize('NFKD', text)
+    return ''.join(zeichen for zeichen in zerlegt if not unicodedata.combining(zeichen))
+
+
+def normalisiere(text):
+    """Kleinschreibung, Umlaute/ß ausschreiben und übrige Akzente entfernen."""
+    if text is None:
+        return ''
+    text = str(text).lower().translate(UMLAUTE)
+    return _ohne_akzente(text)
+
+
+def suchbegriffe(text):
+    return re.findall(r'\w+', normalisiere(text))
+
+
+def build_search_document(sterbefall):
+    """
+    Baut das normalisierte Suchdokument eines Sterbefalls.
+    Wörter mit Umlauten werden zusätzlich in der Form ohne Umlaut abgelegt,
+    damit "muller" ebenso wie "müller" und "mueller" den Fall findet.
+    """
+    woerter = []
+    for feld in SUCH_FELDER:
+        wert = getattr(sterbefall, feld, None)
+        if wert in (None, ''):
+            continue
+        for wort in str(wert).lower().split():
+            woerter.append(normalisiere(wort))
+            gefaltet = _ohne_akzente(wort).replace('ß', 'ss')
+            if gefaltet != woerter[-1]:
+                woerter.append(gefaltet)
+    return ' '.join(woerter)
+
+
+def suche_sterbefaelle(queryset, search_query):
+    """
+    Filtert und sortiert Sterbefälle nach Relevanz.
+
+    Jeder Suchbegriff wird als Präfix gesucht (Type-Ahead über den
+    tsvector-GIN-Index), zusätzlich greift ein Teilstring-Treffer über den
+    pg_trgm-Index, z.B. für Teile der Auftragsnummer.
+    """
+    begriffe = suchbegriffe(search_query)
+    if not begriffe:
+        # Nur Satzzeichen o.ä.: ungefiltert, aber in der gewohnten Reihenfolge der Liste
+        return queryset.order_by('-auftragsnummer')
+
+    query = SearchQuery(
+        ' & '.join(f'{begriff}:*' for begriff in begriffe),
+        config=SUCH_KONFIGURATION,
+        search_type='raw',
+    )
+    return queryset.filter(
+        Q(search_vector=query) | Q(search_document__contains=' '.join(begriffe))
+    ).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ).order_by('-rank', '-auftragsnummer')
+
+
+def aktualisiere_suchdokumente(queryset, batch_size=1000):
+    """Baut die Suchdokumente für bestehende Sterbefälle neu auf (z.B. nach Migration)."""
+    felder = ('uuid',) + SUCH_FELDER
+    model = queryset.model
+    batch = []
+    for sterbefall in queryset.only(*felder).iterator(chunk_size=batch_size):
+        sterbefall.search_document = build_search_document(sterbefall)
+        batch.append(sterbefall)
+        if len(batch) >= batch_size:
+            model.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, ['search_document'])
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Sterbefall
+from .statistik import STATISTIK_FELDER, aktualisiere_statistik, statistik_merkmale
+
+
+@receiver(pre_save, sender=Sterbefall)
+def sterbefall_statistik_vorher(sender, instance, raw=False, **kwargs):
+    # Aktueller Stand gesperrt aus der Datenbank (Sterbefall.save läuft in einer Transaktion),
+    # damit parallele Änderungen nacheinander nur ihre Differenz buchen
+    instance._statistik_alt = None if raw else instance.gesperrte_werte(*STATISTIK_FELDER)
+
+
+@receiver(post_save, sender=Sterbefall)
+def sterbefall_statistik_buchen(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    alt = instance._statistik_alt
+    # Nicht geschriebene Felder (update_fields, .only()) behalten den gesperrten Datenbankstand
+    neu = tuple(
+        instance.__dict__[feld]
+        if feld in instance.__dict__ and (alt is None or update_fields is None or feld in update_fields)
+        else (alt[index] if alt else None)
+        for index, feld in enumerate(STATISTIK_FELDER)
+    )
+    aktualisiere_statistik(alt, neu)
+
+
+@receiver(pre_delete, sender=Sterbefall)
+def sterbefall_statistik_loeschen_vorher(sender, instance, **kwargs):
+    # Der Collector löscht in einer Transaktion, die Zeile bleibt bis zum Commit gesperrt
+    instance._statistik_geloescht = instance.gesperrte_werte(*STATISTIK_FELDER)
+
+
+@receiver(post_delete, sender=Sterbefall)
+def sterbefall_statistik_ausbuchen(sender, instance, **kwargs):
+    alt = getattr(instance, '_statistik_geloescht', None) or statistik_merkmale(instance)
+    aktualisiere_statistik(alt, None)
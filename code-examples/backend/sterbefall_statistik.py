@@ -0,0 +1,176 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+NICHT_ANGEGEBEN = 'Nicht angegeben'
+
+# Dimension der Statistik -> Feld am Sterbefall
+DIMENSION_FELDER = (
+    ('geschlecht', 'verstorbener_geschlecht'),
+    ('konfession', 'verstorbener_konfession'),
+    ('bestattungsart', 'bestattungsart'),
+    ('todesart', 'sterbedaten_todesart'),
+)
+
+# Dimension -> Schlüssel der Verteilung in dashboard_data
+DASHBOARD_VERTEILUNGEN = (
+    ('geschlecht', 'gender_distribution'),
+    ('konfession', 'konfession_distribution'),
+    ('bestattungsart', 'burial_type_distribution'),
+)
+
+STATISTIK_FELDER = (
+    'sterbedaten_todeszeitpunkt',
+    'verstorbener_geburtsdatum',
+) + tuple(feld for _, feld in DIMENSION_FELDER)
+
+_UPSERT_SQL = """
+    INSERT INTO sterbefall_sterbefallstatistik
+        (jahr, monat, dimension, wert, anzahl, alter_summe, alter_anzahl)
+    VALUES {werte}
+    ON CONFLICT (jahr, monat, dimension, wert) DO UPDATE SET
+        anzahl = sterbefall_sterbefallstatistik.anzahl + EXCLUDED.anzahl,
+        alter_summe = sterbefall_sterbefallstatistik.alter_summe + EXCLUDED.alter_summe,
+        alter_anzahl = sterbefall_sterbefallstatistik.alter_anzahl + EXCLUDED.alter_anzahl
+"""
+
+
+def _bezeichnung(wert):
+    return (wert or NICHT_ANGEGEBEN).strip()
+
+
+def statistik_merkmale(sterbefall):
+    """
+    Die für die Statistik relevanten Werte eines Sterbefalls als Tupel.
+    None, wenn eines der Felder nicht geladen wurde (z.B. bei .only()).
+    """
+    geladen = sterbefall.__dict__
+    if any(feld not in geladen for feld in STATISTIK_FELDER):
+        return None
+    return tuple(geladen[feld] for feld in STATISTIK_FELDER)
+
+
+def _beitraege(merkmale):
+    """Zerlegt die Merkmale eines Falls in Buckets: {(jahr, monat, dimension, wert): (anzahl, alter_summe, alter_anzahl)}."""
+    if merkmale is None:
+        return {}
+    todeszeitpunkt, geburtsdatum = merkmale[0], merkmale[1]
+    jahr, monat = (todeszeitpunkt.year, todeszeitpunkt.month) if todeszeitpunkt else (0, 0)
+    if todeszeitpunkt and geburtsdatum:
+        alter = ((todeszeitpunkt - geburtsdatum).days // 365, 1)
+    else:
+        alter = (0, 0)
+
+    beitraege = {(jahr, monat, 'gesamt', ''): (1,) + alter}
+    for (dimension, _), wert in zip(DIMENSION_FELDER, merkmale[2:]):
+        beitraege[(jahr, monat, dimension, _bezeichnung(wert))] = (1,) + alter
+    return beitraege
+
+
+def _buchen(deltas):
+    zeilen = [schluessel + werte for schluessel, werte in deltas.items() if any(werte)]
+    if not zeilen:
+        return
+    sql = _UPSERT_SQL.format(werte=', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(zeilen)))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [wert for zeile in zeilen for wert in zeile])
+
+
+def aktualisiere_statistik(alt, neu):
+    """Bucht die Differenz zwischen altem und neuem Stand eines Sterbefalls (None = nicht vorhanden)."""
+    if alt == neu:
+        return
+    deltas = defaultdict(lambda: (0, 0, 0))
+    for schluessel, werte in _beitraege(neu).items():
+        deltas[schluessel] = tuple(a + b for a, b in zip(deltas[schluessel], werte))
+    for schluessel, werte in _beitraege(alt).items():
+        deltas[schluessel] = tuple(a - b for a, b in zip(deltas[schluessel], werte))
+    _buchen(deltas)
+
+
+def statistik_neu_aufbauen():
+    """Baut die Statistik des aktuellen Schemas komplett aus den Sterbefällen neu auf."""
+    from .models import Sterbefall, SterbefallStatistik
+
+    summen = defaultdict(lambda: (0, 0, 0))
+    for merkmale in Sterbefall.objects.values_list(*STATISTIK_FELDER).iterator(chunk_size=2000):
+        for schluessel, werte in _beitraege(merkmale).items():
+            summen[schluessel] = tuple(a + b for a, b in zip(summen[schluessel], werte))
+
+    with transaction.atomic():
+        SterbefallStatistik.objects.all().delete()
+        SterbefallStatistik.objects.bulk_create([
+            SterbefallStatistik(
+                jahr=jahr, monat=monat, dimension=dimension, wert=wert,
+                anzahl=anzahl, alter_summe=alter_summe, alter_anzahl=alter_anzahl,
+            )
+            for (jahr, monat, dimension, wert), (anzahl, alter_summe, alter_anzahl) in summen.items()
+        ], batch_size=1000)
+    return len(summen)
+
+
+def _leere_kennzahlen():
+    data = {'average_age': None}
+    data.update({schluessel: {} for _, schluessel in DASHBOARD_VERTEILUNGEN})
+    return data
+
+
+def dashboard_aus_statistik(year=None, pro_jahr=False):
+    """Liefert die Antwort von dashboard_data aus der Statistik, ohne Sterbefälle zu lesen."""
+    from .models import SterbefallStatistik
+
+    buckets = SterbefallStatistik.objects.filter(anzahl__gt=0)
+    if year:
+        buckets = buckets.filter(jahr=year)
+    zeilen = buckets.values('jahr', 'dimension', 'wert').annotate(
+        anzahl_summe=Sum('anzahl'),
+        alter_summe_summe=Sum('alter_summe'),
+        alter_anzahl_summe=Sum('alter_anzahl'),
+    ).order_by('jahr')
+
+    verteilungen = dict(DASHBOARD_VERTEILUNGEN)
+    gesamt = _leere_kennzahlen()
+    alter = defaultdict(lambda: [0, 0])
+    jahre = {}
+    for zeile in zeilen:
+        jahr = str(zeile['jahr']) if zeile['jahr'] else NICHT_ANGEGEBEN
+        if zeile['dimension'] == 'gesamt':
+            for schluessel in (None, jahr):
+                alter[schluessel][0] += zeile['alter_summe_summe']
+                alter[schluessel][1] += zeile['alter_anzahl_summe']
+        elif zeile['dimension'] in verteilungen:
+            for kennzahlen in (gesamt, jahre.setdefault(jahr, _leere_kennzahlen())):
+                verteilung = kennzahlen[verteilungen[zeile['dimension']]]
+                verteilung[zeile['wert']] = verteilung.get(zeile['wert'], 0) + zeile['anzahl_summe']
+
+    for schluessel, (summe, anzahl) in alter.items():
+        kennzahlen = gesamt if schluessel is None else jahre.setdefault(schluessel, _leere_kennzahlen())
+        if anzahl:
+            kennzahlen['average_age'] = summe / anzahl
+
+    if pro_jahr:
+        gesamt['per_year'] = dict(sorted(jahre.items()))
+    return gesamt
+
+
+def trend_aus_statistik(von_jahr=None, bis_jahr=None, dimension='gesamt'):
+    """Monatliche Fallzahlen und Durchschnittsalter für Trend-Charts."""
+    from .models import SterbefallStatistik
+
+    buckets = SterbefallStatistik.objects.filter(dimension=dimension, anzahl__gt=0).exclude(jahr=0)
+    if von_jahr:
+        buckets = buckets.filter(jahr__gte=von_jahr)
+    if bis_jahr:
+        buckets = buckets.filter(jahr__lte=bis_jahr)
+
+    return [
+        {
+            'jahr': bucket.jahr,
+            'monat': bucket.monat,
+            'wert': bucket.wert,
+            'anzahl': bucket.anzahl,
+            'average_age': bucket.alter_summe / bucket.alter_anzahl if bucket.alter_anzahl else None,
+        }
+        for bucket in buckets.order_by('jahr', 'monat', 'wert')
+    ]
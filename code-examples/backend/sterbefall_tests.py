@@ -0,0 +1,140 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from django.db import connection, transaction
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+from tenant_schemas.test.cases import TenantTestCase
+from tenant_schemas.utils import schema_context
+
+from .api_views import SterbefallViewSet
+from .dashboard import NICHT_ANGEGEBEN, dashboard_kennzahlen
+from .models import Nummernkreis, Sterbefall
+from .nummernkreis import LUECKENLOS, MIT_LUECKEN, _sequenz_name, naechste_nummer
+
+
+class DashboardKennzahlenTest(TenantTestCase):
+    """GROUPING SETS brauchen Postgres, daher gegen das Test-Schema des Tenants."""
+
+    def setUp(self):
+        Sterbefall.objects.create(
+            verstorbener_geschlecht='weiblich', verstorbener_konfession='ev.', bestattungsart='Urne',
+            verstorbener_geburtsdatum=date(1940, 1, 1), sterbedaten_todeszeitpunkt=date(2020, 6, 1),
+        )
+        Sterbefall.objects.create(
+            verstorbener_geschlecht='männlich', bestattungsart='Sarg',
+            verstorbener_geburtsdatum=date(1950, 1, 1), sterbedaten_todeszeitpunkt=date(2021, 6, 1),
+        )
+
+    def test_ohne_jahre(self):
+        kennzahlen = dashboard_kennzahlen(Sterbefall.objects.all())
+        self.assertEqual(kennzahlen['gender_distribution'], {'weiblich': 1, 'männlich': 1})
+        self.assertEqual(kennzahlen['konfession_distribution'], {'ev.': 1, NICHT_ANGEGEBEN: 1})
+        self.assertEqual(kennzahlen['burial_type_distribution'], {'Urne': 1, 'Sarg': 1})
+        self.assertEqual(kennzahlen['average_age'], 75.5)
+        self.assertNotIn('per_year', kennzahlen)
+
+    def test_pro_jahr(self):
+        kennzahlen = dashboard_kennzahlen(Sterbefall.objects.all(), pro_jahr=True)
+        self.assertEqual(kennzahlen['gender_distribution'], {'weiblich': 1, 'männlich': 1})
+        self.assertEqual(list(kennzahlen['per_year']), ['2020', '2021'])
+        self.assertEqual(kennzahlen['per_year']['2020']['burial_type_distribution'], {'Urne': 1})
+        self.assertEqual(kennzahlen['per_year']['2021']['average_age'], 71.0)
+
+    def test_gefiltert(self):
+        kennzahlen = dashboard_kennzahlen(Sterbefall.objects.filter(bestattungsart='Sarg'))
+        self.assertEqual(kennzahlen['gender_distribution'], {'männlich': 1})
+
+
+class NummernkreisTest(TenantTestCase):
+    """
+    Parallele Vergabe aus eigenen Verbindungen je Thread. Die Threads committen
+    (außerhalb der Test-Transaktion), aufgeräumt wird daher in tearDown.
+    """
+    THREADS = 8
+    ANZAHL = 25
+    SCHLUESSEL = ['test:parallel', 'test:parallel:' + 'x' * 80]
+
+    def _in_thread(self, funktion, *argumente):
+        schema = connection.schema_name
+
+        def arbeiter(argument):
+            try:
+                with schema_context(schema):
+                    return funktion(argument)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            return list(pool.map(arbeiter, argumente))
+
+    def _parallel(self, schluessel, modus):
+        def vergeben(_):
+            nummern = []
+            for _ in range(self.ANZAHL):
+                with transaction.atomic():
+                    nummern.append(naechste_nummer(schluessel, modus=modus))
+            return nummern
+
+        return [nummer for nummern in self._in_thread(vergeben, *range(self.THREADS)) for nummer in nummern]
+
+    def tearDown(self):
+        def aufraeumen(_):
+            Nummernkreis.objects.filter(schluessel__in=self.SCHLUESSEL).delete()
+            with connection.cursor() as cursor:
+                for schluessel in self.SCHLUESSEL:
+                    cursor.execute(f'DROP SEQUENCE IF EXISTS "{_sequenz_name(schluessel, 0)}"')
+
+        self._in_thread(aufraeumen, None)
+
+    def test_lueckenlos_parallel(self):
+        nummern = self._parallel(self.SCHLUESSEL[0], LUECKENLOS)
+        self.assertEqual(sorted(nummern), list(range(1, self.THREADS * self.ANZAHL + 1)))
+
+    def test_mit_luecken_parallel(self):
+        for schluessel in self.SCHLUESSEL:
+            nummern = self._parallel(schluessel, MIT_LUECKEN)
+            self.assertEqual(len(set(nummern)), self.THREADS * self.ANZAHL)
+
+    def test_sequenz_namen_eindeutig(self):
+        schluessel = ['auftrag', 'rechnung:R-1', 'rechnung:R_1', 'rechnung_r_1', 'a' * 80, 'a' * 80 + 'b']
+        namen = {_sequenz_name(einzeln, 24) for einzeln in schluessel}
+        self.assertEqual(len(namen), len(schluessel))
+        self.assertTrue(all(len(name) <= 63 for name in namen))
+        self.assertEqual(_sequenz_name('auftrag', 24), 'nummernkreis_auftrag_24')
+
+    @override_settings(AUFTRAGSNUMMER_MODUS=LUECKENLOS)
+    def test_bestand_ab_tausend(self):
+        jahr = datetime.now().year % 100
+        Sterbefall.objects.create(auftragsnummer=int(f'{jahr}1234'))
+        self.assertEqual(Sterbefall.objects.create().auftragsnummer, int(f'{jahr}1235'))
+
+
+def liste_json(viewset, schnell, parameter=None, **kwargs):
+    """JSON der list()-Antwort mit bzw. ohne values()-Schnellpfad."""
+    view = viewset.as_view({'get': 'list'}, schnell_lesen=schnell)
+    antwort = view(APIRequestFactory().get('/', parameter or {}), **kwargs)
+    antwort.render()
+    return json.loads(antwort.content)
+
+
+class SchnellLesenTest(TenantTestCase):
+    """Der Schnellpfad muss exakt das JSON des Serializers liefern."""
+
+    def setUp(self):
+        Sterbefall.objects.create(
+            verstorbener_vorname='Anna', verstorbener_nachname='Muster', verstorbener_geschlecht='weiblich',
+            verstorbener_geburtsdatum=date(1940, 1, 1), sterbedaten_todeszeitpunkt=date(2020, 6, 1),
+        )
+        Sterbefall.objects.create(auftraggeber_nachname='Beispiel')
+
+    def test_projektionen(self):
+        for parameter in ({}, {'projection': 'full'}, {'fields': 'uuid,auftragsnummer,verstorbener_geburtsdatum'},
+                          {'pagination': 'cursor'}):
+            with self.subTest(parameter=parameter):
+                self.assertEqual(
+                    liste_json(SterbefallViewSet, True, parameter),
+                    liste_json(SterbefallViewSet, False, parameter),
+                )
+
@@ -0,0 +1,235 @@
+import json
+import select
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .batch import fehlertext, zeitbegrenzt_ausfuehren
+from .models import HintergrundAufgabe
+
+# NOTIFY-Kanal, über den neue Aufgaben wartende Worker wecken
+KANAL = 'aufgaben'
+STANDARD_TIMEOUT = getattr(settings, 'AUFGABE_TIMEOUT', 600)
+STANDARD_MAX_VERSUCHE = getattr(settings, 'AUFGABE_MAX_VERSUCHE', 3)
+# Wartezeit vor dem n-ten Wiederholungsversuch: BACKOFF_BASIS * 2^(n-1), höchstens BACKOFF_MAX (Sekunden)
+BACKOFF_BASIS = 10
+BACKOFF_MAX = 1800
+# LAUFENDE Aufgaben gelten nach 2 * timeout + KULANZ Sekunden als verwaist (Worker abgestürzt)
+KULANZ = 60
+
+Aufgabe = namedtuple('Aufgabe', 'name funktion timeout max_versuche beschreibung')
+Abgeholt = namedtuple('Abgeholt', 'id schema name parameter versuche max_versuche timeout prioritaet')
+Ergebnis = namedtuple('Ergebnis', 'id status ergebnis fehler ausfuehren_ab')
+
+AUFGABEN = {}
+
+
+def aufgabe(name=None, timeout=STANDARD_TIMEOUT, max_versuche=STANDARD_MAX_VERSUCHE):
+    """
+    Registriert eine Funktion als Hintergrundaufgabe (in aufgaben.py der App):
+
+        @aufgabe('rechnung_kopieren', timeout=120)
+        def rechnung_kopieren(rechnung_id):
+            ...
+
+    Die Funktion läuft im Schema, für das sie eingereiht wurde, und bekommt die
+    Parameter als Keyword-Argumente. Parameter und Rückgabewert müssen als JSON
+    darstellbar sein.
+    """
+    def registrieren(funktion):
+        aufgabe_name = name or funktion.__name__
+        AUFGABEN[aufgabe_name] = Aufgabe(
+            aufgabe_name, funktion, timeout, max_versuche, (funktion.__doc__ or '').strip(),
+        )
+        return funktion
+    return registrieren
+
+
+def aufgaben_laden():
+    autodiscover_modules('aufgaben')
+    return AUFGABEN
+
+
+@aufgabe('leer', timeout=60)
+def leer(**parameter):
+    """Tut nichts (Messung des Durchsatzes der Warteschlange)."""
+    return None
+
+
+def _json(wert):
+    return json.loads(json.dumps(wert, cls=DjangoJSONEncoder))
+
+
+def einreihen(name, parameter=None, schema=None, prioritaet=0, dedup_schluessel=None,
+              ausfuehren_ab=None, verzoegerung=None, max_versuche=None, timeout=None):
+    """
+    Reiht eine Aufgabe für das aktuelle (bzw. angegebene) Tenant-Schema ein und liefert
+    die HintergrundAufgabe. Ausgeführt wird frühestens ab ausfuehren_ab bzw. nach
+    verzoegerung Sekunden. Mit dedup_schluessel kommt eine noch wartende oder laufende
+    Aufgabe mit demselben Schlüssel zurück, statt eine zweite anzulegen.
+    """
+    registriert = aufgaben_laden()[name]
+    if ausfuehren_ab is None:
+        ausfuehren_ab = timezone.now() + timedelta(seconds=verzoegerung or 0)
+    neu = HintergrundAufgabe(
+        schema_name=schema or connection.schema_name,
+        name=name,
+        parameter=_json(parameter or {}),
+        prioritaet=prioritaet,
+        dedup_schluessel=dedup_schluessel,
+        ausfuehren_ab=ausfuehren_ab,
+        max_versuche=max_versuche or registriert.max_versuche,
+        timeout=timeout or registriert.timeout,
+    )
+    try:
+        with transaction.atomic():
+            neu.save()
+    except IntegrityError:
+        # Partieller Unique-Index auf (schema_name, dedup_schluessel) aktiver Aufgaben
+        vorhanden = HintergrundAufgabe.objects.filter(
+            schema_name=neu.schema_name, dedup_schluessel=dedup_schluessel, status__in=HintergrundAufgabe.AKTIV,
+        ).first()
+        if vorhanden is not None:
+            return vorhanden
+        with transaction.atomic():  # inzwischen beendet: neu anlegen
+            neu.save()
+    transaction.on_commit(_wecken)
+    return neu
+
+
+def _wecken():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [KANAL, ''])
+
+
+def abholen(worker, anzahl=1):
+    """
+    Übernimmt bis zu anzahl fällige Aufgaben (Priorität, dann Fälligkeit) für worker.
+    SKIP LOCKED: parallele Worker überspringen gegenseitig gesperrte Zeilen, statt zu warten.
+    """
+    tabelle = connection.ops.quote_name(HintergrundAufgabe._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {tabelle}
+            SET status = %s, versuche = versuche + 1, gestartet_am = now(), worker = %s
+            WHERE id IN (
+                SELECT id FROM {tabelle}
+                WHERE status = %s AND ausfuehren_ab <= now()
+                ORDER BY prioritaet DESC, ausfuehren_ab, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, schema_name, name, parameter, versuche, max_versuche, timeout, prioritaet
+        """, [HintergrundAufgabe.LAEUFT, worker, HintergrundAufgabe.WARTEND, anzahl])
+        zeilen = cursor.fetchall()
+    abgeholt = [
+        Abgeholt(*zeile[:3], json.loads(zeile[3]) if isinstance(zeile[3], str) else zeile[3], *zeile[4:])
+        for zeile in zeilen
+    ]
+    return sorted(abgeholt, key=lambda einzel: (-einzel.prioritaet, einzel.id))
+
+
+def freigeben(ids):
+    """Gibt übernommene, nicht begonnene Aufgaben zurück (z.B. beim Beenden eines Workers)."""
+    if ids:
+        HintergrundAufgabe.objects.filter(pk__in=ids, status=HintergrundAufgabe.LAEUFT).update(
+            status=HintergrundAufgabe.WARTEND, versuche=F('versuche') - 1, worker='',
+        )
+
+
+def verwaiste_freigeben():
+    """Aufgaben abgestürzter Worker wieder einplanen bzw. nach dem letzten Versuch als fehlgeschlagen markieren."""
+    tabelle = connection.ops.quote_name(HintergrundAufgabe._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {tabelle}
+            SET status = CASE WHEN versuche < max_versuche THEN %s ELSE %s END,
+                beendet_am = CASE WHEN versuche < max_versuche THEN NULL ELSE now() END,
+                fehler = 'Worker abgebrochen', worker = ''
+            WHERE status = %s AND gestartet_am < now() - (2 * timeout + %s) * interval '1 second'
+        """, [HintergrundAufgabe.WARTEND, HintergrundAufgabe.FEHLGESCHLAGEN, HintergrundAufgabe.LAEUFT, KULANZ])
+        return cursor.rowcount
+
+
+def ausfuehren(einzel):
+    """Führt eine abgeholte Aufgabe in ihrem Schema aus und liefert das Ergebnis zum Speichern."""
+    registriert = AUFGABEN.get(einzel.name)
+    if registriert is None:
+        return Ergebnis(einzel.id, HintergrundAufgabe.FEHLGESCHLAGEN, None, f'Unbekannte Aufgabe {einzel.name}', None)
+    try:
+        wert, _ = zeitbegrenzt_ausfuehren(registriert.funktion, einzel.schema, einzel.timeout, einzel.parameter)
+        return Ergebnis(einzel.id, HintergrundAufgabe.ERLEDIGT, _json(wert), '', None)
+    except Exception as fehler:
+        if einzel.versuche < einzel.max_versuche:
+            warten = min(BACKOFF_BASIS * 2 ** (einzel.versuche - 1), BACKOFF_MAX)
+            return Ergebnis(einzel.id, HintergrundAufgabe.WARTEND, None, fehlertext(fehler),
+                            timezone.now() + timedelta(seconds=warten))
+        return Ergebnis(einzel.id, HintergrundAufgabe.FEHLGESCHLAGEN, None, fehlertext(fehler), None)
+
+
+def ergebnisse_speichern(ergebnisse):
+    """Schreibt Ergebnisse mit höchstens zwei bulk_updates."""
+    jetzt = timezone.now()
+    beendet, wiederholen = [], []
+    for ergebnis in ergebnisse:
+        eintrag = HintergrundAufgabe(pk=ergebnis.id, status=ergebnis.status, ergebnis=ergebnis.ergebnis,
+                                      fehler=ergebnis.fehler, worker='')
+        if ergebnis.status == HintergrundAufgabe.WARTEND:
+            eintrag.ausfuehren_ab = ergebnis.ausfuehren_ab
+            wiederholen.append(eintrag)
+        else:
+            eintrag.beendet_am = jetzt
+            beendet.append(eintrag)
+    if beendet:
+        HintergrundAufgabe.objects.bulk_update(beendet, ['status', 'ergebnis', 'fehler', 'worker', 'beendet_am'])
+    if wiederholen:
+        HintergrundAufgabe.objects.bulk_update(wiederholen, ['status', 'fehler', 'worker', 'ausfuehren_ab'])
+
+
+def _warten(sekunden):
+    """Schläft bis zu einer Benachrichtigung auf KANAL, höchstens sekunden."""
+    with connection.cursor() as cursor:
+        # Nach einem Abbruch ist die Verbindung neu, LISTEN daher vor jedem Warten
+        cursor.execute(f'LISTEN {KANAL}')
+    pg = connection.connection
+    if not pg.notifies and select.select([pg], [], [], sekunden)[0]:
+        pg.poll()
+    del pg.notifies[:]
+
+
+def worker_schleife(name, batch=10, leerlauf=5, stoppen=lambda: False, bis_leer=False):
+    """
+    Holt und bearbeitet Aufgaben, bis stoppen() wahr ist (bzw. mit bis_leer, bis
+    nichts mehr fällig ist). Liefert die Anzahl bearbeiteter Aufgaben.
+    """
+    aufgaben_laden()
+    bearbeitet = 0
+    naechste_pruefung = 0
+    while not stoppen():
+        if time.monotonic() >= naechste_pruefung:
+            verwaiste_freigeben()
+            naechste_pruefung = time.monotonic() + 60
+        abgeholt = abholen(name, batch)
+        if not abgeholt:
+            if bis_leer:
+                break
+            _warten(leerlauf)
+            continue
+        abgeholt_um = time.monotonic()
+        for index, einzel in enumerate(abgeholt):
+            # Nicht begonnene Aufgaben zurückgeben, bevor sie als verwaist gelten könnten
+            if stoppen() or (index and time.monotonic() - abgeholt_um > einzel.timeout):
+                freigeben([rest.id for rest in abgeholt[index:]])
+                break
+            # Sofort speichern: das Ergebnis ist ohne Warten auf den Rest des Batches sichtbar,
+            # und ein Absturz des Workers wiederholt keine bereits erledigten Aufgaben
+            ergebnisse_speichern([ausfuehren(einzel)])
+            bearbeitet += 1
+    return bearbeitet
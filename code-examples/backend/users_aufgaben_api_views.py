@@ -0,0 +1,29 @@
+from django.db import connection
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import HintergrundAufgabe
+
+
+class AufgabeStatusView(APIView):
+    """Status und Ergebnis einer Hintergrundaufgabe des eigenen Tenants (zum Pollen)."""
+
+    def get_object(self, pk):
+        return get_object_or_404(HintergrundAufgabe, pk=pk, schema_name=connection.schema_name)
+
+    def get(self, request, pk, format=None):
+        return Response(self.get_object(pk).als_dict())
+
+    def delete(self, request, pk, format=None):
+        """Bricht eine noch wartende Aufgabe ab; laufende laufen zu Ende."""
+        aufgabe = self.get_object(pk)
+        abgebrochen = HintergrundAufgabe.objects.filter(pk=aufgabe.pk, status=HintergrundAufgabe.WARTEND).update(
+            status=HintergrundAufgabe.ABGEBROCHEN, beendet_am=timezone.now(),
+        )
+        if not abgebrochen:
+            return Response({'error': 'Aufgabe wartet nicht mehr.'}, status=status.HTTP_409_CONFLICT)
+        aufgabe.refresh_from_db()
+        return Response(aufgabe.als_dict())
@@ -0,0 +1,140 @@
+import copy
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from sterbefall.cache import ProzessCache
+
+# Lebensdauer der Zuordnung Token (jti) -> Benutzer/Firma in Sekunden, höchstens bis zum Ablauf des Tokens
+TOKEN_CACHE_TTL = getattr(settings, 'JWT_TOKEN_CACHE_TTL', 60)
+TOKEN_CACHE_GROESSE = getattr(settings, 'JWT_TOKEN_CACHE_GROESSE', 1024)
+
+Anmeldung = namedtuple('Anmeldung', 'user token')
+
+
+def _kopie(eintrag):
+    # Kopie des Benutzers je Request, damit Änderungen an request.user nicht in andere Requests wandern
+    user, marke = eintrag
+    return copy.copy(user), marke
+
+
+_benutzer = ProzessCache(TOKEN_CACHE_GROESSE, ttl=TOKEN_CACHE_TTL, kopie=_kopie)  # jti -> (user, marke)
+_jwt = JWTAuthentication()
+
+
+def _marken_key(user_id):
+    return f'benutzer:{user_id}:marke'
+
+
+def _aus_cache(jti):
+    eintrag = _benutzer.get(jti)
+    if eintrag is None:
+        return None
+    user, marke = eintrag
+    # Ein anderer Prozess hat den Benutzer geändert (gemeinsamer Cache, ein get statt der Benutzerabfrage)
+    if cache.get(_marken_key(user.pk)) != marke:
+        _benutzer.pop(jti)
+        return None
+    return user
+
+
+def _in_cache(jti, token, user, marke):
+    ttl = TOKEN_CACHE_TTL
+    ablauf = token.get('exp')
+    if ablauf:
+        ttl = min(ttl, ablauf - time.time())
+    _benutzer.set(jti, (user, marke), ttl=ttl)
+
+
+def _marken_setzen(user_ids):
+    # Einträge leben lokal höchstens TOKEN_CACHE_TTL, so lange muss auch die Marke halten
+    marke = time.time_ns()
+    cache.set_many({_marken_key(user_id): marke for user_id in user_ids}, timeout=TOKEN_CACHE_TTL + 60)
+
+
+def benutzer_vergessen(*user_ids):
+    """
+    Verwirft die gecachten Tokens der Benutzer (z.B. nach Deaktivierung): hier sofort,
+    in allen Prozessen über eine neue Marke im gemeinsamen Cache. Nach dem Commit wird
+    die Marke noch einmal gesetzt, damit zwischenzeitlich gelesene alte Stände verfallen.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    _benutzer.entfernen(lambda eintrag: eintrag[0].pk in user_ids)
+    _marken_setzen(user_ids)
+    transaction.on_commit(lambda: _marken_setzen(user_ids))
+
+
+def benutzer_laden(token):
+    """
+    Benutzer samt Firma zum validierten Token, wie JWTAuthentication.get_user,
+    aber mit select_related und über den jti gecacht.
+    """
+    jti = token.get(api_settings.JTI_CLAIM)
+    if jti:
+        user = _aus_cache(jti)
+        if user is not None:
+            return user
+    try:
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_('Token contained no recognizable user identification'))
+    # Marke vor der Abfrage lesen: eine Änderung währenddessen macht den Eintrag sofort ungültig
+    marke = cache.get(_marken_key(user_id)) if jti else None
+    try:
+        user = get_user_model().objects.select_related('company').get(**{api_settings.USER_ID_FIELD: user_id})
+    except get_user_model().DoesNotExist:
+        raise AuthenticationFailed(_('User not found'), code='user_not_found')
+    if not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    if jti:
+        _in_cache(jti, token, user, marke)
+    return user
+
+
+def _authentifizieren(request):
+    header = _jwt.get_header(request)
+    if header is None:
+        return None
+    raw_token = _jwt.get_raw_token(header)
+    if raw_token is None:
+        return None
+    token = _jwt.get_validated_token(raw_token)
+    return Anmeldung(benutzer_laden(token), token)
+
+
+def anmeldung(request):
+    """
+    Ergebnis der JWT-Authentifizierung, einmal je Request berechnet und am
+    HttpRequest abgelegt: TenantMiddleware und JWTAnmeldung (DRF) teilen sich
+    Signaturprüfung und Benutzerabfrage. Liefert None ohne Token; ein ungültiges
+    Token löst bei jedem Aufruf dieselbe Exception aus.
+    """
+    request = getattr(request, '_request', request)  # DRF-Request -> HttpRequest
+    if not hasattr(request, '_jwt_anmeldung'):
+        try:
+            request._jwt_anmeldung = _authentifizieren(request)
+        except (InvalidToken, AuthenticationFailed) as fehler:
+            request._jwt_anmeldung = fehler
+    if isinstance(request._jwt_anmeldung, Exception):
+        raise request._jwt_anmeldung
+    return request._jwt_anmeldung
+
+
+class JWTAnmeldung(JWTAuthentication):
+    """DRF-Authentifizierung, die das Ergebnis der TenantMiddleware wiederverwendet."""
+
+    def authenticate(self, request):
+        ergebnis = anmeldung(request)
+        if ergebnis is None:
+            return None
+        return ergebnis.user, ergebnis.token
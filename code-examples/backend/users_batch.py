@@ -0,0 +1,175 @@
+import signal
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import connection, connections
+from django.utils.module_loading import autodiscover_modules
+from tenant_schemas.utils import get_public_schema_name, get_tenant_model, schema_context
+
+# Standardwerte je Job, überschreibbar beim Registrieren und beim Aufruf
+STANDARD_TIMEOUT = getattr(settings, 'TENANT_JOB_TIMEOUT', 600)
+STANDARD_RETRIES = getattr(settings, 'TENANT_JOB_RETRIES', 1)
+STANDARD_WORKER = getattr(settings, 'TENANT_JOB_WORKER', 4)
+RETRY_PAUSE = 2.0
+
+TenantJob = namedtuple('TenantJob', 'name funktion timeout retries beschreibung')
+TenantErgebnis = namedtuple('TenantErgebnis', 'schema ok wert fehler versuche dauer')
+
+JOBS = {}
+
+
+class Zeitueberschreitung(Exception):
+    """Ein Job hat das Zeitlimit für einen Tenant überschritten."""
+
+
+def tenant_job(name=None, timeout=STANDARD_TIMEOUT, retries=STANDARD_RETRIES):
+    """
+    Registriert eine Funktion als Job, der in jedem Tenant-Schema läuft:
+
+        @tenant_job('rechnungen_ueberfaellig', timeout=120)
+        def rechnungen_ueberfaellig():
+            ...
+
+    Die Funktion wird ohne Argumente (bzw. mit den Job-Parametern) innerhalb von
+    schema_context aufgerufen; ihr Rückgabewert landet in der Zusammenfassung und
+    muss picklebar sein. Jobs liegen in jobs.py der jeweiligen App.
+    """
+    def registrieren(funktion):
+        job_name = name or funktion.__name__
+        JOBS[job_name] = TenantJob(job_name, funktion, timeout, retries, (funktion.__doc__ or '').strip())
+        return funktion
+    return registrieren
+
+
+def jobs_laden():
+    autodiscover_modules('jobs')
+    return JOBS
+
+
+def tenant_schemas(nur=None):
+    """Schemas aller Tenants (ohne public), optional eingeschränkt auf nur."""
+    schemas = get_tenant_model().objects.exclude(
+        schema_name=get_public_schema_name()
+    ).order_by('schema_name').values_list('schema_name', flat=True)
+    if nur:
+        schemas = schemas.filter(schema_name__in=nur)
+    return list(schemas)
+
+
+def _zeit_abgelaufen(signum, frame):
+    raise Zeitueberschreitung()
+
+
+def _worker_start():
+    import django
+    django.setup()
+    jobs_laden()
+
+
+def _im_schema_ausfuehren(job_name, schema, timeout, parameter):
+    """Läuft im Worker-Prozess; jeder Worker hält genau eine DB-Verbindung offen."""
+    return zeitbegrenzt_ausfuehren(JOBS[job_name].funktion, schema, timeout, parameter)
+
+
+def zeitbegrenzt_ausfuehren(funktion, schema, timeout, parameter):
+    """
+    Ruft funktion(**parameter) in schema_context auf, begrenzt auf timeout Sekunden
+    (SIGALRM und statement_timeout, nur im Hauptthread). Liefert (wert, dauer).
+    """
+    start = time.monotonic()
+    alter_handler = signal.signal(signal.SIGALRM, _zeit_abgelaufen)
+    try:
+        with schema_context(schema):
+            with connection.cursor() as cursor:
+                # Begrenzt auch einzelne lange Abfragen, die der Alarm nicht unterbrechen kann
+                cursor.execute('SET statement_timeout = %s', [int(timeout * 1000)])
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+            try:
+                wert = funktion(**parameter)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                with connection.cursor() as cursor:
+                    cursor.execute('RESET statement_timeout')
+    except BaseException:
+        # Verbindung nach Abbruch nicht weiterverwenden, der nächste Tenant öffnet eine neue
+        connection.close()
+        raise
+    finally:
+        signal.signal(signal.SIGALRM, alter_handler)
+    return wert, time.monotonic() - start
+
+
+def fehlertext(fehler):
+    if isinstance(fehler, Zeitueberschreitung):
+        return 'Zeitüberschreitung'
+    return f'{type(fehler).__name__}: {fehler}'
+
+
+def job_ausfuehren(job_name, schemas=None, worker=STANDARD_WORKER, timeout=None, retries=None,
+                   parameter=None, fortschritt=None):
+    """
+    Führt einen registrierten Job für alle (bzw. die angegebenen) Tenants auf einem
+    Prozess-Pool mit höchstens worker Prozessen aus. Fehlgeschlagene Tenants werden
+    bis zu retries Mal erneut eingeplant. fortschritt(ergebnis, erledigt, gesamt) wird
+    nach jedem abgeschlossenen Tenant aufgerufen. Liefert eine Liste von TenantErgebnis.
+    """
+    jobs_laden()
+    if job_name not in JOBS:
+        raise KeyError(job_name)
+    job = JOBS[job_name]
+    timeout = timeout or job.timeout
+    retries = job.retries if retries is None else retries
+    parameter = parameter or {}
+    schemas = schemas if schemas is not None else tenant_schemas()
+    if not schemas:
+        return []
+    worker = max(1, min(worker, len(schemas)))
+
+    # Geerbte Verbindungen schließen, damit kein Worker die Verbindung des Elternprozesses teilt
+    connections.close_all()
+
+    ergebnisse = []
+    versuche = {schema: 0 for schema in schemas}
+    with ProcessPoolExecutor(max_workers=worker, initializer=_worker_start) as pool:
+        laufend = {}
+
+        def einplanen(schema):
+            versuche[schema] += 1
+            laufend[pool.submit(_im_schema_ausfuehren, job_name, schema, timeout, parameter)] = schema
+
+        for schema in schemas:
+            einplanen(schema)
+
+        while laufend:
+            fertig, _ = wait(laufend, return_when=FIRST_COMPLETED)
+            for future in fertig:
+                schema = laufend.pop(future)
+                try:
+                    wert, dauer = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as fehler:
+                    if versuche[schema] <= retries:
+                        time.sleep(RETRY_PAUSE)
+                        einplanen(schema)
+                        continue
+                    ergebnis = TenantErgebnis(schema, False, None, fehlertext(fehler), versuche[schema], None)
+                else:
+                    ergebnis = TenantErgebnis(schema, True, wert, None, versuche[schema], dauer)
+                ergebnisse.append(ergebnis)
+                if fortschritt:
+                    fortschritt(ergebnis, len(ergebnisse), len(schemas))
+    return ergebnisse
+
+
+def zusammenfassung(ergebnisse):
+    fehler = [ergebnis for ergebnis in ergebnisse if not ergebnis.ok]
+    return {
+        'tenants': len(ergebnisse),
+        'erfolgreich': len(ergebnisse) - len(fehler),
+        'fehlgeschlagen': {ergebnis.schema: ergebnis.fehler for ergebnis in fehler},
+        'wiederholt': sum(1 for ergebnis in ergebnisse if ergebnis.versuche > 1),
+    }
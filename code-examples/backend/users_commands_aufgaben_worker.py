@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+import signal
+import socket
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from users.aufgaben import worker_schleife
+
+
+def _prozess(batch, leerlauf):
+    beenden = []
+
+    def stoppen(signum, frame):
+        beenden.append(signum)
+
+    # Laufende Aufgabe zu Ende bringen, übernommene, nicht begonnene zurückgeben
+    signal.signal(signal.SIGTERM, stoppen)
+    signal.signal(signal.SIGINT, stoppen)
+    try:
+        worker_schleife(f'{socket.gethostname()}:{os.getpid()}', batch=batch, leerlauf=leerlauf,
+                        stoppen=lambda: bool(beenden))
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Startet Worker-Prozesse für die Aufgaben-Warteschlange (HintergrundAufgabe) aller Tenants.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--worker', type=int, default=os.cpu_count() or 2, help='Anzahl Worker-Prozesse')
+        parser.add_argument('--batch', type=int, default=10,
+                            help='Aufgaben, die ein Worker auf einmal übernimmt (1 für lange Aufgaben)')
+        parser.add_argument('--leerlauf', type=float, default=5,
+                            help='Sekunden zwischen zwei Abfragen, wenn keine Benachrichtigung kommt')
+
+    def handle(self, *args, **options):
+        # Keine Verbindung an die Kinder vererben, jeder Worker öffnet seine eigene
+        connections.close_all()
+        kontext = multiprocessing.get_context('fork')
+        prozesse = [
+            kontext.Process(target=_prozess, args=(options['batch'], options['leerlauf']), daemon=False)
+            for _ in range(options['worker'])
+        ]
+        for prozess in prozesse:
+            prozess.start()
+
+        def weiterleiten(signum, frame):
+            for prozess in prozesse:
+                if prozess.is_alive():
+                    os.kill(prozess.pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, weiterleiten)
+        signal.signal(signal.SIGINT, weiterleiten)
+        self.stdout.write(f"{len(prozesse)} Worker gestartet (batch={options['batch']}).")
+        for prozess in prozesse:
+            prozess.join()
@@ -0,0 +1,47 @@
+import multiprocessing
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from tenant_schemas.utils import schema_context
+
+from users.aufgaben import einreihen, worker_schleife
+from users.models import HintergrundAufgabe
+
+
+def _abarbeiten(nummer, batch):
+    try:
+        return worker_schleife(f'benchmark-{nummer}', batch=batch, bis_leer=True)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Misst den Durchsatz der Aufgaben-Warteschlange (Einreihen und Abarbeiten leerer Aufgaben).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema', help='Schema des Tenants, für das eingereiht wird')
+        parser.add_argument('--anzahl', type=int, default=10000)
+        parser.add_argument('--worker', type=int, default=os.cpu_count() or 2)
+        parser.add_argument('--batch', type=int, default=10)
+
+    def handle(self, *args, **options):
+        anzahl = options['anzahl']
+        with schema_context(options['schema']):
+            start = time.perf_counter()
+            ids = [einreihen('leer', {'nummer': nummer}).pk for nummer in range(anzahl)]
+            einreihen_dauer = time.perf_counter() - start
+        self.stdout.write(f'Einreihen:   {anzahl} Aufgaben in {einreihen_dauer:.2f}s '
+                          f'({anzahl / einreihen_dauer * 60:.0f}/min)')
+
+        connections.close_all()
+        start = time.perf_counter()
+        with multiprocessing.get_context('fork').Pool(options['worker']) as pool:
+            bearbeitet = sum(pool.starmap(_abarbeiten, [(nummer, options['batch']) for nummer in range(options['worker'])]))
+        dauer = time.perf_counter() - start
+
+        erledigt = HintergrundAufgabe.objects.filter(pk__in=ids, status=HintergrundAufgabe.ERLEDIGT).count()
+        self.stdout.write(f'Abarbeiten:  {bearbeitet} Aufgaben in {dauer:.2f}s mit {options["worker"]} Workern '
+                          f'({bearbeitet / dauer * 60:.0f}/min), davon {erledigt} von {anzahl} erledigt')
+        HintergrundAufgabe.objects.filter(pk__in=ids).delete()
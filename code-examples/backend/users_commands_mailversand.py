@@ -0,0 +1,32 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from users.mailversand import worker
+
+
+class Command(BaseCommand):
+    help = 'Versand-Worker für eingereihte E-Mails (EmailLog mit Status WARTEND) aller Tenants.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', action='append', dest='schemas', help='Nur dieses Schema (mehrfach möglich)')
+        parser.add_argument('--intervall', type=int, default=30,
+                            help='Sekunden zwischen zwei Rundgängen über alle Tenants (Wiederholungen)')
+        parser.add_argument('--einmal', action='store_true', help='Alle fälligen Mails einmal versenden und beenden')
+
+    def handle(self, *args, **options):
+        beenden = []
+
+        def stoppen(signum, frame):
+            beenden.append(signum)
+
+        # SIGTERM (z.B. docker stop): laufenden Batch abschließen, dann beenden
+        signal.signal(signal.SIGTERM, stoppen)
+        signal.signal(signal.SIGINT, stoppen)
+        zaehler = worker(
+            schemas=options['schemas'], intervall=options['intervall'],
+            einmal=options['einmal'], stoppen=lambda: bool(beenden),
+        )
+        self.stdout.write(
+            f"SMTP-Verbindungen aufgebaut: {zaehler['verbindungen']}, wiederverwendet: {zaehler['wiederverwendet']}"
+        )
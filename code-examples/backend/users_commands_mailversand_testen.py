@@ -0,0 +1,69 @@
+import time
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand, CommandError
+
+from users.mailversand import SmtpKonfiguration, SmtpPool
+
+
+class Command(BaseCommand):
+    help = (
+        'Versendet Testmails an einen lokalen SMTP-Ersatzserver (aiosmtpd) und vergleicht '
+        'eine Verbindung je Mail mit dem Verbindungs-Pool des Mailversands.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--anzahl', type=int, default=200)
+        parser.add_argument('--port', type=int, default=8025)
+
+    def handle(self, *args, **options):
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError:
+            raise CommandError('aiosmtpd ist nicht installiert (pip install aiosmtpd).')
+
+        class Zaehler:
+            def __init__(self):
+                self.empfangen = 0
+
+            async def handle_DATA(self, server, session, envelope):
+                self.empfangen += 1
+                return '250 OK'
+
+        handler = Zaehler()
+        server = Controller(handler, hostname='127.0.0.1', port=options['port'])
+        server.start()
+        try:
+            konfig = SmtpKonfiguration(
+                backend='django.core.mail.backends.smtp.EmailBackend', host='127.0.0.1', port=options['port'],
+                username='', password='', use_tls=False, use_ssl=False, absender='test@example.com',
+            )
+            anzahl = options['anzahl']
+
+            def mails():
+                return [
+                    EmailMessage(f'Test {nummer}', 'Testnachricht', konfig.absender, [f'empfaenger{nummer}@example.com'])
+                    for nummer in range(anzahl)
+                ]
+
+            start = time.perf_counter()
+            for mail in mails():
+                get_connection(konfig.backend, host=konfig.host, port=konfig.port, fail_silently=False).send_messages([mail])
+            einzeln = time.perf_counter() - start
+
+            pool = SmtpPool()
+            start = time.perf_counter()
+            for mail in mails():
+                pool.verbindung(konfig).send_messages([mail])
+            gepoolt = time.perf_counter() - start
+            pool.schliessen()
+        finally:
+            server.stop()
+
+        if handler.empfangen != 2 * anzahl:
+            raise CommandError(f'{handler.empfangen} von {2 * anzahl} Mails empfangen.')
+        self.stdout.write(f'Verbindung je Mail: {einzeln:.2f}s ({anzahl / einzeln:.0f} Mails/s)')
+        self.stdout.write(
+            f"Pool:               {gepoolt:.2f}s ({anzahl / gepoolt:.0f} Mails/s), "
+            f"{pool.zaehler['verbindungen']} Verbindung(en)"
+        )
@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.batch import STANDARD_WORKER, job_ausfuehren, jobs_laden, tenant_schemas, zusammenfassung
+
+
+class Command(BaseCommand):
+    help = 'Führt einen registrierten Tenant-Job parallel in allen (oder ausgewählten) Tenant-Schemas aus.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('job', nargs='?', help='Name des Jobs (siehe --list)')
+        parser.add_argument('--list', action='store_true', help='Registrierte Jobs anzeigen')
+        parser.add_argument('--schema', action='append', dest='schemas', help='Nur dieses Schema (mehrfach möglich)')
+        parser.add_argument('--worker', type=int, default=STANDARD_WORKER, help='Anzahl paralleler Prozesse')
+        parser.add_argument('--timeout', type=float, help='Zeitlimit je Tenant in Sekunden')
+        parser.add_argument('--retries', type=int, help='Wiederholungen je Tenant nach einem Fehler')
+        parser.add_argument('--param', action='append', default=[], metavar='NAME=WERT',
+                            help='Parameter für den Job, WERT als JSON (z.B. korrigieren=false)')
+
+    def handle(self, *args, **options):
+        jobs = jobs_laden()
+        if options['list'] or not options['job']:
+            for job in sorted(jobs.values(), key=lambda job: job.name):
+                self.stdout.write(f'{job.name:30} timeout={job.timeout}s retries={job.retries}  {job.beschreibung}')
+            return
+        if options['job'] not in jobs:
+            raise CommandError(f"Unbekannter Job: {options['job']}")
+
+        parameter = {}
+        for param in options['param']:
+            name, _, wert = param.partition('=')
+            try:
+                parameter[name] = json.loads(wert)
+            except ValueError:
+                parameter[name] = wert
+
+        schemas = tenant_schemas(options['schemas'])
+
+        def fortschritt(ergebnis, erledigt, gesamt):
+            if ergebnis.ok:
+                zeile = self.style.SUCCESS(f'OK     {ergebnis.schema} ({ergebnis.dauer:.1f}s): {ergebnis.wert}')
+            else:
+                zeile = self.style.ERROR(f'FEHLER {ergebnis.schema} nach {ergebnis.versuche} Versuch(en): {ergebnis.fehler}')
+            self.stdout.write(f'[{erledigt}/{gesamt}] {zeile}')
+
+        ergebnisse = job_ausfuehren(
+            options['job'], schemas,
+            worker=options['worker'], timeout=options['timeout'], retries=options['retries'],
+            parameter=parameter, fortschritt=fortschritt,
+        )
+        bericht = zusammenfassung(ergebnisse)
+        self.stdout.write(
+            f"{bericht['erfolgreich']}/{bericht['tenants']} Tenants erfolgreich, "
+            f"{bericht['wiederholt']} mit Wiederholung."
+        )
+        if bericht['fehlgeschlagen']:
+            for schema, fehler in sorted(bericht['fehlgeschlagen'].items()):
+                self.stderr.write(f'  {schema}: {fehler}')
+            raise CommandError(f"{len(bericht['fehlgeschlagen'])} Tenant(s) fehlgeschlagen.")
@@ -0,0 +1,354 @@
+import logging
+import mimetypes
+import os
+import select
+import smtplib
+import time
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from tenant_schemas.utils import schema_context
+
+from .batch import tenant_schemas
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY-Kanal, über den neue Mails die Worker wecken (Payload: Schema)
+KANAL = 'mailversand'
+BATCH = getattr(settings, 'MAILVERSAND_BATCH', 50)
+MAX_VERSUCHE = getattr(settings, 'MAILVERSAND_MAX_VERSUCHE', 6)
+# Wartezeit vor dem n-ten Wiederholungsversuch: BACKOFF_BASIS * 2^(n-1), höchstens BACKOFF_MAX (Sekunden)
+BACKOFF_BASIS = 30
+BACKOFF_MAX = 3600
+# Offene SMTP-Verbindungen werden nach so vielen Sekunden ohne Nutzung geschlossen
+LEERLAUF = getattr(settings, 'MAILVERSAND_LEERLAUF', 60)
+# So lange (Sekunden) bleiben übernommene Mails für andere Worker gesperrt, danach gelten sie als liegen geblieben
+SPERRFRIST = getattr(settings, 'MAILVERSAND_SPERRFRIST', 600)
+# Ab dieser Ruhezeit wird eine gepoolte Verbindung vor der Nutzung per NOOP geprüft
+PRUEFEN_NACH = 5
+
+SmtpKonfiguration = namedtuple(
+    'SmtpKonfiguration', 'backend host port username password use_tls use_ssl absender',
+)
+
+
+def smtp_konfiguration(schema):
+    """SMTP-Zugang des Tenants aus EmailSettings, sonst die DEFAULT_EMAIL_*-Settings."""
+    from users.models import EmailSettings
+
+    einstellungen = EmailSettings.objects.filter(company__schema_name=schema).first()
+    if einstellungen is not None and einstellungen.email_host:
+        return SmtpKonfiguration(
+            backend=einstellungen.email_backend,
+            host=einstellungen.email_host,
+            port=einstellungen.email_port or 587,
+            username=einstellungen.email_host_user or '',
+            password=einstellungen.email_host_password or '',
+            use_tls=einstellungen.email_use_tls,
+            use_ssl=einstellungen.email_use_ssl,
+            absender=einstellungen.default_from_email or settings.DEFAULT_FROM_EMAIL,
+        )
+    return SmtpKonfiguration(
+        backend=settings.DEFAULT_EMAIL_BACKEND,
+        host=settings.DEFAULT_EMAIL_HOST,
+        port=settings.DEFAULT_EMAIL_PORT,
+        username=settings.DEFAULT_EMAIL_HOST_USER,
+        password=settings.DEFAULT_EMAIL_HOST_PASSWORD,
+        use_tls=settings.DEFAULT_EMAIL_USE_TLS,
+        use_ssl=settings.DEFAULT_EMAIL_USE_SSL,
+        absender=settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def _lebt(backend):
+    smtp = getattr(backend, 'connection', None)
+    if smtp is None:
+        return True  # Backends ohne Verbindung (locmem, console)
+    try:
+        return smtp.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
+
+
+class SmtpPool:
+    """
+    Offene Mail-Backends je SMTP-Zugang (ohne Absender), einmal je Worker-Prozess.
+    Tenants mit demselben Relay teilen sich die Verbindung; TLS-Handshake und Login
+    fallen nur beim ersten Versand bzw. nach LEERLAUF Sekunden Pause an.
+    """
+
+    def __init__(self, leerlauf=LEERLAUF):
+        self.leerlauf = leerlauf
+        self.zaehler = Counter()
+        self._verbindungen = {}
+
+    def verbindung(self, konfig):
+        schluessel = konfig[:-1]
+        eintrag = self._verbindungen.get(schluessel)
+        jetzt = time.monotonic()
+        if eintrag is not None:
+            backend, zuletzt = eintrag
+            if jetzt - zuletzt < self.leerlauf and (jetzt - zuletzt < PRUEFEN_NACH or _lebt(backend)):
+                eintrag[1] = jetzt
+                self.zaehler['wiederverwendet'] += 1
+                return backend
+            self.verwerfen(konfig)
+        backend = get_connection(
+            konfig.backend, fail_silently=False, host=konfig.host, port=konfig.port,
+            username=konfig.username, password=konfig.password,
+            use_tls=konfig.use_tls, use_ssl=konfig.use_ssl, timeout=30,
+        )
+        backend.open()
+        self.zaehler['verbindungen'] += 1
+        self._verbindungen[schluessel] = [backend, jetzt]
+        return backend
+
+    def verwerfen(self, konfig):
+        eintrag = self._verbindungen.pop(konfig[:-1], None)
+        if eintrag is not None:
+            try:
+                eintrag[0].close()
+            except Exception:
+                pass
+
+    def aufraeumen(self):
+        """Schließt Verbindungen, die länger als leerlauf Sekunden nicht genutzt wurden."""
+        grenze = time.monotonic() - self.leerlauf
+        for schluessel, (backend, zuletzt) in list(self._verbindungen.items()):
+            if zuletzt < grenze:
+                self._verbindungen.pop(schluessel)
+                try:
+                    backend.close()
+                except Exception:
+                    pass
+
+    def schliessen(self):
+        for backend, _ in self._verbindungen.values():
+            try:
+                backend.close()
+            except Exception:
+                pass
+        self._verbindungen.clear()
+
+
+def anhang_ablegen(datei, dateiname=None):
+    """Legt eine hochgeladene Datei für den späteren Versand im Tenant-Storage ab (Eintrag für anhaenge)."""
+    name = default_storage.save(f'mail_anhaenge/{dateiname or datei.name}', datei)
+    return {'datei': name, 'dateiname': dateiname or os.path.basename(datei.name)}
+
+
+def mail_einreihen(empfaenger, betreff, nachricht, document_name, sterbefall=None, vorlage=None, anhaenge=()):
+    """
+    Reiht eine Mail je Empfänger als EmailLog (WARTEND) ein und kehrt sofort zurück.
+    anhaenge: Einträge aus anhang_ablegen oder {"vorlage_id", "sterbefall_id"} für ein
+    befülltes Dokument (kommt beim Versand aus dem Dokument-Cache).
+    """
+    from dokumente.models import EmailLog
+
+    if isinstance(empfaenger, str):
+        empfaenger = [empfaenger]
+    # Sterbefall-UUIDs als Text, sonst nicht JSON-serialisierbar
+    anhaenge = [
+        dict(anhang, sterbefall_id=str(anhang['sterbefall_id'])) if 'sterbefall_id' in anhang else anhang
+        for anhang in anhaenge
+    ]
+    jetzt = timezone.now()
+    eintraege = EmailLog.objects.bulk_create([
+        EmailLog(
+            recipient=adresse, document_name=document_name, sterbefall=sterbefall, vorlage=vorlage,
+            success=False, status=EmailLog.WARTEND, betreff=betreff, nachricht=nachricht,
+            anhaenge=anhaenge, naechster_versuch=jetzt,
+        )
+        for adresse in empfaenger
+    ])
+    schema = connection.schema_name
+    transaction.on_commit(lambda: _wecken(schema))
+    return eintraege
+
+
+def _wecken(schema):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [KANAL, schema])
+
+
+def _nachricht(eintrag, konfig):
+    from dokumente.ausgabe import email_anhang
+    from dokumente.models import Vorlage
+
+    mail = EmailMessage(eintrag.betreff or eintrag.document_name, eintrag.nachricht, konfig.absender, [eintrag.recipient])
+    for anhang in eintrag.anhaenge:
+        if 'vorlage_id' in anhang:
+            mail.attach(*email_anhang(Vorlage.objects.get(pk=anhang['vorlage_id']), anhang['sterbefall_id']))
+        else:
+            with default_storage.open(anhang['datei'], 'rb') as datei:
+                dateiname = anhang.get('dateiname') or os.path.basename(anhang['datei'])
+                mail.attach(dateiname, datei.read(), mimetypes.guess_type(dateiname)[0] or 'application/octet-stream')
+    return mail
+
+
+class _Versandliste(list):
+    """Mails für send_messages; begonnen zählt mit, bis zu welcher Mail der Versand kam."""
+
+    def __init__(self, mails):
+        super().__init__(mails)
+        self.begonnen = 0
+
+    def __iter__(self):
+        for mail in super().__iter__():
+            self.begonnen += 1
+            yield mail
+
+
+def _senden(eintraege, konfig, pool):
+    """
+    Versendet über die gepoolte Verbindung mit einem send_messages je Batch; nach einem
+    Fehler geht es mit den restlichen Mails weiter. Liefert (gesendet, [(eintrag, fehler, wiederholbar)]).
+    """
+    gesendet, fehlgeschlagen, offen = [], [], []
+    for eintrag in eintraege:
+        try:
+            offen.append((eintrag, _nachricht(eintrag, konfig)))
+        except Exception as fehler:  # z.B. Anhang nicht mehr vorhanden: Wiederholen hilft nicht
+            fehlgeschlagen.append((eintrag, fehler, False))
+    neu_verbunden = False
+    while offen:
+        mails = _Versandliste(mail for _, mail in offen)
+        try:
+            pool.verbindung(konfig).send_messages(mails)
+        except Exception as fehler:
+            # send_messages bricht bei der ersten Ausnahme ab, die Mails davor sind versendet
+            fertig = max(mails.begonnen - 1, 0)
+            gesendet.extend(eintrag for eintrag, _ in offen[:fertig])
+            offen = offen[fertig:]
+            if isinstance(fehler, smtplib.SMTPRecipientsRefused):
+                fehlgeschlagen.append((offen.pop(0)[0], fehler, False))
+                continue
+            pool.verwerfen(konfig)
+            if fertig:
+                neu_verbunden = False
+            if isinstance(fehler, (smtplib.SMTPServerDisconnected, ConnectionError)) and not neu_verbunden:
+                # Relay hat die gepoolte Verbindung geschlossen: einmal mit neuer Verbindung
+                neu_verbunden = True
+                continue
+            fehlgeschlagen.extend((eintrag, fehler, True) for eintrag, _ in offen)
+        else:
+            gesendet.extend(eintrag for eintrag, _ in offen)
+        break
+    return gesendet, fehlgeschlagen
+
+
+def _ergebnisse_speichern(gesendet, fehlgeschlagen):
+    from dokumente.models import EmailLog
+
+    if gesendet:
+        EmailLog.objects.filter(pk__in=[eintrag.pk for eintrag in gesendet]).update(
+            status=EmailLog.GESENDET, success=True, fehler='', naechster_versuch=None, versuche=F('versuche') + 1,
+        )
+    if fehlgeschlagen:
+        jetzt = timezone.now()
+        for eintrag, fehler, wiederholbar in fehlgeschlagen:
+            eintrag.versuche += 1
+            eintrag.success = False
+            eintrag.fehler = str(fehler)[:2000]
+            if wiederholbar and eintrag.versuche < MAX_VERSUCHE:
+                warten = min(BACKOFF_BASIS * 2 ** (eintrag.versuche - 1), BACKOFF_MAX)
+                eintrag.naechster_versuch = jetzt + timedelta(seconds=warten)
+            else:
+                eintrag.status = EmailLog.FEHLGESCHLAGEN
+                eintrag.naechster_versuch = None
+        EmailLog.objects.bulk_update(
+            [eintrag for eintrag, _, _ in fehlgeschlagen],
+            ['versuche', 'success', 'fehler', 'naechster_versuch', 'status'],
+        )
+
+
+def _uebernehmen(batch):
+    """
+    Übernimmt bis zu batch fällige Mails: SKIP LOCKED gegen parallele Worker, dann
+    naechster_versuch um SPERRFRIST verschieben und committen. Der Versand selbst läuft
+    ohne offene Transaktion und ohne Zeilensperren.
+    """
+    from dokumente.models import EmailLog
+
+    with transaction.atomic():
+        eintraege = list(
+            EmailLog.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailLog.WARTEND, naechster_versuch__lte=timezone.now())
+            .order_by('naechster_versuch', 'pk')[:batch]
+        )
+        if eintraege:
+            EmailLog.objects.filter(pk__in=[eintrag.pk for eintrag in eintraege]).update(
+                naechster_versuch=timezone.now() + timedelta(seconds=SPERRFRIST),
+            )
+    return eintraege
+
+
+def schema_abarbeiten(schema, pool, batch=BATCH):
+    """
+    Versendet alle fälligen Mails eines Tenants in Batches. Parallele Worker versenden
+    nichts doppelt (siehe _uebernehmen). Zustellung mindestens einmal: stirbt der Worker
+    zwischen Versand und Speichern des Ergebnisses, geht die Mail nach SPERRFRIST erneut raus.
+    Liefert (gesendet, fehlgeschlagen).
+    """
+    anzahl_gesendet = anzahl_fehler = 0
+    with schema_context(schema):
+        konfig = None
+        while True:
+            eintraege = _uebernehmen(batch)
+            if not eintraege:
+                break
+            konfig = konfig or smtp_konfiguration(schema)
+            gesendet, fehlgeschlagen = _senden(eintraege, konfig, pool)
+            _ergebnisse_speichern(gesendet, fehlgeschlagen)
+            anzahl_gesendet += len(gesendet)
+            anzahl_fehler += len(fehlgeschlagen)
+            if len(eintraege) < batch:
+                break
+    return anzahl_gesendet, anzahl_fehler
+
+
+def worker(schemas=None, intervall=30, einmal=False, stoppen=lambda: False):
+    """
+    Versand-Worker: wartet per LISTEN auf neue Mails und arbeitet das gemeldete
+    Schema sofort ab; alle intervall Sekunden zusätzlich alle Tenants (fällige
+    Wiederholungen, verpasste Benachrichtigungen). Liefert die Pool-Zähler.
+    """
+    pool = SmtpPool()
+    nur = set(schemas) if schemas else None
+    try:
+        if einmal:
+            for schema in tenant_schemas(schemas):
+                schema_abarbeiten(schema, pool)
+            return pool.zaehler
+
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {KANAL}')
+        naechster_rundgang = 0
+        while not stoppen():
+            faellig = set()
+            if time.monotonic() >= naechster_rundgang:
+                faellig.update(tenant_schemas(schemas))
+                naechster_rundgang = time.monotonic() + intervall
+            pg = connection.connection
+            # Während des Versands eingegangene Benachrichtigungen liegen schon in pg.notifies
+            if not faellig and not pg.notifies and select.select([pg], [], [], min(intervall, LEERLAUF))[0]:
+                pg.poll()
+            while pg.notifies:
+                faellig.add(pg.notifies.pop(0).payload)
+            for schema in sorted(faellig):
+                if nur is None or schema in nur:
+                    try:
+                        schema_abarbeiten(schema, pool)
+                    except Exception:
+                        logger.exception('Mailversand für %s fehlgeschlagen', schema)
+            pool.aufraeumen()
+        return pool.zaehler
+    finally:
+        pool.schliessen()
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from tenant_schemas.middleware import TenantMiddleware
+from tenant_schemas.utils import get_tenant_model
+
+from sterbefall.cache import ProzessCache, aktuelle_version
+
+# Lebensdauer aufgelöster Tenants in Sekunden; Änderungen kommen über die Version sofort an
+MANDANT_CACHE_TTL = getattr(settings, 'MANDANT_CACHE_TTL', 300)
+MANDANT_CACHE_GROESSE = getattr(settings, 'MANDANT_CACHE_GROESSE', 1024)
+# So oft (Sekunden) fragt ein Prozess höchstens die gemeinsame Version ab
+VERSION_INTERVALL = getattr(settings, 'MANDANT_VERSION_INTERVALL', 2)
+VERSION_KEY = 'mandanten:version'
+
+# (art, wert) -> company; Kopien, damit Änderungen am Request-Tenant nicht im Cache landen
+_mandanten = ProzessCache(MANDANT_CACHE_GROESSE, ttl=MANDANT_CACHE_TTL)
+_lock = threading.Lock()  # für _zaehler und _stand
+_zaehler = Counter()
+_stand = {'version': None, 'naechste_pruefung': 0}
+
+
+def _version_pruefen():
+    """Leert den lokalen Cache, wenn ein anderer Prozess Tenants geändert hat."""
+    jetzt = time.monotonic()
+    if jetzt < _stand['naechste_pruefung']:
+        return
+    version = aktuelle_version(VERSION_KEY)
+    with _lock:
+        _stand['naechste_pruefung'] = jetzt + VERSION_INTERVALL
+        if version != _stand['version']:
+            _mandanten.clear()
+            _stand['version'] = version
+
+
+def _aufloesen(art, wert, laden):
+    _version_pruefen()
+    company = _mandanten.get((art, wert))
+    with _lock:
+        _zaehler[(art, 'hits' if company is not None else 'misses')] += 1
+    if company is None:
+        company = laden()  # DoesNotExist wird nicht gecacht
+        _mandanten.set((art, wert), company)
+    return company
+
+
+def mandant_fuer_host(hostname):
+    """Company zum Hostnamen (domain_url), prozesslokal gecacht."""
+    return _aufloesen('host', hostname, lambda: get_tenant_model().objects.get(domain_url=hostname))
+
+
+def mandant(schema_name):
+    """Company zum Schema-Namen, prozesslokal gecacht."""
+    return _aufloesen('schema', schema_name, lambda: get_tenant_model().objects.get(schema_name=schema_name))
+
+
+def mandanten_geaendert():
+    """Verwirft aufgelöste Tenants hier sofort und in allen Prozessen nach dem Commit."""
+    _mandanten.clear()
+
+    def version_erhoehen():
+        _mandanten.clear()
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            aktuelle_version(VERSION_KEY)
+
+    transaction.on_commit(version_erhoehen)
+
+
+def mandanten_statistik():
+    """Treffer/Fehlzugriffe dieses Prozesses je Art der Auflösung."""
+    with _lock:
+        statistik = {art: {'hits': _zaehler[(art, 'hits')], 'misses': _zaehler[(art, 'misses')]}
+                     for art in ('host', 'schema')}
+    eintraege = len(_mandanten)
+    for werte in statistik.values():
+        gesamt = werte['hits'] + werte['misses']
+        werte['hit_ratio'] = werte['hits'] / gesamt if gesamt else None
+    statistik['eintraege'] = eintraege
+    return statistik
+
+
+class MandantenMiddleware(TenantMiddleware):
+    """tenant_schemas.middleware.TenantMiddleware mit gecachter Auflösung des Hostnamens."""
+
+    def get_tenant(self, model, hostname, request):
+        return mandant_fuer_host(hostname)
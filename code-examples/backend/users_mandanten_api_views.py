@@ -0,0 +1,10 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .mandanten import mandanten_statistik
+
+
+class MandantenStatistikView(APIView):
+    """Trefferquote der Tenant-Auflösung (dieser Prozess), z.B. für Monitoring."""
+    def get(self, request, format=None):
+        return Response(mandanten_statistik())
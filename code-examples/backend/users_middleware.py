@@ -1,24 +1,19 @@
 from django.utils.deprecation import MiddlewareMixin
-from django_tenants.utils import schema_context, get_tenant_model
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
 
+from .authentifizierung import anmeldung
+
 class TenantMiddleware(MiddlewareMixin):
     def process_request(self, request):
-        auth = JWTAuthentication()
+        # Einmal je Request; JWTAnmeldung (DRF) verwendet das Ergebnis wieder
         try:
-            header = auth.get_header(request)
-            if header is not None:
-                raw_token = auth.get_raw_token(header)
-                if raw_token is not None:
-                    validated_token = auth.get_validated_token(raw_token)
-                    user = auth.get_user(validated_token)  # Get the user from the token
-
-                    # Now you can securely access the company through the user object
-                    if user and hasattr(user, 'company') and user.company:
-                        company_name = user.company.schema_name  # Use schema_name instead of name
-                        with schema_context(company_name):
-                            request.tenant = user.company
+            ergebnis = anmeldung(request)
+            if ergebnis is not None:
+                user = ergebnis.user
+                # Firma ist per select_related bzw. aus dem Token-Cache schon geladen
+                if user and hasattr(user, 'company') and user.company:
+                    request.tenant = user.company
         except (InvalidToken, AuthenticationFailed) as e:
             # Handle invalid tokens (log, return an error response, etc.)
             print(f"Invalid token: {e}")
@@ -0,0 +1,46 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HintergrundAufgabe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('schema_name', models.CharField(max_length=63)),
+                ('name', models.CharField(max_length=100)),
+                ('parameter', models.JSONField(blank=True, default=dict)),
+                ('prioritaet', models.IntegerField(default=0)),
+                ('dedup_schluessel', models.CharField(blank=True, max_length=255, null=True)),
+                ('status', models.CharField(choices=[('WARTEND', 'Wartend'), ('LAEUFT', 'Läuft'), ('ERLEDIGT', 'Erledigt'), ('FEHLGESCHLAGEN', 'Fehlgeschlagen'), ('ABGEBROCHEN', 'Abgebrochen')], default='WARTEND', max_length=20)),
+                ('ausfuehren_ab', models.DateTimeField(default=django.utils.timezone.now)),
+                ('versuche', models.IntegerField(default=0)),
+                ('max_versuche', models.IntegerField(default=3)),
+                ('timeout', models.IntegerField(default=600)),
+                ('ergebnis', models.JSONField(blank=True, null=True)),
+                ('fehler', models.TextField(blank=True, default='')),
+                ('worker', models.CharField(blank=True, default='', max_length=100)),
+                ('erstellt_am', models.DateTimeField(auto_now_add=True)),
+                ('gestartet_am', models.DateTimeField(blank=True, null=True)),
+                ('beendet_am', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='hintergrundaufgabe',
+            index=models.Index(condition=models.Q(status='WARTEND'), fields=['-prioritaet', 'ausfuehren_ab', 'id'], name='aufgabe_wartend'),
+        ),
+        migrations.AddIndex(
+            model_name='hintergrundaufgabe',
+            index=models.Index(condition=models.Q(status='LAEUFT'), fields=['gestartet_am'], name='aufgabe_laeuft'),
+        ),
+        migrations.AddConstraint(
+            model_name='hintergrundaufgabe',
+            constraint=models.UniqueConstraint(condition=models.Q(status__in=['WARTEND', 'LAEUFT']), fields=('schema_name', 'dedup_schluessel'), name='aufgabe_dedup'),
+        ),
+    ]
@@ -15,7 +15,17 @@ from logging import getLogger
 logger = getLogger(__name__)
 
 
-class CustomUserManager(UserManager):
+class CustomUserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Ohne post_save: gecachte Tokens der betroffenen Benutzer selbst verwerfen (z.B. is_active=False)
+        from .authentifizierung import benutzer_vergessen
+        user_ids = list(self.values_list('pk', flat=True))
+        anzahl = super().update(**kwargs)
+        benutzer_vergessen(*user_ids)
+        return anzahl
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
     def create_superuser(self, username, email=None, password=None, **extra_fields):
         from .models import Company
         company, created = Company.objects.get_or_create(id=1, defaults={'name': 'bestatter'})
@@ -231,4 +241,70 @@ class CustomUser(AbstractUser):
                 f"Make sure to set the 'stripe_id' in your settings correctly.\n"
                 f"See: https://getlaunchr.com/docs/subscriptions/#get_stripe_plan_id_by_key"
             )
-        return stripe_id
\ No newline at end of file
+        return stripe_id
+
+class HintergrundAufgabe(models.Model):
+    """
+    Eintrag der Aufgaben-Warteschlange (public-Schema, für alle Tenants).
+    Ausgeführt wird in schema_name, siehe aufgaben.py.
+    """
+    WARTEND = 'WARTEND'
+    LAEUFT = 'LAEUFT'
+    ERLEDIGT = 'ERLEDIGT'
+    FEHLGESCHLAGEN = 'FEHLGESCHLAGEN'
+    ABGEBROCHEN = 'ABGEBROCHEN'
+    STATUS_CHOICES = (
+        (WARTEND, 'Wartend'),
+        (LAEUFT, 'Läuft'),
+        (ERLEDIGT, 'Erledigt'),
+        (FEHLGESCHLAGEN, 'Fehlgeschlagen'),
+        (ABGEBROCHEN, 'Abgebrochen'),
+    )
+    AKTIV = (WARTEND, LAEUFT)
+
+    schema_name = models.CharField(max_length=63)
+    name = models.CharField(max_length=100)
+    parameter = models.JSONField(default=dict, blank=True)
+    prioritaet = models.IntegerField(default=0)  # höher = früher
+    # Gleiche Schlüssel werden je Tenant nur einmal gleichzeitig eingereiht
+    dedup_schluessel = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=WARTEND)
+    ausfuehren_ab = models.DateTimeField(default=timezone.now)
+    versuche = models.IntegerField(default=0)
+    max_versuche = models.IntegerField(default=3)
+    timeout = models.IntegerField(default=600)
+    ergebnis = models.JSONField(null=True, blank=True)
+    fehler = models.TextField(blank=True, default='')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    erstellt_am = models.DateTimeField(auto_now_add=True)
+    gestartet_am = models.DateTimeField(null=True, blank=True)
+    beendet_am = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Abholen: ... WHERE status = 'WARTEND' ORDER BY prioritaet DESC, ausfuehren_ab, id
+            models.Index(fields=['-prioritaet', 'ausfuehren_ab', 'id'], name='aufgabe_wartend',
+                         condition=models.Q(status='WARTEND')),
+            models.Index(fields=['gestartet_am'], name='aufgabe_laeuft', condition=models.Q(status='LAEUFT')),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['schema_name', 'dedup_schluessel'], name='aufgabe_dedup',
+                                    condition=models.Q(status__in=['WARTEND', 'LAEUFT'])),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.schema_name}, {self.status})'
+
+    def als_dict(self):
+        return {
+            'id': self.pk,
+            'name': self.name,
+            'status': self.status,
+            'versuche': self.versuche,
+            'ergebnis': self.ergebnis,
+            'fehler': self.fehler,
+            'erstellt_am': self.erstellt_am,
+            'ausfuehren_ab': self.ausfuehren_ab,
+            'gestartet_am': self.gestartet_am,
+            'beendet_am': self.beendet_am,
+        }
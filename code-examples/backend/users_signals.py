@@ -0,0 +1,31 @@
+from django.apps import apps
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentifizierung import benutzer_vergessen
+from .mandanten import mandanten_geaendert
+from .models import Company, CustomUser
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def benutzer_geaendert(sender, instance, **kwargs):
+    # Deaktivierung, Firmenwechsel, Löschung: gecachte Tokens dieses Benutzers in allen Prozessen ungültig
+    # (QuerySet.update siehe models.CustomUserQuerySet)
+    benutzer_vergessen(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Company)
+def company_geaendert(sender, instance, **kwargs):
+    mandanten_geaendert()
+
+
+try:
+    Domain = apps.get_model(getattr(settings, 'TENANT_DOMAIN_MODEL', 'users.Domain'))
+except (LookupError, ValueError):
+    Domain = None  # tenant_schemas: Hostname steht in Company.domain_url
+
+if Domain is not None:
+    @receiver([post_save, post_delete], sender=Domain)
+    def domain_geaendert(sender, instance, **kwargs):
+        mandanten_geaendert()
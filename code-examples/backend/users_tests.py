@@ -0,0 +1,79 @@
+import socket
+
+from aiosmtpd.controller import Controller
+from django.db import connection
+from django.test import override_settings
+from tenant_schemas.test.cases import TenantTestCase
+
+from dokumente.models import EmailLog
+from .mailversand import SmtpPool, _uebernehmen, mail_einreihen, schema_abarbeiten
+
+
+class Postfach:
+    """aiosmtpd-Handler: sammelt empfangene Mails, lehnt abgelehnt@... ab."""
+
+    def __init__(self):
+        self.empfangen = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('abgelehnt@'):
+            return '550 Empfänger unbekannt'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.empfangen.extend(envelope.rcpt_tos)
+        return '250 OK'
+
+
+def _freier_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class MailversandTest(TenantTestCase):
+    """Warteschlange gegen einen lokalen SMTP-Ersatzserver (aiosmtpd)."""
+
+    def setUp(self):
+        self.postfach = Postfach()
+        port = _freier_port()
+        self.server = Controller(self.postfach, hostname='127.0.0.1', port=port)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        einstellungen = override_settings(
+            DEFAULT_EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            DEFAULT_EMAIL_HOST='127.0.0.1', DEFAULT_EMAIL_PORT=port,
+            DEFAULT_EMAIL_HOST_USER='', DEFAULT_EMAIL_HOST_PASSWORD='',
+            DEFAULT_EMAIL_USE_TLS=False, DEFAULT_EMAIL_USE_SSL=False,
+        )
+        einstellungen.enable()
+        self.addCleanup(einstellungen.disable)
+        self.pool = SmtpPool()
+        self.addCleanup(self.pool.schliessen)
+
+    def test_batch_ueber_eine_verbindung(self):
+        empfaenger = [f'empfaenger{nummer}@example.com' for nummer in range(5)]
+        mail_einreihen(empfaenger, 'Betreff', 'Nachricht', 'Testdokument')
+
+        self.assertEqual(schema_abarbeiten(connection.schema_name, self.pool), (5, 0))
+        self.assertEqual(sorted(self.postfach.empfangen), sorted(empfaenger))
+        self.assertEqual(self.pool.zaehler['verbindungen'], 1)
+        self.assertEqual(EmailLog.objects.filter(status=EmailLog.GESENDET, success=True).count(), 5)
+
+    def test_abgelehnter_empfaenger(self):
+        mail_einreihen(['a@example.com', 'abgelehnt@example.com', 'c@example.com'], 'Betreff', 'Nachricht', 'Testdokument')
+
+        self.assertEqual(schema_abarbeiten(connection.schema_name, self.pool), (2, 1))
+        self.assertEqual(sorted(self.postfach.empfangen), ['a@example.com', 'c@example.com'])
+        abgelehnt = EmailLog.objects.get(recipient='abgelehnt@example.com')
+        self.assertEqual(abgelehnt.status, EmailLog.FEHLGESCHLAGEN)
+        self.assertEqual(abgelehnt.versuche, 1)
+
+    def test_uebernommene_mails_gesperrt(self):
+        mail_einreihen(['a@example.com', 'b@example.com'], 'Betreff', 'Nachricht', 'Testdokument')
+
+        self.assertEqual(len(_uebernehmen(10)), 2)
+        self.assertEqual(_uebernehmen(10), [])
+        self.assertEqual(schema_abarbeiten(connection.schema_name, self.pool), (0, 0))
+        self.assertEqual(self.postfach.empfangen, [])
@@ -68,7 +68,8 @@ INSTALLED_APPS = SHARED_APPS + [ app for app in TENANT_APPS if app not in SHARED
 ########################################
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
-    'tenant_schemas.middleware.TenantMiddleware',
+    # tenant_schemas.middleware.TenantMiddleware mit prozesslokalem Cache Hostname -> Company
+    'users.mandanten.MandantenMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'users.middleware.TenantMiddleware',
@@ -82,6 +83,22 @@ MIDDLEWARE = [
     'users.middleware.AutoLogoutMiddleware',
 ]
 
+########################################
+# CACHE
+########################################
+# Gemeinsamer Cache aller Worker-Prozesse: Versionsschlüssel der Fall-Caches (sterbefall/cache.py)
+# und der Tenant-Auflösung (users/mandanten.py) wirken nur so prozessübergreifend.
+# Ohne CACHE_LOCATION (z.B. lokal mit runserver) prozesslokal.
+CACHE_LOCATION = os.environ.get("CACHE_LOCATION", "memcached:11211")
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': CACHE_LOCATION,
+    } if CACHE_LOCATION else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
 ########################################
 # SECURITY
 ########################################
@@ -141,6 +158,9 @@ DATABASES = {
 DEFAULT_FILE_STORAGE = 'tenant_schemas.storage.TenantFileSystemStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Geschützte Dateien nach der Berechtigungsprüfung über nginx ausliefern
+# (internal-Location mit alias auf MEDIA_ROOT); leer = Django liefert selbst aus
+DATEI_X_ACCEL_PREFIX = os.environ.get("DATEI_X_ACCEL_PREFIX", "")
 
 DATABASE_ROUTERS = [
     'tenant_schemas.routers.TenantSyncRouter',
@@ -239,7 +259,8 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
     'DEFAULT_SCHEMA_GENERATOR_CLASS': 'rest_framework.schemas.generators.SchemaGenerator',
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Teilt Token-Prüfung und Benutzerabfrage mit users.middleware.TenantMiddleware
+        'users.authentifizierung.JWTAnmeldung',
     ],
     #'DEFAULT_PERMISSION_CLASSES': [
     #    'rest_framework.permissions.IsAuthenticated',
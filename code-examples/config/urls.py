@@ -8,11 +8,13 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from users.serializers import CustomTokenObtainPairSerializer
 from sterbefall.api_views import SterbefallViewSet, SterbefallDokumenteApiView
 from produkte.api_views import ProduktSearchView, ProdukteViewSet
-from rechnung.api_views import RechnungViewSet, RechnungspositionViewSet, StandardRechnungViewSet, RechnungenForSterbefallView, rechnungsposition_category_summary
+from rechnung.api_views import RechnungViewSet, RechnungspositionViewSet, StandardRechnungViewSet, RechnungenForSterbefallView, rechnungsposition_category_summary, umsatz_verlauf_view
 from users.api_views import UserManagementViewSet, CompanyViewSet, EmailSettingsViewSet, send_email, BankAccountViewSet
 from kontakte.api_views import KontakeViewSet
-from dokumente.api_views import VorlageViewSet,  PlatzhalterInstanceViewSet,  PDFForSterbefallListView, PDFForSterbefallDetailView
+from dokumente.api_views import VorlageViewSet,  PlatzhalterInstanceViewSet,  PDFForSterbefallListView, PDFForSterbefallDetailView, PDFForSterbefallDateiView, DokumentCacheStatistikView, DossierView, DossierDateiView
 from platzhalter.api_views import PlatzhalterViewSet
+from users.aufgaben_api_views import AufgabeStatusView
+from users.mandanten_api_views import MandantenStatistikView
 from kalender.api_views import HauptterminViewSet, AufgabeViewSet, PredefinedTaskViewSet
 from dokumente import api_views as dokumente_api_views
 
@@ -42,6 +44,8 @@ urlpatterns = [
     path('api/', include(router.urls)),
 
     path('api/send_email/', send_email, name='send_email'),
+    path('api/aufgaben/<int:pk>/', AufgabeStatusView.as_view(), name='aufgabe-status'),
+    path('api/mandanten/cache/', MandantenStatistikView.as_view(), name='mandanten-cache-statistik'),
 
     #Rechnungsposition im Auftrag hinzufügen
     path('api/sterbefall/<uuid:sterbefall_id>/rechnung/', RechnungenForSterbefallView.as_view(), name='sterbefall-rechnungen'),
@@ -60,12 +64,17 @@ urlpatterns = [
     }), name='add_standard_positions'),
 
     path('api/rechnungspositionen/category_summary/<int:year>/', rechnungsposition_category_summary, name='rechnungsposition_category_summary'),
+    path('api/rechnungspositionen/umsatz/', umsatz_verlauf_view, name='umsatz_verlauf'),
     
     #pdf für sterbefall
     path('api/sterbefall/<uuid:sterbefall_id>/pdfs/', PDFForSterbefallListView.as_view(), name='sterbefall-pdfs'),
     path('api/sterbefall/<uuid:sterbefall_id>/pdfs/<int:pk>/', PDFForSterbefallDetailView.as_view(), name='replace-placeholders'),
+    path('api/sterbefall/<uuid:sterbefall_id>/pdfs/<int:pk>/datei/', PDFForSterbefallDateiView.as_view(), name='sterbefall-pdf-datei'),
+    path('api/sterbefall/<uuid:sterbefall_id>/dossier/', DossierView.as_view(), name='sterbefall-dossier'),
+    path('api/sterbefall/<uuid:sterbefall_id>/dossier/<str:schluessel>/', DossierDateiView.as_view(), name='sterbefall-dossier-datei'),
     path('api/produkt_search/', ProduktSearchView.as_view(), name='produkt_search'),
 
+    path('api/dokumente/cache/', DokumentCacheStatistikView.as_view(), name='dokument-cache-statistik'),
     path('api/emaillogs/<str:document_name>/', dokumente_api_views.EmailLogListView.as_view(), name='email-log-list'),
 
     path(